@@ -0,0 +1,265 @@
+import os
+import math
+import time
+import asyncio
+import contextvars
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from fastapi.responses import JSONResponse
+from prompt_builder import count_tokens, TOKENS_PER_MESSAGE
+
+# ----------------------------
+# Admission Settings
+# ----------------------------
+ADMISSION_CONTROL_ENABLED = os.getenv("ADMISSION_CONTROL", "1") == "1"
+
+# Upstream (organization) limits assumed until a response reports the real ones
+ADMISSION_GLOBAL_RPM = float(os.getenv("ADMISSION_GLOBAL_RPM", "500"))
+ADMISSION_GLOBAL_TPM = float(os.getenv("ADMISSION_GLOBAL_TPM", "200000"))
+# Share of the upstream limits this process plans to use
+ADMISSION_HEADROOM = float(os.getenv("ADMISSION_HEADROOM", "0.9"))
+# Worker processes sharing the key (set by serve.py); each gets an equal part of the headroom
+ADMISSION_PROCESSES = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+
+# Fair share for a single session
+ADMISSION_SESSION_RPM = float(os.getenv("ADMISSION_SESSION_RPM", "20"))
+ADMISSION_SESSION_TPM = float(os.getenv("ADMISSION_SESSION_TPM", "20000"))
+
+# A request that would have to queue longer than this is rejected with 429
+ADMISSION_MAX_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "5"))
+ADMISSION_MAX_SESSIONS = int(os.getenv("ADMISSION_MAX_SESSIONS", "10000"))
+
+# Rough input tokens of one uploaded image (high detail, at most 1536px a side)
+IMAGE_TOKEN_ESTIMATE = 1105
+
+# Session the current request is made for; set by the endpoints and
+# inherited by the tasks they start (single-flight calls, summary refreshes)
+current_session = contextvars.ContextVar("admission_session", default=None)
+
+
+def bind_session(session_id):
+    """Charge LLM calls made while handling this request to session_id"""
+    current_session.set(session_id)
+
+
+class AdmissionRejectedError(Exception):
+    """Raised when a call would have to wait longer than the admission deadline"""
+
+    def __init__(self, scope, retry_after):
+        self.scope = scope
+        self.retry_after = retry_after
+        super().__init__(f"Rate limit reached for this {scope}, please retry in {math.ceil(retry_after)}s")
+
+
+def rate_limited_response(error):
+    retry_after = max(1, math.ceil(error.retry_after))
+    return JSONResponse(
+        status_code=429,
+        content={"error": str(error), "retry_after": retry_after},
+        headers={"Retry-After": str(retry_after)}
+    )
+
+
+def estimate_request_tokens(params):
+    """Tokens the upstream charges a request when it arrives: prompt estimate plus max_tokens"""
+    tokens = params.get("max_tokens") or 0
+    for message in params.get("messages", []):
+        tokens += TOKENS_PER_MESSAGE
+        content = message.get("content") or ""
+        if isinstance(content, str):
+            tokens += count_tokens(content)
+            continue
+        for part in content:
+            if part.get("type") == "text":
+                tokens += count_tokens(part["text"])
+            else:
+                tokens += IMAGE_TOKEN_ESTIMATE
+    return tokens
+
+
+def _header_number(headers, name):
+    try:
+        return float(headers[name])
+    except (KeyError, ValueError):
+        return None
+
+
+# ----------------------------
+# Token Buckets
+# ----------------------------
+class TokenBucket:
+    """A per-minute budget refilled continuously.
+
+    Reservations are taken up front and may drive the bucket negative;
+    the deficit is the queue, and a new reservation waits until it (and
+    everything reserved before it) has been refilled.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until amount is available, behind the reservations already queued"""
+        self._refill(now)
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+    def take(self, amount):
+        self.tokens -= amount
+
+    def give_back(self, amount):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def resize(self, per_minute):
+        if per_minute > 0 and per_minute != self.capacity:
+            self._refill(time.monotonic())
+            self.capacity = per_minute
+            self.rate = per_minute / 60
+            self.tokens = min(self.tokens, per_minute)
+
+    def clamp(self, available):
+        """Never assume more is available than the upstream says"""
+        self._refill(time.monotonic())
+        self.tokens = min(self.tokens, available)
+
+
+class Admission:
+    """Handle for one admitted call, used to correct its token reservation"""
+
+    def __init__(self, session_tokens=None, reserved=0):
+        self.session_tokens = session_tokens
+        self.reserved = reserved
+
+    def settle(self, used_tokens):
+        # The upstream charges the estimate, so only the session's fair-share
+        # bucket is corrected to what the call actually used
+        if self.session_tokens is not None:
+            self.session_tokens.give_back(self.reserved - used_tokens)
+
+
+class AdmissionController:
+    """Admits LLM calls against global and per-session RPM/TPM token buckets.
+
+    The global buckets are sized from the x-ratelimit-* headers of upstream
+    responses (times the headroom) and clamped to what the upstream says
+    is left, so other processes sharing the key are accounted for too.
+    With several worker processes each plans for its own part of both. A
+    call that fits is admitted at once; one that would fit within
+    max_wait is queued by sleeping until its reservation is due; anything
+    later is rejected with the time after which it would fit.
+    """
+
+    def __init__(self, rpm=ADMISSION_GLOBAL_RPM, tpm=ADMISSION_GLOBAL_TPM,
+                 session_rpm=ADMISSION_SESSION_RPM, session_tpm=ADMISSION_SESSION_TPM,
+                 headroom=ADMISSION_HEADROOM, max_wait=ADMISSION_MAX_WAIT_SECONDS,
+                 max_sessions=ADMISSION_MAX_SESSIONS, enabled=ADMISSION_CONTROL_ENABLED,
+                 processes=ADMISSION_PROCESSES):
+        self.enabled = enabled
+        self.headroom = headroom
+        self.processes = processes
+        self.share = headroom / processes
+        self.session_rpm = session_rpm
+        self.session_tpm = session_tpm
+        self.max_wait = max_wait
+        self.max_sessions = max_sessions
+        self.requests = TokenBucket(rpm * self.share)
+        self.tokens = TokenBucket(tpm * self.share)
+        self.upstream = {"limit_requests": rpm, "limit_tokens": tpm, "from_headers": False}
+
+        self._sessions = OrderedDict()  # session_id -> (requests bucket, tokens bucket)
+        self._stats = {"admitted": 0, "queued": 0, "queued_seconds": 0.0,
+                       "rejected": {"global": 0, "session": 0}}
+
+    def _session_buckets(self, session_id):
+        buckets = self._sessions.get(session_id)
+        if buckets is None:
+            buckets = (TokenBucket(self.session_rpm), TokenBucket(self.session_tpm))
+            self._sessions[session_id] = buckets
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(session_id)
+        return buckets
+
+    @asynccontextmanager
+    async def admit(self, estimated_tokens, session_id=None):
+        """Wait for room for one call of estimated_tokens, or raise AdmissionRejectedError"""
+        if not self.enabled:
+            yield Admission()
+            return
+
+        session_id = session_id or current_session.get()
+        reservations = [("global", self.requests, 1), ("global", self.tokens, estimated_tokens)]
+        session_tokens = None
+        if session_id:
+            session_requests, session_tokens = self._session_buckets(session_id)
+            reservations += [("session", session_requests, 1), ("session", session_tokens, estimated_tokens)]
+        # A call bigger than a whole minute's budget goes through once the bucket is full
+        reservations = [(scope, bucket, min(amount, bucket.capacity)) for scope, bucket, amount in reservations]
+
+        now = time.monotonic()
+        wait, scope = max((bucket.wait_time(amount, now), scope) for scope, bucket, amount in reservations)
+        if wait > self.max_wait:
+            self._stats["rejected"][scope] += 1
+            raise AdmissionRejectedError(scope, wait)
+
+        for _, bucket, amount in reservations:
+            bucket.take(amount)
+        if wait > 0:
+            self._stats["queued"] += 1
+            self._stats["queued_seconds"] += wait
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                # The caller went away while queued: release its place
+                for _, bucket, amount in reservations:
+                    bucket.give_back(amount)
+                raise
+
+        self._stats["admitted"] += 1
+        yield Admission(session_tokens, reservations[-1][2] if session_tokens is not None else 0)
+
+    def observe_headers(self, headers):
+        """Resize and clamp the global buckets from an upstream response's rate-limit headers"""
+        for kind, bucket in (("requests", self.requests), ("tokens", self.tokens)):
+            limit = _header_number(headers, f"x-ratelimit-limit-{kind}")
+            if not limit:
+                continue
+            self.upstream[f"limit_{kind}"] = limit
+            self.upstream["from_headers"] = True
+            bucket.resize(limit * self.share)
+            remaining = _header_number(headers, f"x-ratelimit-remaining-{kind}")
+            if remaining is not None:
+                bucket.clamp((remaining - limit * (1 - self.headroom)) / self.processes)
+
+    def stats(self):
+        now = time.monotonic()
+        self.requests._refill(now)
+        self.tokens._refill(now)
+        return {
+            "enabled": self.enabled,
+            "upstream": dict(self.upstream),
+            "processes": self.processes,
+            "global": {
+                "rpm": round(self.requests.capacity),
+                "tpm": round(self.tokens.capacity),
+                # Negative while calls are queued
+                "requests_available": round(self.requests.tokens, 1),
+                "tokens_available": round(self.tokens.tokens)
+            },
+            "session": {"rpm": self.session_rpm, "tpm": self.session_tpm, "tracked": len(self._sessions)},
+            "max_wait_seconds": self.max_wait,
+            "admitted": self._stats["admitted"],
+            "queued": self._stats["queued"],
+            "queued_seconds": round(self._stats["queued_seconds"], 2),
+            "rejected": dict(self._stats["rejected"])
+        }
+
+
+admission_controller = AdmissionController()
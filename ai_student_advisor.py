@@ -1,119 +1,60 @@
-import os
-from openai import OpenAI
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
-from sklearn.pipeline import Pipeline
-from collections import defaultdict
-
-# Initialize OpenAI clientimport os
-from openai import OpenAI
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
-from sklearn.pipeline import Pipeline
-from collections import defaultdict
-
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+import json
+import time
+import hashlib
+import llm_gateway
+import numpy as np
+from intent_model import load_intent_classifier
+from intent_batcher import IntentBatcher
+from response_cache import SemanticResponseCache, normalize_question
+from session_store import BoundedSessionStore
+from session_backend import get_session_backend
+from prompt_builder import build_prompt
+from topic_tracker import TopicTracker
+from conversation_memory import ConversationMemory
+from single_flight import llm_single_flight
+from admission_control import AdmissionRejectedError
+from session_backend import SessionBusyError
+from resilience import CircuitOpenError, is_retryable
+from metrics import stage, observe_stage
 
 # ----------------------------
-# ENHANCED Intent Classification (60+ examples)
+# Intent Classification (prebuilt artifact, see intent_model.py)
 # ----------------------------
-training_data = [
-    # Study Guidance (15 examples)
-    ("How can I prepare for exams?", "study_guidance"),
-    ("How do I study better?", "study_guidance"),
-    ("Best study techniques", "study_guidance"),
-    ("Time management for students", "study_guidance"),
-    ("How to focus while studying", "study_guidance"),
-    ("Study schedule tips", "study_guidance"),
-    ("Memory improvement techniques", "study_guidance"),
-    ("How to take better notes", "study_guidance"),
-    ("Effective study methods", "study_guidance"),
-    ("How to avoid procrastination", "study_guidance"),
-    ("I can't concentrate on studies", "study_guidance"),
-    ("How to prepare for competitive exams", "study_guidance"),
-    ("Best apps for studying", "study_guidance"),
-    ("How to revise effectively", "study_guidance"),
-    ("Tips for last minute exam prep", "study_guidance"),
-    
-    # Career Guidance (15 examples)
-    ("I am confused about my career", "career_guidance"),
-    ("AI or Data Science which is better", "career_guidance"),
-    ("Which career should I choose", "career_guidance"),
-    ("Career paths in technology", "career_guidance"),
-    ("Job opportunities in AI", "career_guidance"),
-    ("Should I pursue ML engineering", "career_guidance"),
-    ("Fresher job advice", "career_guidance"),
-    ("Career roadmap for developers", "career_guidance"),
-    ("Software engineer vs data scientist", "career_guidance"),
-    ("Best tech career for beginners", "career_guidance"),
-    ("How to switch to tech career", "career_guidance"),
-    ("Is cybersecurity a good career", "career_guidance"),
-    ("Career prospects in cloud computing", "career_guidance"),
-    ("Should I do MBA or MTech", "career_guidance"),
-    ("How to get into FAANG companies", "career_guidance"),
-    
-    # Concept Explanation (15 examples)
-    ("Explain machine learning", "concept_explanation"),
-    ("What is artificial intelligence", "concept_explanation"),
-    ("Difference between ML and DL", "concept_explanation"),
-    ("How does neural network work", "concept_explanation"),
-    ("What is deep learning", "concept_explanation"),
-    ("Explain supervised learning", "concept_explanation"),
-    ("What is NLP", "concept_explanation"),
-    ("Computer vision basics", "concept_explanation"),
-    ("What are transformers in AI", "concept_explanation"),
-    ("Explain reinforcement learning", "concept_explanation"),
-    ("What is LLM", "concept_explanation"),
-    ("Difference between AI and ML", "concept_explanation"),
-    ("How does ChatGPT work", "concept_explanation"),
-    ("What is prompt engineering", "concept_explanation"),
-    ("Explain cloud computing", "concept_explanation"),
-    
-    # Skill Recommendation (10 examples)
-    ("How to learn Python", "skill_recommendation"),
-    ("Skills needed for AI jobs", "skill_recommendation"),
-    ("Best programming language to learn", "skill_recommendation"),
-    ("Learning path for data science", "skill_recommendation"),
-    ("Should I learn React or Angular", "skill_recommendation"),
-    ("Essential skills for developers", "skill_recommendation"),
-    ("How to become an AI engineer", "skill_recommendation"),
-    ("Roadmap for machine learning", "skill_recommendation"),
-    ("What skills for data analyst", "skill_recommendation"),
-    ("Must learn tools for AI", "skill_recommendation"),
-    
-    # Project Guidance (10 examples)
-    ("Project ideas for resume", "project_guidance"),
-    ("How to build portfolio", "project_guidance"),
-    ("Beginner AI projects", "project_guidance"),
-    ("Good projects for students", "project_guidance"),
-    ("ML project for beginners", "project_guidance"),
-    ("Portfolio projects for data science", "project_guidance"),
-    ("Real world AI project ideas", "project_guidance"),
-    ("Projects to showcase skills", "project_guidance"),
-    ("Easy Python projects for beginners", "project_guidance"),
-    ("Web development project ideas", "project_guidance"),
-]
-
-X_train = [x[0] for x in training_data]
-y_train = [x[1] for x in training_data]
-
-intent_classifier = Pipeline([
-    ("tfidf", TfidfVectorizer(ngram_range=(1, 2), max_features=600)),
-    ("classifier", LogisticRegression(max_iter=1500, C=1.2))
-])
-intent_classifier.fit(X_train, y_train)
+intent_classifier = load_intent_classifier()
+
+# Reply cache for context-free questions, matched in the classifier's TF-IDF space
+response_cache = SemanticResponseCache(intent_classifier.named_steps["tfidf"])
 
 # ----------------------------
 # Session Memory (per user)
 # ----------------------------
-user_sessions = defaultdict(list)
+# Recent user messages kept per session for topic-lock detection
+CONTEXT_WINDOW_MESSAGES = 6
+
+# Incremental whole-word topic-lock counters over the same window
+topic_tracker = TopicTracker(window_size=CONTEXT_WINDOW_MESSAGES)
+
+user_sessions = BoundedSessionStore(
+    "user_sessions",
+    max_messages=CONTEXT_WINDOW_MESSAGES,
+    default_factory=list,
+    backend=get_session_backend(),
+    # A window another worker appended to invalidates the incremental counters
+    on_reload=topic_tracker.reset
+)
+
+# Rolling summary plus the latest turns, used as prompt context
+conversation_memory = ConversationMemory(backend=get_session_backend())
 
 # ----------------------------
 # Utility Functions
 # ----------------------------
 def detect_topic_lock(context_text):
-    """Detect if conversation is focused on a specific topic"""
+    """Detect if conversation is focused on a specific topic.
+
+    Original substring-based detector, superseded by topic_tracker for
+    the agent and kept for comparison benchmarks.
+    """
     text = " ".join(context_text).lower()
     
     if text.count("ai") + text.count("data science") >= 3:
@@ -127,443 +68,241 @@ def detect_topic_lock(context_text):
     
     return None
 
+# Below this confidence a message is treated as a general query
+INTENT_CONFIDENCE_THRESHOLD = 0.30
+
+# Messages scored per sparse matrix when classifying large batches
+CLASSIFY_CHUNK_SIZE = 20000
+
+def classify_intents(messages):
+    """Classify a batch of messages in one vectorize + predict_proba pass per chunk.
+
+    Returns a list of (intent, confidence) tuples in input order.
+    """
+    results = []
+    for start in range(0, len(messages), CLASSIFY_CHUNK_SIZE):
+        chunk = messages[start:start + CLASSIFY_CHUNK_SIZE]
+        probabilities = intent_classifier.predict_proba(chunk)
+        best = probabilities.argmax(axis=1)
+        confidences = probabilities[np.arange(len(chunk)), best]
+        labels = intent_classifier.classes_[best]
+        
+        # Lower threshold for better coverage
+        results.extend(
+            (str(label) if confidence >= INTENT_CONFIDENCE_THRESHOLD else "general_query", float(confidence))
+            for label, confidence in zip(labels, confidences)
+        )
+    return results
+
 def predict_intent(user_input):
     """Predict user intent with confidence threshold"""
     try:
-        probabilities = intent_classifier.predict_proba([user_input])[0]
-        max_prob = max(probabilities)
-        
-        # Lower threshold for better coverage
-        if max_prob < 0.30:
-            return "general_query"
-        
-        return intent_classifier.predict([user_input])[0]
-    except:
+        return classify_intents([user_input])[0][0]
+    except Exception:
+        return "general_query"
+
+# Optional micro-batching stage for concurrent requests (started by the app when enabled)
+intent_batcher = IntentBatcher(classify_intents)
+
+async def predict_intent_async(user_input):
+    """predict_intent that goes through the micro-batcher when it is running"""
+    if not intent_batcher.running:
+        return predict_intent(user_input)
+    try:
+        return (await intent_batcher.classify(user_input))[0]
+    except Exception:
         return "general_query"
 
 # ----------------------------
 # Core AI Agent Function
 # ----------------------------
-def ai_student_agent(user_input, session_id="default_user"):
-    """Main AI agent with enhanced formatting and structure"""
-    session = user_sessions[session_id]
-    session.append(user_input)
+def prepare_agent_turn(user_input, session_id="default_user", intent=None):
+    """Record the message in session memory and build the chat messages for the LLM"""
+    # Keep last 6 messages for topic locks (the store trims older ones)
+    with stage("session_window"):
+        session = user_sessions.append_messages(session_id, user_input)
     
-    # Keep last 6 messages for context
-    session = session[-6:]
-    user_sessions[session_id] = session
+    if intent is None:
+        with stage("classify"):
+            intent = predict_intent(user_input)
+    with stage("topic_lock"):
+        topic_lock = topic_tracker.observe(session_id, user_input, session)
+    with stage("context"):
+        summary, context = conversation_memory.context(session_id)
+    with stage("prompt_build"):
+        prompt = build_prompt(user_input, intent, topic_lock, context, summary)
     
-    intent = predict_intent(user_input)
-    topic_lock = detect_topic_lock(session)
-    context_summary = "\n".join(session[-4:])  # Use last 4 for context
-    
-    system_prompt = """You are an expert AI Student Advisor with 10+ years of experience mentoring students in technology, AI, career development, and academic success.
-
-YOUR CORE RESPONSIBILITIES:
-- Provide honest career guidance for students (tech/AI/data science/software)
-- Explain complex technical concepts in simple, relatable terms with real examples
-- Give actionable study advice based on cognitive science and proven techniques
-- Recommend skills, learning paths, and resources with realistic timelines
-- Suggest practical projects that demonstrate real skills to employers
-- Be encouraging but realistic about challenges and time commitments
-- Help students make informed decisions, not just feel good
-
-CRITICAL FORMATTING RULES (MUST FOLLOW EVERY TIME):
-1. **Use bold (double asterisks) for ALL key points, headings, and important terms**
-2. Structure with SHORT paragraphs (2-3 lines maximum each)
-3. Use bullet points (single • character) for ALL lists, steps, and options
-4. Add blank lines between sections for breathing room
-5. Keep total response 200-280 words (concise but complete)
-6. Start with direct answer, then elaborate
-7. End with an encouraging but honest closing line
-
-TONE & PERSONALITY:
-- Friendly senior mentor, not a salesperson or motivational speaker
-- Honest about tradeoffs and realistic timelines
-- Use "you" to make it personal and engaging
-- Explain jargon when used, avoid unnecessary complexity
-- Use 1-2 emojis maximum (only if genuinely appropriate)
-- Balance optimism with pragmatism
-
-ANSWER STRUCTURE (FOLLOW THIS):
-**[Direct Answer]**: Clear 1-2 sentence response to their question.
-
-**[Key Section 1 Heading]**:
-Brief explanation (2-3 lines max) with **important terms** in bold.
-
-**[Key Section 2 Heading]**:
-• Bullet point with actionable detail
-• Another bullet point with specific info
-• Third bullet point if needed
-
-**[Optional Section 3]**:
-Additional context or recommendations.
-
-[Encouraging but realistic closing line.]
-
-EXAMPLE OF PERFECT FORMAT:
-**Career Choice**: Both AI and Data Science are excellent for 2026, and they overlap significantly!
-
-**Key Differences**:
-• **AI Engineering**: Build intelligent systems, work with LLMs, neural networks, and deployment at scale
-• **Data Science**: Extract insights from data, create predictive models, communicate findings to stakeholders
-
-**My Recommendation**:
-Start with **Python fundamentals** and **basic statistics** (2-3 months). Then try a small project in each field—you'll naturally gravitate toward one. Many professionals blend both skills anyway.
-
-**Reality Check**: Entry roles need 6-12 months of focused learning. Start building projects now, they matter more than certificates.
-
-You're asking the right questions—keep that curiosity! 🚀
-
-IMPORTANT NOTES:
-- Always format bullet points with single • character (not multiple characters)
-- Always use **double asterisks** for bold
-- Never skip the structure above
-- Be specific with numbers, timelines, and resources when relevant"""
-
-    # Intent-specific guidance
-    intent_guidance = {
-        "study_guidance": """Give evidence-based study techniques (spaced repetition, active recall, pomodoro).
-Be specific about implementation. Mention realistic time management. Avoid generic advice.""",
-        
-        "career_guidance": """Provide honest career advice with required skills AND realistic timelines.
-Mention current job market realities. Compare options fairly. Give actionable next steps.
-Mention salary ranges if relevant. Be encouraging but don't sugarcoat challenges.""",
-        
-        "concept_explanation": """Explain using simple analogies and real-world examples.
-Break complex ideas into digestible chunks. Bold all technical terms. Use 2-3 bullet points for key aspects.
-Relate to things students already understand.""",
-        
-        "skill_recommendation": """Give clear learning roadmap with time estimates.
-Prioritize essential skills first. Mention 2-3 specific free resources if helpful.
-Realistic time commitment (hours/weeks). Balance depth vs breadth.""",
-        
-        "project_guidance": """Suggest 2-3 specific, practical projects with difficulty levels.
-Explain what skills each teaches and how it looks on resume. Mention typical time to build.
-Focus on projects that demonstrate real competency, not just tutorials.""",
-        
-        "general_query": """Answer helpfully with clear structure. Use bold headings and bullets.
-Be specific rather than vague. Give actionable takeaways."""
+    return {
+        "session_id": session_id,
+        "intent": intent,
+        "topic_lock": topic_lock,
+        "has_context": bool(summary or context),
+        "messages": prompt["messages"],
+        "input_tokens": prompt["input_tokens"],
+        "context_tokens_dropped": prompt["context_tokens_dropped"]
     }
-    
-    user_prompt = f"""Previous conversation context (last 4 messages):
-{context_summary}
-
-Current question intent: {intent}
-Conversation topic focus: {topic_lock if topic_lock else "None - fresh topic"}
 
-Guidance for this intent type:
-{intent_guidance.get(intent, "")}
+def lookup_cached_reply(user_input, turn):
+    """Cached reply for a question asked without prior context, or None"""
+    if turn["has_context"]:
+        return None
+    with stage("cache_lookup"):
+        return response_cache.lookup(user_input, turn["intent"], turn["topic_lock"])
+
+def remember_reply(user_input, turn, reply, cached=False):
+    """Record the turn for the rolling summary and cache replies to fresh questions"""
+    if not reply:
+        return
+    with stage("memory_write"):
+        conversation_memory.record_turn(turn["session_id"], user_input, reply)
+        if not turn["has_context"] and not cached:
+            response_cache.store(user_input, turn["intent"], turn["topic_lock"], reply)
+
+async def remember_reply_async(user_input, turn, reply, cached=False):
+    """remember_reply for the async agents; the session write is offloaded when sessions are shared"""
+    if not reply:
+        return
+    with stage("memory_write"):
+        if await conversation_memory.store.offload(conversation_memory.add_turn, turn["session_id"], user_input, reply):
+            conversation_memory.schedule_refresh(turn["session_id"])
+        if not turn["has_context"] and not cached:
+            response_cache.store(user_input, turn["intent"], turn["topic_lock"], reply)
+
+def chat_flight_key(user_input, turn):
+    """Single-flight key: concurrent identical turns share one upstream call"""
+    if not turn["has_context"]:
+        # Fresh questions are coalesced like they are cached, by normalized text
+        return ("chat", turn["intent"], turn["topic_lock"], normalize_question(user_input))
+    fingerprint = json.dumps(turn["messages"], sort_keys=True).encode("utf-8")
+    return ("chat", hashlib.sha1(fingerprint).hexdigest())
+
+# Sampling parameters shared by the sync and async agent
+AGENT_COMPLETION_PARAMS = {
+    "model": "gpt-4o-mini",
+    "max_tokens": 400,
+    "temperature": 0.7,
+    "top_p": 0.92,
+    "frequency_penalty": 0.3,
+    "presence_penalty": 0.1
+}
+
+def format_agent_error(e):
+    """Turn an upstream exception into a user-facing markdown message"""
+    error_msg = str(e)
+    if isinstance(e, llm_gateway.BulkheadFullError):
+        return "**Busy**: Lots of students are asking right now. Please try again in a few seconds."
+    elif isinstance(e, CircuitOpenError):
+        return f"**Temporarily Unavailable**: The AI service is having trouble right now. Please try again in about {max(1, round(e.retry_after))} seconds."
+    elif "api_key" in error_msg.lower():
+        return "**Error**: Invalid or missing OpenAI API key. Please check your .env file!\n\nMake sure you have:\n`OPENAI_API_KEY=sk-proj-your-key-here`"
+    elif "rate_limit" in error_msg.lower():
+        return "**Rate Limited**: Too many requests. Please wait a moment and try again."
+    else:
+        return f"**Error**: I encountered a technical issue: {error_msg}\n\nPlease try again or rephrase your question!"
+
+# Appended to cached replies served while the upstream is failing
+DEGRADED_REPLY_NOTE = "\n\n*The AI service is having trouble right now, so this is an earlier answer to a similar question.*"
+
+class AgentStreamError(Exception):
+    """A streamed reply failed; the message is the user-facing error text"""
+
+def cached_fallback(user_input, turn, e):
+    """A cached answer to serve while the upstream is down, or None"""
+    if isinstance(e, CircuitOpenError) or is_retryable(e):
+        # Mid-conversation turns skip the cache normally, but an approximate answer beats an error
+        cached = response_cache.lookup(user_input, turn["intent"], turn["topic_lock"])
+        if cached:
+            return cached + DEGRADED_REPLY_NOTE
+    return None
 
-User's current question:
-"{user_input}"
+def degraded_reply(user_input, turn, e):
+    """Reply for a failed turn: a cached answer while the upstream is down, else the error message"""
+    return cached_fallback(user_input, turn, e) or format_agent_error(e)
 
-CRITICAL REMINDERS:
-- Use **bold** (double asterisks) for all key points and headings
-- Use single • character for bullet points
-- Keep paragraphs SHORT (2-3 lines maximum)
-- Be specific with numbers, timelines, resources
-- Add encouraging but realistic tone
-- Follow the structure in your system prompt exactly"""
+def ai_student_agent(user_input, session_id="default_user"):
+    """Main AI agent with enhanced formatting and structure (blocking)"""
+    turn = prepare_agent_turn(user_input, session_id)
+    cached = lookup_cached_reply(user_input, turn)
+    if cached:
+        remember_reply(user_input, turn, cached, cached=True)
+        return cached
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            max_tokens=400,
-            temperature=0.7,
-            top_p=0.92,
-            frequency_penalty=0.3,
-            presence_penalty=0.1
-        )
+        with stage("upstream"):
+            response = llm_gateway.chat_completion_sync(
+                messages=turn["messages"],
+                **AGENT_COMPLETION_PARAMS
+            )
         
-        return response.choices[0].message.content
+        reply = response.choices[0].message.content
+        remember_reply(user_input, turn, reply)
+        return reply
     
     except Exception as e:
-        error_msg = str(e)
-        if "api_key" in error_msg.lower():
-            return "**Error**: Invalid or missing OpenAI API key. Please check your .env file!\n\nMake sure you have:\n`OPENAI_API_KEY=sk-proj-your-key-here`"
-        elif "rate_limit" in error_msg.lower():
-            return "**Rate Limited**: Too many requests. Please wait a moment and try again."
-        else:
-            return f"**Error**: I encountered a technical issue: {error_msg}\n\nPlease try again or rephrase your question!"
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-# ----------------------------
-# ENHANCED Intent Classification (60+ examples)
-# ----------------------------
-training_data = [
-    # Study Guidance (15 examples)
-    ("How can I prepare for exams?", "study_guidance"),
-    ("How do I study better?", "study_guidance"),
-    ("Best study techniques", "study_guidance"),
-    ("Time management for students", "study_guidance"),
-    ("How to focus while studying", "study_guidance"),
-    ("Study schedule tips", "study_guidance"),
-    ("Memory improvement techniques", "study_guidance"),
-    ("How to take better notes", "study_guidance"),
-    ("Effective study methods", "study_guidance"),
-    ("How to avoid procrastination", "study_guidance"),
-    ("I can't concentrate on studies", "study_guidance"),
-    ("How to prepare for competitive exams", "study_guidance"),
-    ("Best apps for studying", "study_guidance"),
-    ("How to revise effectively", "study_guidance"),
-    ("Tips for last minute exam prep", "study_guidance"),
-    
-    # Career Guidance (15 examples)
-    ("I am confused about my career", "career_guidance"),
-    ("AI or Data Science which is better", "career_guidance"),
-    ("Which career should I choose", "career_guidance"),
-    ("Career paths in technology", "career_guidance"),
-    ("Job opportunities in AI", "career_guidance"),
-    ("Should I pursue ML engineering", "career_guidance"),
-    ("Fresher job advice", "career_guidance"),
-    ("Career roadmap for developers", "career_guidance"),
-    ("Software engineer vs data scientist", "career_guidance"),
-    ("Best tech career for beginners", "career_guidance"),
-    ("How to switch to tech career", "career_guidance"),
-    ("Is cybersecurity a good career", "career_guidance"),
-    ("Career prospects in cloud computing", "career_guidance"),
-    ("Should I do MBA or MTech", "career_guidance"),
-    ("How to get into FAANG companies", "career_guidance"),
-    
-    # Concept Explanation (15 examples)
-    ("Explain machine learning", "concept_explanation"),
-    ("What is artificial intelligence", "concept_explanation"),
-    ("Difference between ML and DL", "concept_explanation"),
-    ("How does neural network work", "concept_explanation"),
-    ("What is deep learning", "concept_explanation"),
-    ("Explain supervised learning", "concept_explanation"),
-    ("What is NLP", "concept_explanation"),
-    ("Computer vision basics", "concept_explanation"),
-    ("What are transformers in AI", "concept_explanation"),
-    ("Explain reinforcement learning", "concept_explanation"),
-    ("What is LLM", "concept_explanation"),
-    ("Difference between AI and ML", "concept_explanation"),
-    ("How does ChatGPT work", "concept_explanation"),
-    ("What is prompt engineering", "concept_explanation"),
-    ("Explain cloud computing", "concept_explanation"),
-    
-    # Skill Recommendation (10 examples)
-    ("How to learn Python", "skill_recommendation"),
-    ("Skills needed for AI jobs", "skill_recommendation"),
-    ("Best programming language to learn", "skill_recommendation"),
-    ("Learning path for data science", "skill_recommendation"),
-    ("Should I learn React or Angular", "skill_recommendation"),
-    ("Essential skills for developers", "skill_recommendation"),
-    ("How to become an AI engineer", "skill_recommendation"),
-    ("Roadmap for machine learning", "skill_recommendation"),
-    ("What skills for data analyst", "skill_recommendation"),
-    ("Must learn tools for AI", "skill_recommendation"),
-    
-    # Project Guidance (10 examples)
-    ("Project ideas for resume", "project_guidance"),
-    ("How to build portfolio", "project_guidance"),
-    ("Beginner AI projects", "project_guidance"),
-    ("Good projects for students", "project_guidance"),
-    ("ML project for beginners", "project_guidance"),
-    ("Portfolio projects for data science", "project_guidance"),
-    ("Real world AI project ideas", "project_guidance"),
-    ("Projects to showcase skills", "project_guidance"),
-    ("Easy Python projects for beginners", "project_guidance"),
-    ("Web development project ideas", "project_guidance"),
-]
-
-X_train = [x[0] for x in training_data]
-y_train = [x[1] for x in training_data]
-
-intent_classifier = Pipeline([
-    ("tfidf", TfidfVectorizer(ngram_range=(1, 2), max_features=600)),
-    ("classifier", LogisticRegression(max_iter=1500, C=1.2))
-])
-intent_classifier.fit(X_train, y_train)
-
-# ----------------------------
-# Session Memory (per user)
-# ----------------------------
-user_sessions = defaultdict(list)
-
-# ----------------------------
-# Utility Functions
-# ----------------------------
-def detect_topic_lock(context_text):
-    """Detect if conversation is focused on a specific topic"""
-    text = " ".join(context_text).lower()
-    
-    if text.count("ai") + text.count("data science") >= 3:
-        return "ai_vs_data_science"
-    if text.count("career") >= 2:
-        return "career_focus"
-    if text.count("study") + text.count("exam") >= 2:
-        return "study_focus"
-    if text.count("project") >= 2:
-        return "project_focus"
-    
-    return None
+        return degraded_reply(user_input, turn, e)
+
+async def ai_student_agent_async(user_input, session_id="default_user"):
+    """Async variant of ai_student_agent that does not block the event loop"""
+    with stage("classify"):
+        intent = await predict_intent_async(user_input)
+    turn = await user_sessions.offload(prepare_agent_turn, user_input, session_id, intent)
+    cached = lookup_cached_reply(user_input, turn)
+    if cached:
+        await remember_reply_async(user_input, turn, cached, cached=True)
+        return cached
+
+    async def complete():
+        response = await llm_gateway.chat_completion(
+            llm_gateway.CHAT,
+            messages=turn["messages"],
+            **AGENT_COMPLETION_PARAMS
+        )
+        return response.choices[0].message.content
 
-def predict_intent(user_input):
-    """Predict user intent with confidence threshold"""
     try:
-        probabilities = intent_classifier.predict_proba([user_input])[0]
-        max_prob = max(probabilities)
-        
-        # Lower threshold for better coverage
-        if max_prob < 0.30:
-            return "general_query"
-        
-        return intent_classifier.predict([user_input])[0]
-    except:
-        return "general_query"
-
-# ----------------------------
-# Core AI Agent Function
-# ----------------------------
-def ai_student_agent(user_input, session_id="default_user"):
-    """Main AI agent with enhanced formatting and structure"""
-    session = user_sessions[session_id]
-    session.append(user_input)
-    
-    # Keep last 6 messages for context
-    session = session[-6:]
-    user_sessions[session_id] = session
-    
-    intent = predict_intent(user_input)
-    topic_lock = detect_topic_lock(session)
-    context_summary = "\n".join(session[-4:])  # Use last 4 for context
+        with stage("upstream"):
+            reply = await llm_single_flight.do(chat_flight_key(user_input, turn), complete)
+        await remember_reply_async(user_input, turn, reply)
+        return reply
     
-    system_prompt = """You are an expert AI Student Advisor with 10+ years of experience mentoring students in technology, AI, career development, and academic success.
-
-YOUR CORE RESPONSIBILITIES:
-- Provide honest career guidance for students (tech/AI/data science/software)
-- Explain complex technical concepts in simple, relatable terms with real examples
-- Give actionable study advice based on cognitive science and proven techniques
-- Recommend skills, learning paths, and resources with realistic timelines
-- Suggest practical projects that demonstrate real skills to employers
-- Be encouraging but realistic about challenges and time commitments
-- Help students make informed decisions, not just feel good
-
-CRITICAL FORMATTING RULES (MUST FOLLOW EVERY TIME):
-1. **Use bold (double asterisks) for ALL key points, headings, and important terms**
-2. Structure with SHORT paragraphs (2-3 lines maximum each)
-3. Use bullet points (single • character) for ALL lists, steps, and options
-4. Add blank lines between sections for breathing room
-5. Keep total response 200-280 words (concise but complete)
-6. Start with direct answer, then elaborate
-7. End with an encouraging but honest closing line
-
-TONE & PERSONALITY:
-- Friendly senior mentor, not a salesperson or motivational speaker
-- Honest about tradeoffs and realistic timelines
-- Use "you" to make it personal and engaging
-- Explain jargon when used, avoid unnecessary complexity
-- Use 1-2 emojis maximum (only if genuinely appropriate)
-- Balance optimism with pragmatism
-
-ANSWER STRUCTURE (FOLLOW THIS):
-**[Direct Answer]**: Clear 1-2 sentence response to their question.
-
-**[Key Section 1 Heading]**:
-Brief explanation (2-3 lines max) with **important terms** in bold.
-
-**[Key Section 2 Heading]**:
-• Bullet point with actionable detail
-• Another bullet point with specific info
-• Third bullet point if needed
-
-**[Optional Section 3]**:
-Additional context or recommendations.
-
-[Encouraging but realistic closing line.]
-
-EXAMPLE OF PERFECT FORMAT:
-**Career Choice**: Both AI and Data Science are excellent for 2026, and they overlap significantly!
-
-**Key Differences**:
-• **AI Engineering**: Build intelligent systems, work with LLMs, neural networks, and deployment at scale
-• **Data Science**: Extract insights from data, create predictive models, communicate findings to stakeholders
-
-**My Recommendation**:
-Start with **Python fundamentals** and **basic statistics** (2-3 months). Then try a small project in each field—you'll naturally gravitate toward one. Many professionals blend both skills anyway.
-
-**Reality Check**: Entry roles need 6-12 months of focused learning. Start building projects now, they matter more than certificates.
-
-You're asking the right questions—keep that curiosity! 🚀
-
-IMPORTANT NOTES:
-- Always format bullet points with single • character (not multiple characters)
-- Always use **double asterisks** for bold
-- Never skip the structure above
-- Be specific with numbers, timelines, and resources when relevant"""
-
-    # Intent-specific guidance
-    intent_guidance = {
-        "study_guidance": """Give evidence-based study techniques (spaced repetition, active recall, pomodoro).
-Be specific about implementation. Mention realistic time management. Avoid generic advice.""",
-        
-        "career_guidance": """Provide honest career advice with required skills AND realistic timelines.
-Mention current job market realities. Compare options fairly. Give actionable next steps.
-Mention salary ranges if relevant. Be encouraging but don't sugarcoat challenges.""",
-        
-        "concept_explanation": """Explain using simple analogies and real-world examples.
-Break complex ideas into digestible chunks. Bold all technical terms. Use 2-3 bullet points for key aspects.
-Relate to things students already understand.""",
-        
-        "skill_recommendation": """Give clear learning roadmap with time estimates.
-Prioritize essential skills first. Mention 2-3 specific free resources if helpful.
-Realistic time commitment (hours/weeks). Balance depth vs breadth.""",
-        
-        "project_guidance": """Suggest 2-3 specific, practical projects with difficulty levels.
-Explain what skills each teaches and how it looks on resume. Mention typical time to build.
-Focus on projects that demonstrate real competency, not just tutorials.""",
-        
-        "general_query": """Answer helpfully with clear structure. Use bold headings and bullets.
-Be specific rather than vague. Give actionable takeaways."""
-    }
-    
-    user_prompt = f"""Previous conversation context (last 4 messages):
-{context_summary}
-
-Current question intent: {intent}
-Conversation topic focus: {topic_lock if topic_lock else "None - fresh topic"}
-
-Guidance for this intent type:
-{intent_guidance.get(intent, "")}
-
-User's current question:
-"{user_input}"
-
-CRITICAL REMINDERS:
-- Use **bold** (double asterisks) for all key points and headings
-- Use single • character for bullet points
-- Keep paragraphs SHORT (2-3 lines maximum)
-- Be specific with numbers, timelines, resources
-- Add encouraging but realistic tone
-- Follow the structure in your system prompt exactly"""
+    except (AdmissionRejectedError, SessionBusyError):
+        # Surfaced by the endpoint as a 429/503 with Retry-After
+        raise
+    except Exception as e:
+        return degraded_reply(user_input, turn, e)
+
+async def ai_student_agent_stream(user_input, session_id="default_user"):
+    """Streaming variant of ai_student_agent_async, yields the reply as text deltas"""
+    with stage("classify"):
+        intent = await predict_intent_async(user_input)
+    turn = await user_sessions.offload(prepare_agent_turn, user_input, session_id, intent)
+    cached = lookup_cached_reply(user_input, turn)
+    if cached:
+        await remember_reply_async(user_input, turn, cached, cached=True)
+        yield cached
+        return
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            max_tokens=400,
-            temperature=0.7,
-            top_p=0.92,
-            frequency_penalty=0.3,
-            presence_penalty=0.1
-        )
+        parts = []
+        started = time.perf_counter()
+        async for delta in llm_gateway.stream_chat_completion(
+            llm_gateway.CHAT,
+            messages=turn["messages"],
+            **AGENT_COMPLETION_PARAMS
+        ):
+            if not parts:
+                observe_stage("upstream_first_delta", time.perf_counter() - started)
+            parts.append(delta)
+            yield delta
         
-        return response.choices[0].message.content
+        await remember_reply_async(user_input, turn, "".join(parts))
     
+    except (AdmissionRejectedError, SessionBusyError):
+        raise
     except Exception as e:
-        error_msg = str(e)
-        if "api_key" in error_msg.lower():
-            return "**Error**: Invalid or missing OpenAI API key. Please check your .env file!\n\nMake sure you have:\n`OPENAI_API_KEY=sk-proj-your-key-here`"
-        elif "rate_limit" in error_msg.lower():
-            return "**Rate Limited**: Too many requests. Please wait a moment and try again."
-        else:
-            return f"**Error**: I encountered a technical issue: {error_msg}\n\nPlease try again or rephrase your question!"
\ No newline at end of file
+        # Once part of the reply is out, a cached answer would not fit after it
+        fallback = None if parts else cached_fallback(user_input, turn, e)
+        if fallback is None:
+            # Raised rather than yielded, so the error text never becomes part of the stored reply
+            raise AgentStreamError(format_agent_error(e)) from e
+        yield fallback
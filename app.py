@@ -1,19 +1,82 @@
+import logging
+import math
+import os
+
+# Configure logging before the advisor import so model-load timings are visible
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO"),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+)
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
 from fastapi import FastAPI, Request, UploadFile, File, Form
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse, Response
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from ai_student_advisor import ai_student_agent
-import os
-import base64
+from ai_student_advisor import (
+    ai_student_agent_async, ai_student_agent_stream, AgentStreamError, response_cache,
+    classify_intents, intent_batcher, user_sessions, topic_tracker, conversation_memory
+)
+from intent_batcher import INTENT_BATCHING_ENABLED
+from session_store import BoundedSessionStore, sweep_periodically
+from session_backend import get_session_backend
+from session_index import SessionIndex, session_owner
+from intent_model import load_report
+from prompt_builder import prompt_stats
+from image_preprocessor import (
+    ImageRejectedError, hash_image, prepare_image, data_url, image_analysis_cache, image_stats
+)
+from upload_limits import (
+    UploadLimitMiddleware, UploadTooLargeError, upload_too_large_response, check_upload_size,
+    UPLOAD_MAX_IMAGE_BYTES, UPLOAD_MAX_RESUME_BYTES
+)
+from content_cache import file_hash
+from response_cache import normalize_question
+from single_flight import llm_single_flight
+from metrics import MetricsMiddleware, registry, callback, stage
+from admission_control import (
+    AdmissionRejectedError, admission_controller, bind_session, rate_limited_response
+)
+from quiz_pool import quiz_pool, render_quiz, QuizValidationError, QUIZ_POOL_ENABLED
+from resume_parser import (
+    ResumeParseError, parse_resume, resume_parse_cache, resume_feedback_cache, resume_stats
+)
+from process_stats import server_stats
+from session_backend import SessionBusyError
+import image_preprocessor
+from contextlib import asynccontextmanager
+import asyncio
+import llm_gateway
+import hashlib
 from datetime import datetime
 import json
-from typing import Optional
+from typing import Optional, List
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup/shutdown hooks for shared resources"""
+    sessions_db.rebuild_index()
+    if INTENT_BATCHING_ENABLED:
+        intent_batcher.start()
+    if QUIZ_POOL_ENABLED:
+        quiz_pool.start()
+    sweeper = asyncio.create_task(sweep_periodically([user_sessions, sessions_db, conversation_memory.store]))
+    yield
+    sweeper.cancel()
+    await intent_batcher.stop()
+    await conversation_memory.stop()
+    await quiz_pool.stop()
+    await llm_gateway.aclose()
+    get_session_backend().close()
+    image_preprocessor.shutdown()
 
 app = FastAPI(
     title="AI Student Advisor v2.1",
     description="Advanced AI advisor with image analysis, resume review, and quiz generation",
-    version="2.1.0"
+    version="2.1.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -24,10 +87,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-endpoint upload size limits, enforced while the body is received
+app.add_middleware(UploadLimitMiddleware)
+
+# Request counts, latency and in-flight gauges per route (outermost, so rejected uploads count too)
+app.add_middleware(MetricsMiddleware)
+
+@app.exception_handler(UploadTooLargeError)
+async def handle_upload_too_large(request: Request, exc: UploadTooLargeError):
+    return upload_too_large_response(exc)
+
 templates = Jinja2Templates(directory="templates")
 
-# In-memory session storage (replace with database in production)
-sessions_db = {}
+# Session storage, bounded by count, idle TTL and messages per session
+# (persisted when SESSION_BACKEND=sqlite)
+sessions_db = BoundedSessionStore(
+    "sessions_db",
+    messages_key="messages",
+    backend=get_session_backend(),
+    index=SessionIndex()
+)
+
+# Page size bounds for GET /sessions
+SESSIONS_PAGE_DEFAULT = 50
+SESSIONS_PAGE_MAX = 200
 
 class UserQuery(BaseModel):
     message: str
@@ -38,55 +121,108 @@ class SessionData(BaseModel):
     session_id: str
     title: Optional[str] = None
 
+class ClassifyRequest(BaseModel):
+    messages: List[str]
+
+# Upper bound on messages per /classify call (split bigger jobs client-side)
+CLASSIFY_MAX_MESSAGES = int(os.getenv("CLASSIFY_MAX_MESSAGES", "100000"))
+
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
     """Serve the main chat interface"""
     return templates.TemplateResponse("index.html", {"request": request})
 
+def validate_message(message):
+    """Return a 400 response for an invalid chat message, or None if it is fine"""
+    if not message or len(message.strip()) == 0:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Message cannot be empty"}
+        )
+    
+    if len(message) > 2000:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Message too long (max 2000 characters)"}
+        )
+    
+    return None
+
+def record_exchange(session_id, message, reply):
+    """Append a user/assistant turn to the stored session and return its message count"""
+    def new_session():
+        return {
+            "messages": [],
+            "created_at": datetime.now().isoformat(),
+            "title": message[:60]
+        }
+    
+    with stage("session_write"):
+        # Created in the append's transaction, so a concurrent first turn on another worker is not lost
+        session = sessions_db.append_messages(
+            session_id,
+            {
+                "role": "user",
+                "content": message,
+                "timestamp": datetime.now().isoformat()
+            },
+            {
+                "role": "assistant",
+                "content": reply,
+                "timestamp": datetime.now().isoformat()
+            },
+            create=new_session
+        )
+    
+    return len(session["messages"])
+
+def circuit_open_response(error):
+    """503 for a call refused while the upstream circuit breaker is open"""
+    retry_after = max(1, math.ceil(error.retry_after))
+    return JSONResponse(
+        status_code=503,
+        content={"error": str(error), "retry_after": retry_after},
+        headers={"Retry-After": str(retry_after)}
+    )
+
+def session_busy_response(error):
+    """503 for a session write that timed out waiting for another worker's lock"""
+    return JSONResponse(
+        status_code=503,
+        content={"error": str(error), "retry_after": error.retry_after},
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
+def sse_event(data, event=None):
+    """Format one server-sent event"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
 @app.post("/chat")
 async def chat(query: UserQuery):
     """Handle regular chat requests"""
     try:
-        if not query.message or len(query.message.strip()) == 0:
-            return JSONResponse(
-                status_code=400,
-                content={"error": "Message cannot be empty"}
-            )
-        
-        if len(query.message) > 2000:
-            return JSONResponse(
-                status_code=400,
-                content={"error": "Message too long (max 2000 characters)"}
-            )
+        invalid = validate_message(query.message)
+        if invalid:
+            return invalid
         
         # Get AI response
-        reply = ai_student_agent(query.message, query.session_id)
+        bind_session(query.session_id)
+        reply = await ai_student_agent_async(query.message, query.session_id)
         
         # Store in session
-        if query.session_id not in sessions_db:
-            sessions_db[query.session_id] = {
-                "messages": [],
-                "created_at": datetime.now().isoformat(),
-                "title": query.message[:60]
-            }
-        
-        sessions_db[query.session_id]["messages"].append({
-            "role": "user",
-            "content": query.message,
-            "timestamp": datetime.now().isoformat()
-        })
-        sessions_db[query.session_id]["messages"].append({
-            "role": "assistant",
-            "content": reply,
-            "timestamp": datetime.now().isoformat()
-        })
+        message_count = await sessions_db.offload(record_exchange, query.session_id, query.message, reply)
         
         return {
             "response": reply,
             "session_id": query.session_id,
-            "message_count": len(sessions_db[query.session_id]["messages"])
+            "message_count": message_count
         }
         
+    except AdmissionRejectedError as e:
+        return rate_limited_response(e)
+    except SessionBusyError as e:
+        return session_busy_response(e)
     except Exception as e:
         return JSONResponse(
             status_code=500,
@@ -96,6 +232,59 @@ async def chat(query: UserQuery):
             }
         )
 
+@app.post("/chat/stream")
+async def chat_stream(query: UserQuery):
+    """Stream the chat reply as server-sent events (delta events, then a done event)"""
+    invalid = validate_message(query.message)
+    if invalid:
+        return invalid
+    
+    bind_session(query.session_id)
+    deltas = ai_student_agent_stream(query.message, query.session_id)
+    try:
+        # Start the reply before responding, so a call that is not admitted gets a real 429
+        first = await anext(deltas, None)
+    except AdmissionRejectedError as e:
+        return rate_limited_response(e)
+    except SessionBusyError as e:
+        return session_busy_response(e)
+    except AgentStreamError as e:
+        return JSONResponse(
+            status_code=502,
+            content={"error": str(e)}
+        )
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content={"error": f"Server error: {str(e)}"}
+        )
+    
+    async def event_stream():
+        parts = []
+        try:
+            if first is not None:
+                parts.append(first)
+                yield sse_event({"delta": first})
+            async for delta in deltas:
+                parts.append(delta)
+                yield sse_event({"delta": delta})
+            
+            # Store the complete reply once the stream has finished
+            message_count = await sessions_db.offload(record_exchange, query.session_id, query.message, "".join(parts))
+            yield sse_event({"session_id": query.session_id, "message_count": message_count}, event="done")
+        
+        except AgentStreamError as e:
+            # A failed reply is not stored, so later turns and summaries never see the error text
+            yield sse_event({"error": str(e)}, event="error")
+        except Exception as e:
+            yield sse_event({"error": f"Server error: {str(e)}"}, event="error")
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/upload-image")
 async def upload_image(
     file: UploadFile = File(...),
@@ -104,23 +293,37 @@ async def upload_image(
 ):
     """Handle image uploads and analysis"""
     try:
-        # Read image
-        contents = await file.read()
-        base64_image = base64.b64encode(contents).decode('utf-8')
+        # The upload is already spooled (to disk when large); it is hashed
+        # and decoded from the file without reading it into memory
+        check_upload_size(file, UPLOAD_MAX_IMAGE_BYTES)
+        bind_session(session_id)
+
+        # Re-uploads of the same image with the same prompt reuse the analysis
+        digest = await hash_image(file.file)
+        cached = image_analysis_cache.lookup(digest, prompt)
+        if cached:
+            return {
+                "response": cached,
+                "image_processed": True,
+                "filename": file.filename,
+                "cached": True
+            }
+
+        # Downscale, strip metadata and re-encode off the event loop
+        prepared = await prepare_image(file.file)
         
         # Analyze with GPT-4o (vision model)
-        from openai import OpenAI
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": f"""You are an AI Student Advisor analyzing an image.
+        async def analyze():
+            response = await llm_gateway.chat_completion(
+                llm_gateway.VISION,
+                model="gpt-4o-mini",
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "text",
+                                "text": f"""You are an AI Student Advisor analyzing an image.
 
 Context: {prompt}
 
@@ -131,27 +334,52 @@ Provide helpful analysis for students:
 - If it's notes: Summarize key points
 
 Use **bold** for key terms and • bullets for lists."""
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}"
+                            },
+                            {
+                                "type": "image_url",
+                                "image_url": {
+                                    "url": data_url(prepared)
+                                }
                             }
-                        }
-                    ]
-                }
-            ],
-            max_tokens=500
-        )
-        
-        analysis = response.choices[0].message.content
+                        ]
+                    }
+                ],
+                max_tokens=500
+            )
+            return response.choices[0].message.content
+
+        analysis = await llm_single_flight.do(("image", digest, normalize_question(prompt)), analyze)
+        if analysis:
+            image_analysis_cache.store(digest, prompt, analysis)
         
         return {
             "response": analysis,
             "image_processed": True,
-            "filename": file.filename
+            "filename": file.filename,
+            "image": {
+                "original_bytes": prepared["original_bytes"],
+                "sent_bytes": prepared["bytes"],
+                "size": prepared["size"],
+                "mime_type": prepared["mime_type"]
+            }
         }
         
+    except ImageRejectedError as e:
+        return JSONResponse(
+            status_code=400,
+            content={"error": str(e)}
+        )
+    except AdmissionRejectedError as e:
+        return rate_limited_response(e)
+    except llm_gateway.CircuitOpenError as e:
+        return circuit_open_response(e)
+    except llm_gateway.BulkheadFullError as e:
+        return JSONResponse(
+            status_code=503,
+            content={"error": str(e)}
+        )
+    except UploadTooLargeError as e:
+        return upload_too_large_response(e)
     except Exception as e:
         return JSONResponse(
             status_code=500,
@@ -166,19 +394,29 @@ async def analyze_resume(
 ):
     """Analyze resume and provide feedback"""
     try:
-        contents = await file.read()
-        text_content = contents.decode('utf-8', errors='ignore')
+        check_upload_size(file, UPLOAD_MAX_RESUME_BYTES)
+        bind_session(session_id)
+
+        # Repeat submissions for the same role skip the LLM; other roles reuse the parse
+        digest = await run_in_threadpool(file_hash, file.file)
+        cached = resume_feedback_cache.lookup(digest, target_role)
+        if cached:
+            return {**cached, "filename": file.filename, "cached": True}
+
+        parsed = resume_parse_cache.lookup(digest)
+        if parsed is None:
+            parsed = await run_in_threadpool(parse_resume, file.file)
+            resume_parse_cache.store(digest, "", parsed)
         
         # Analyze resume with specialized prompt
-        from openai import OpenAI
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": """You are an expert career advisor and resume reviewer with 10+ years of experience.
+        async def review():
+            response = await llm_gateway.chat_completion(
+                llm_gateway.RESUME,
+                model="gpt-4o-mini",
+                messages=[
+                    {
+                        "role": "system",
+                        "content": """You are an expert career advisor and resume reviewer with 10+ years of experience.
 
 Provide structured feedback on resumes:
 
@@ -197,30 +435,51 @@ Provide structured feedback on resumes:
 • Concrete step 2
 
 Be honest but encouraging. Focus on actionable improvements."""
-                },
-                {
-                    "role": "user",
-                    "content": f"""Target Role: {target_role}
+                    },
+                    {
+                        "role": "user",
+                        "content": f"""Target Role: {target_role}
 
-Resume Content:
-{text_content[:3000]}
+Resume Content ({parsed["format"]}, sections: {", ".join(parsed["sections_found"]) or "none detected"}):
+{parsed["digest"]}
 
 Provide comprehensive feedback."""
-                }
-            ],
-            max_tokens=600,
-            temperature=0.7
-        )
-        
-        feedback = response.choices[0].message.content
-        
-        return {
+                    }
+                ],
+                max_tokens=600,
+                temperature=0.7
+            )
+            return response.choices[0].message.content
+
+        feedback = await llm_single_flight.do(("resume", digest, normalize_question(target_role)), review)
+        result = {
             "response": feedback,
             "resume_analyzed": True,
             "target_role": target_role,
-            "filename": file.filename
+            "sections_found": parsed["sections_found"],
+            "sections_missing": parsed["sections_missing"]
         }
+        if feedback:
+            resume_feedback_cache.store(digest, target_role, result)
+        
+        return {**result, "filename": file.filename}
         
+    except ResumeParseError as e:
+        return JSONResponse(
+            status_code=400,
+            content={"error": str(e)}
+        )
+    except AdmissionRejectedError as e:
+        return rate_limited_response(e)
+    except llm_gateway.CircuitOpenError as e:
+        return circuit_open_response(e)
+    except llm_gateway.BulkheadFullError as e:
+        return JSONResponse(
+            status_code=503,
+            content={"error": str(e)}
+        )
+    except UploadTooLargeError as e:
+        return upload_too_large_response(e)
     except Exception as e:
         return JSONResponse(
             status_code=500,
@@ -231,75 +490,82 @@ Provide comprehensive feedback."""
 async def generate_quiz(query: UserQuery):
     """Generate a quiz on any topic"""
     try:
-        from openai import OpenAI
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        # Popular topics are served from the pre-generated pool
+        bind_session(query.session_id)
+        quiz, source = await quiz_pool.get(query.message)
         
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": """You are a quiz generator for students. Create engaging, educational quizzes.
-
-Format EXACTLY like this:
-
-**Quiz: [Topic]** (5 questions)
-
-**Q1**: Question text here?
-A) Option A
-B) Option B
-C) Option C
-D) Option D
-*Correct: A*
-*Explanation*: Brief explanation why.
-
-**Q2**: Next question?
-...
-
-Make questions:
-- Clear and unambiguous
-- Educational and relevant
-- Progressive difficulty
-- Include explanations"""
-                },
-                {
-                    "role": "user",
-                    "content": f"Create a 5-question quiz about: {query.message}"
-                }
-            ],
-            max_tokens=800,
-            temperature=0.8
+        return {
+            "response": render_quiz(quiz, query.message),
+            "quiz": quiz,
+            "quiz_generated": True,
+            "topic": query.message,
+            "source": source
+        }
+        
+    except QuizValidationError as e:
+        return JSONResponse(
+            status_code=502,
+            content={"error": str(e)}
         )
+    except AdmissionRejectedError as e:
+        return rate_limited_response(e)
+    except llm_gateway.CircuitOpenError as e:
+        return circuit_open_response(e)
+    except llm_gateway.BulkheadFullError as e:
+        return JSONResponse(
+            status_code=503,
+            content={"error": str(e)}
+        )
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content={"error": f"Quiz generation error: {str(e)}"}
+        )
+
+@app.post("/classify")
+async def classify(request: ClassifyRequest):
+    """Classify a batch of messages (bulk intent analytics)"""
+    try:
+        if len(request.messages) > CLASSIFY_MAX_MESSAGES:
+            return JSONResponse(
+                status_code=413,
+                content={"error": f"Too many messages (max {CLASSIFY_MAX_MESSAGES} per request)"}
+            )
         
-        quiz = response.choices[0].message.content
+        # Vectorizing a large batch is CPU-bound, keep it off the event loop
+        results = await run_in_threadpool(classify_intents, request.messages)
         
         return {
-            "response": quiz,
-            "quiz_generated": True,
-            "topic": query.message
+            "results": [
+                {"intent": intent, "confidence": round(confidence, 4)}
+                for intent, confidence in results
+            ],
+            "count": len(results)
         }
         
     except Exception as e:
         return JSONResponse(
             status_code=500,
-            content={"error": f"Quiz generation error: {str(e)}"}
+            content={"error": f"Classification error: {str(e)}"}
         )
 
 @app.get("/sessions")
-async def get_sessions(session_id: str):
-    """Get all sessions for a user"""
+async def get_sessions(session_id: str, cursor: Optional[str] = None, limit: int = SESSIONS_PAGE_DEFAULT):
+    """Get a user's sessions, most recently active first (cursor-paginated)"""
     try:
-        user_sessions = {
-            sid: {
-                "title": data["title"],
-                "created_at": data["created_at"],
-                "message_count": len(data["messages"])
-            }
-            for sid, data in sessions_db.items()
-            if sid.startswith(session_id.split('_')[0])
-        }
+        limit = max(1, min(limit, SESSIONS_PAGE_MAX))
+        try:
+            page, next_cursor = await sessions_db.offload(sessions_db.list_page, session_owner(session_id), cursor, limit)
+        except ValueError as e:
+            return JSONResponse(
+                status_code=400,
+                content={"error": str(e)}
+            )
         
-        return {"sessions": user_sessions}
+        return {
+            "sessions": dict(page),
+            "next_cursor": next_cursor
+        }
         
     except Exception as e:
         return JSONResponse(
@@ -307,19 +573,99 @@ async def get_sessions(session_id: str):
             content={"error": str(e)}
         )
 
+def transcript_etag(session, since, limit):
+    """ETag for a transcript view, derived in O(1) from what can change"""
+    messages = session["messages"]
+    fingerprint = "|".join([
+        str(session.get("message_offset", 0)),
+        str(len(messages)),
+        messages[-1]["timestamp"] if messages else "",
+        session.get("title") or "",
+        str(since),
+        str(limit)
+    ])
+    return '"' + hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()[:20] + '"'
+
+def transcript_start(session, since):
+    """Position in the stored message list where a `since` cursor resumes.
+
+    since is either an absolute message index (as returned in next_since)
+    or an ISO timestamp, in which case messages newer than it are returned;
+    anything else raises ValueError.
+    """
+    messages = session["messages"]
+    if since.isdigit():
+        return max(0, int(since) - session.get("message_offset", 0))
+    
+    try:
+        moment = datetime.fromisoformat(since)
+    except ValueError:
+        raise ValueError(f"Invalid since: {since!r} is neither a message index nor an ISO timestamp") from None
+    if moment.tzinfo is not None:
+        # Stored timestamps are naive local time
+        moment = moment.astimezone().replace(tzinfo=None)
+    since = moment.isoformat()
+    
+    # Timestamps are ISO strings appended in order, so they sort lexically
+    low, high = 0, len(messages)
+    while low < high:
+        mid = (low + high) // 2
+        if messages[mid]["timestamp"] <= since:
+            low = mid + 1
+        else:
+            high = mid
+    return low
+
 @app.get("/session/{session_id}")
-async def get_session(session_id: str):
-    """Get specific session data"""
+async def get_session(request: Request, session_id: str, since: Optional[str] = None, limit: Optional[int] = None):
+    """Get specific session data, optionally only the messages after a cursor"""
     try:
-        if session_id not in sessions_db:
+        if limit is not None and limit < 0:
+            return JSONResponse(
+                status_code=400,
+                content={"error": f"Invalid limit: {limit} is negative"}
+            )
+        
+        session = await sessions_db.offload(sessions_db.get, session_id)
+        if session is None:
             return JSONResponse(
                 status_code=404,
                 content={"error": "Session not found"}
             )
         
-        return {
-            "session": sessions_db[session_id]
-        }
+        # Unchanged view: skip slicing and JSON encoding entirely
+        etag = transcript_etag(session, since, limit)
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        
+        if since is None and limit is None:
+            # message_offset is internal bookkeeping for trimmed messages
+            public = {key: value for key, value in session.items() if key != "message_offset"}
+            return JSONResponse(content={"session": public}, headers={"ETag": etag})
+        
+        offset = session.get("message_offset", 0)
+        try:
+            start = transcript_start(session, since) if since else 0
+        except ValueError as e:
+            return JSONResponse(
+                status_code=400,
+                content={"error": str(e)}
+            )
+        end = len(session["messages"]) if limit is None else start + limit
+        messages = session["messages"][start:end]
+        
+        return JSONResponse(
+            content={
+                "session": {
+                    "title": session["title"],
+                    "created_at": session["created_at"],
+                    "messages": messages
+                },
+                "total_messages": offset + len(session["messages"]),
+                "next_since": offset + start + len(messages)
+            },
+            headers={"ETag": etag}
+        )
         
     except Exception as e:
         return JSONResponse(
@@ -330,14 +676,22 @@ async def get_session(session_id: str):
 @app.delete("/session/{session_id}")
 async def delete_session(session_id: str):
     """Delete a session"""
-    try:
-        if session_id in sessions_db:
+    def delete():
+        try:
             del sessions_db[session_id]
+            return True
+        except KeyError:
+            return False
+    
+    try:
+        if await sessions_db.offload(delete):
             return {"status": "deleted", "session_id": session_id}
         return JSONResponse(
             status_code=404,
             content={"error": "Session not found"}
         )
+    except SessionBusyError as e:
+        return session_busy_response(e)
     except Exception as e:
         return JSONResponse(
             status_code=500,
@@ -347,18 +701,82 @@ async def delete_session(session_id: str):
 @app.post("/reset")
 async def reset_session(data: SessionData):
     """Reset user session"""
-    try:
-        from ai_student_advisor import user_sessions
+    def reset():
         user_sessions[data.session_id] = []
-        if data.session_id in sessions_db:
-            sessions_db[data.session_id]["messages"] = []
+        topic_tracker.reset(data.session_id)
+        conversation_memory.reset(data.session_id)
+        sessions_db.clear_messages(data.session_id)
+    
+    try:
+        await sessions_db.offload(reset)
         return {"status": "success", "message": "Session reset"}
+    except SessionBusyError as e:
+        return session_busy_response(e)
     except Exception as e:
         return JSONResponse(
             status_code=500,
             content={"error": str(e)}
         )
 
+# ----------------------------
+# Metrics (read from the components' own stats at scrape time)
+# ----------------------------
+CONTENT_CACHES = {
+    "response": response_cache,
+    "image_analysis": image_analysis_cache,
+    "resume_parse": resume_parse_cache,
+    "resume_feedback": resume_feedback_cache,
+}
+
+def _cache_lookups():
+    values = {}
+    for name, cache in CONTENT_CACHES.items():
+        stats = cache.stats()
+        values[(name, "hit")] = stats["hits"]
+        values[(name, "miss")] = stats["misses"]
+    return values
+
+def _gateway_values(field, *path):
+    values = {}
+    for endpoint_class, stats in llm_gateway.gateway_stats().items():
+        for key in path:
+            stats = stats.get(key) if stats else None
+        values[(endpoint_class,)] = stats[field] if stats else None
+    return values
+
+callback("cache_lookups_total", "Cache lookups by result", _cache_lookups, ("cache", "result"), kind="counter")
+callback("cache_entries", "Entries held per cache",
+         lambda: {(name,): cache.stats()["entries"] for name, cache in CONTENT_CACHES.items()}, ("cache",))
+callback("llm_in_flight", "Upstream calls holding a bulkhead slot",
+         lambda: _gateway_values("in_flight", "bulkhead"), ("endpoint_class",))
+callback("llm_waiting", "Upstream calls waiting for a bulkhead slot",
+         lambda: _gateway_values("waiting", "bulkhead"), ("endpoint_class",))
+callback("llm_retries_total", "Upstream call attempts that were retried",
+         lambda: _gateway_values("retries"), ("endpoint_class",), kind="counter")
+callback("llm_hedges_total", "Hedged second requests sent",
+         lambda: _gateway_values("hedges", "latency"), ("endpoint_class",), kind="counter")
+callback("llm_circuit_open", "1 while the endpoint class's circuit breaker is not closed",
+         lambda: {labels: int(state != "closed") for labels, state in _gateway_values("state", "breaker").items()},
+         ("endpoint_class",))
+callback("single_flight_calls_avoided_total", "LLM calls served by joining an identical in-flight call",
+         lambda: {(kind,): counts["coalesced"] for kind, counts in llm_single_flight.stats()["by_kind"].items()},
+         ("kind",), kind="counter")
+callback("admission_rejected_total", "LLM calls rejected by admission control",
+         lambda: {(scope,): count for scope, count in admission_controller.stats()["rejected"].items()},
+         ("scope",), kind="counter")
+callback("admission_queued_total", "LLM calls that waited for rate-limit room",
+         lambda: {(): admission_controller.stats()["queued"]}, kind="counter")
+callback("quiz_requests_total", "Quiz requests by source",
+         lambda: {("pool",): quiz_pool.stats()["pool_hits"], ("live",): quiz_pool.stats()["live_generations"]},
+         ("source",), kind="counter")
+callback("sessions_active", "Sessions held in memory",
+         lambda: {("user_sessions",): len(user_sessions), ("sessions_db",): len(sessions_db)}, ("store",))
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics in the text exposition format"""
+    return Response(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -372,7 +790,23 @@ async def health_check():
             "resume_review",
             "quiz_generation",
             "session_history"
-        ]
+        ],
+        "response_cache": response_cache.stats(),
+        "intent_model": load_report,
+        "intent_batcher": intent_batcher.stats(),
+        "prompt": prompt_stats(),
+        "conversation_summary": conversation_memory.stats(),
+        "images": image_stats(),
+        "resumes": resume_stats(),
+        "quiz_pool": quiz_pool.stats(),
+        "llm_gateway": llm_gateway.gateway_stats(),
+        "single_flight": llm_single_flight.stats(),
+        "admission": admission_controller.stats(),
+        "sessions": {
+            "user_sessions": user_sessions.stats(),
+            "sessions_db": sessions_db.stats()
+        },
+        "server": server_stats()
     }
 
 if __name__ == "__main__":
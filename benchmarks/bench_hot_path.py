@@ -0,0 +1,217 @@
+"""Microbenchmarks of the in-process work done on every chat turn, with regression baselines.
+
+Covers intent prediction, topic-lock detection (legacy scan and the
+incremental tracker), prompt assembly, the response-cache lookup, and
+session appends for the topic window (user_sessions) and the transcript
+store (sessions_db) with 1 to 10k sessions held. Each case is timed as the
+best of several repeats and compared with benchmarks/baselines/hot_path.json.
+Run from the repository root:
+
+    python benchmarks/bench_hot_path.py [--only prompt] [--tolerance 1.3] [--update-baseline]
+
+Exits non-zero when a case is slower than its baseline times the tolerance.
+Baselines are machine-specific: record them with --update-baseline on the
+machine that runs the comparison.
+"""
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# In-memory sessions, no background batching: only the in-process work is measured
+os.environ.pop("SESSION_BACKEND", None)
+os.environ["INTENT_BATCHING"] = "0"
+
+from ai_student_advisor import predict_intent, detect_topic_lock, response_cache
+from topic_tracker import TopicTracker
+from prompt_builder import build_prompt
+from session_store import BoundedSessionStore
+from session_backend import SessionBackend
+from session_index import SessionIndex
+
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baselines", "hot_path.json")
+
+SHORT_MESSAGES = [
+    "What is recursion?",
+    "How do I prepare for my exams?",
+    "Explain big O notation",
+    "Is data science a good career?",
+    "Help me pick a final year project",
+    "I feel stressed about finals",
+    "What is the difference between a list and a tuple in Python?",
+    "Can you review my study plan for next week?",
+]
+
+SESSION_COUNTS = (1, 100, 10000)
+
+
+def long_message(rng, words=300):
+    vocab = " ".join(SHORT_MESSAGES).split()
+    return " ".join(rng.choice(vocab) for _ in range(words))
+
+
+def corpus(kind, rng, size=64):
+    if kind == "short":
+        return [rng.choice(SHORT_MESSAGES) for _ in range(size)]
+    return [long_message(rng) for _ in range(size)]
+
+
+# ----------------------------
+# Cases (each returns an op(i) to time)
+# ----------------------------
+def case_predict_intent(kind, rng):
+    messages = corpus(kind, rng)
+    return lambda i: predict_intent(messages[i % len(messages)])
+
+
+def case_detect_topic_lock(kind, rng):
+    # The window is a list of messages, as in prepare_agent_turn
+    windows = [corpus(kind, rng, 6) for _ in range(16)]
+    return lambda i: detect_topic_lock(windows[i % len(windows)])
+
+
+def case_topic_tracker(kind, rng):
+    tracker = TopicTracker(window_size=6)
+    messages = corpus(kind, rng)
+    windows = {}
+
+    def op(i):
+        session_id = f"s{i % 100}"
+        # The window is the session's stored message list, as in prepare_agent_turn
+        window = windows.setdefault(session_id, [])
+        message = messages[i % len(messages)]
+        window.append(message)
+        del window[:-6]
+        tracker.observe(session_id, message, window)
+    return op
+
+
+def case_build_prompt(kind, rng):
+    messages = corpus(kind, rng)
+    context = [f"Student: {message}\nAdvisor: {message}" for message in corpus(kind, rng, 6)]
+    summary = "The student is preparing for data structures exams and asked about recursion and hashing."
+    return lambda i: build_prompt(messages[i % len(messages)], "study_help", None, context, summary)
+
+
+def case_cache_lookup(kind, rng):
+    # Misses: the common case, and the expensive one (full similarity scan)
+    messages = [f"{message} {rng.getrandbits(32):x}q" for message in corpus(kind, rng)]
+    return lambda i: response_cache.lookup(messages[i % len(messages)], "general_query", None)
+
+
+def case_user_sessions(sessions, rng):
+    store = BoundedSessionStore("bench_user_sessions", max_messages=6, default_factory=list, backend=SessionBackend())
+    ids = [f"user-{n}" for n in range(sessions)]
+    for session_id in ids:
+        store.append_messages(session_id, *SHORT_MESSAGES[:6])
+    order = [rng.choice(ids) for _ in range(4096)]
+    return lambda i: store.append_messages(order[i % len(order)], SHORT_MESSAGES[i % len(SHORT_MESSAGES)])
+
+
+def case_sessions_db(sessions, rng):
+    store = BoundedSessionStore("bench_sessions_db", messages_key="messages", backend=SessionBackend(), index=SessionIndex())
+    ids = [f"browser{n % 50}_{n}" for n in range(sessions)]
+    for session_id in ids:
+        store[session_id] = {"messages": [], "created_at": "2026-01-01T00:00:00", "title": "Bench"}
+        store.append_messages(session_id, {"role": "user", "content": "hi", "timestamp": "2026-01-01T00:00:00"})
+    order = [rng.choice(ids) for _ in range(4096)]
+    user = {"role": "user", "content": SHORT_MESSAGES[0], "timestamp": "2026-01-01T00:00:01"}
+    reply = {"role": "assistant", "content": "**Answer**: a reply", "timestamp": "2026-01-01T00:00:02"}
+    return lambda i: store.append_messages(order[i % len(order)], user, reply)
+
+
+CASES = {
+    **{f"predict_intent/{kind}": (case_predict_intent, kind) for kind in ("short", "long")},
+    **{f"detect_topic_lock/{kind}": (case_detect_topic_lock, kind) for kind in ("short", "long")},
+    **{f"topic_tracker/{kind}": (case_topic_tracker, kind) for kind in ("short", "long")},
+    **{f"build_prompt/{kind}": (case_build_prompt, kind) for kind in ("short", "long")},
+    **{f"cache_lookup/{kind}": (case_cache_lookup, kind) for kind in ("short", "long")},
+    **{f"user_sessions_append/{n}": (case_user_sessions, n) for n in SESSION_COUNTS},
+    **{f"sessions_db_append/{n}": (case_sessions_db, n) for n in SESSION_COUNTS},
+}
+
+
+def time_case(op, min_seconds, repeats):
+    """Best per-call time in microseconds over repeats, each running for about min_seconds"""
+    # Calibrate the iteration count, warming caches and lazy state on the way
+    iterations = 1
+    while True:
+        started = time.perf_counter()
+        for i in range(iterations):
+            op(i)
+        if time.perf_counter() - started >= min_seconds / 4:
+            break
+        iterations *= 4
+
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for i in range(iterations):
+            op(i)
+        best = min(best, (time.perf_counter() - started) / iterations)
+    return best * 1e6
+
+
+def machine():
+    return {"python": platform.python_version(), "machine": platform.machine(),
+            "system": platform.system(), "cpus": os.cpu_count()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", help="run the cases whose name contains this")
+    parser.add_argument("--min-seconds", type=float, default=0.2, help="time per repeat")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, help="allowed slowdown factor (default: the baseline's)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="record the results as the new baseline")
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    tolerance = args.tolerance or baseline.get("tolerance", 1.3)
+    # Differences this small are timer noise, whatever the ratio
+    min_regression_us = baseline.get("min_regression_us", 0.5)
+    if baseline and baseline.get("machine") != machine():
+        print(f"Note: baseline was recorded on {baseline.get('machine')}, this is {machine()}\n")
+
+    results, regressions = {}, []
+    print(f"{'case':<28} {'us/call':>10} {'baseline':>10} {'ratio':>7}")
+    for name, (factory, param) in CASES.items():
+        if args.only and args.only not in name:
+            continue
+        us = time_case(factory(param, random.Random(0)), args.min_seconds, args.repeats)
+        results[name] = round(us, 3)
+        before = baseline.get("results", {}).get(name)
+        ratio = us / before if before else None
+        regressed = ratio is not None and ratio > tolerance and us - before > min_regression_us
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<28} {us:>10.2f} {before if before else '-':>10} "
+              f"{f'{ratio:.2f}' if ratio else '-':>7}{'  SLOWER' if regressed else ''}")
+
+    if args.update_baseline:
+        recorded = {**baseline.get("results", {}), **results}
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump({"machine": machine(), "tolerance": tolerance, "min_regression_us": min_regression_us,
+                       "results": recorded}, f, indent=2)
+            f.write("\n")
+        print(f"\nBaseline written to {os.path.relpath(args.baseline)}")
+        return
+
+    if regressions:
+        print(f"\n{len(regressions)} case(s) more than {tolerance}x slower than the baseline: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,423 @@
+"""End-to-end load test of app.py against the local fake OpenAI server.
+
+Starts benchmarks/fake_openai.py and the app (uvicorn) on free ports, then
+drives /chat, /chat/stream, /generate-quiz, /upload-image and
+/analyze-resume from closed-loop virtual users for a fixed duration.
+Reports requests/sec, p50/p95/p99 latency per endpoint and the app's peak
+RSS, and writes them as JSON. Run from the repository root:
+
+    python benchmarks/bench_load.py [--concurrency 32] [--duration 30] \\
+        [--mix chat=60,chat_stream=15,quiz=10,image=8,resume=7] \\
+        [--fake-args "--median-ms 400 --error-rate 0.02"] [--app-env KEY=VALUE ...] \\
+        [--output FILE] [--baseline FILE]
+
+Pass --url to load an app that is already running (no RSS then, unless --pid).
+"""
+import io
+import os
+import sys
+import json
+import time
+import shlex
+import random
+import socket
+import asyncio
+import argparse
+import subprocess
+from datetime import datetime, timezone
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+CHAT_QUESTIONS = [
+    "What is recursion and when should I use it?",
+    "How do I prepare for a data structures exam?",
+    "Explain the difference between a process and a thread",
+    "What career paths are there in data science?",
+    "How can I stay motivated during finals week?",
+    "Can you explain how hash tables handle collisions?",
+    "What should I put in my first software engineering resume?",
+    "How do I start learning machine learning?",
+    "Explain big O notation with examples",
+    "What is the best way to take notes in lectures?",
+    "How do I choose a final year project?",
+    "What is the difference between SQL and NoSQL databases?",
+]
+
+QUIZ_TOPICS = ["Python basics", "Binary trees", "Operating systems", "Statistics", "World history", "Linear algebra"]
+
+RESUME = """Alex Student
+alex@example.com | github.com/alex
+
+Summary
+Computer science student interested in backend development.
+
+Experience
+Software Engineering Intern, Example Corp (Summer 2025)
+• Built REST endpoints in Python and FastAPI
+• Cut report generation time by 40% with SQL indexing
+
+Projects
+• Study planner web app (React, Node.js)
+• Sentiment analysis of course reviews (scikit-learn)
+
+Skills
+Python, Java, SQL, Git, Docker
+
+Education
+BSc Computer Science, Example University, 2026
+"""
+
+DEFAULT_MIX = "chat=60,chat_stream=15,quiz=10,image=8,resume=7"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def make_images(count=4, size=(1280, 960)):
+    """Photo-like JPEGs: smooth gradients with sensor noise"""
+    import numpy as np
+    from PIL import Image
+    rng = np.random.default_rng(0)
+    images = []
+    for i in range(count):
+        y, x = np.mgrid[0:size[1], 0:size[0]]
+        base = np.stack([(x * (i + 1)) % 256, (y * 2) % 256, ((x + y) // 3) % 256], axis=-1)
+        pixels = np.clip(base + rng.normal(0, 12, base.shape), 0, 255).astype(np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, "JPEG", quality=90)
+        images.append(buffer.getvalue())
+    return images
+
+
+# ----------------------------
+# Workload
+# ----------------------------
+class Workload:
+    """Request payloads; a repeat_ratio share reuses cacheable inputs, the rest are made unique"""
+
+    def __init__(self, sessions, repeat_ratio, seed=0):
+        self.rng = random.Random(seed)
+        self.sessions = [f"load-{i}" for i in range(sessions)]
+        self.repeat_ratio = repeat_ratio
+        self.images = make_images()
+
+    def _unique(self, text):
+        if self.rng.random() < self.repeat_ratio:
+            return text
+        # An unknown word defeats the exact and the semantic cache alike
+        return f"{text} (ref {self.rng.getrandbits(40):x}z)"
+
+    def session(self):
+        return self.rng.choice(self.sessions)
+
+    def question(self):
+        return self._unique(self.rng.choice(CHAT_QUESTIONS))
+
+    def topic(self):
+        return self._unique(self.rng.choice(QUIZ_TOPICS))
+
+    def image(self):
+        return self.rng.choice(self.images), self._unique("Explain this diagram")
+
+    def target_role(self):
+        return self._unique(self.rng.choice(["Software Engineer", "Data Analyst", "Backend Developer"]))
+
+
+async def send_chat(client, workload):
+    response = await client.post("/chat", json={"message": workload.question(), "session_id": workload.session()})
+    return response.status_code, None
+
+
+async def send_chat_stream(client, workload):
+    started = time.perf_counter()
+    first_delta = None
+    payload = {"message": workload.question(), "session_id": workload.session()}
+    async with client.stream("POST", "/chat/stream", json=payload) as response:
+        async for line in response.aiter_lines():
+            if first_delta is None and line.startswith("data:") and '"delta"' in line:
+                first_delta = time.perf_counter() - started
+    return response.status_code, first_delta
+
+
+async def send_quiz(client, workload):
+    response = await client.post("/generate-quiz", json={"message": workload.topic(), "session_id": workload.session()})
+    return response.status_code, None
+
+
+async def send_image(client, workload):
+    image, prompt = workload.image()
+    response = await client.post(
+        "/upload-image",
+        files={"file": ("photo.jpg", image, "image/jpeg")},
+        data={"session_id": workload.session(), "prompt": prompt}
+    )
+    return response.status_code, None
+
+
+async def send_resume(client, workload):
+    response = await client.post(
+        "/analyze-resume",
+        files={"file": ("resume.txt", RESUME.encode(), "text/plain")},
+        data={"session_id": workload.session(), "target_role": workload.target_role()}
+    )
+    return response.status_code, None
+
+
+SENDERS = {
+    "chat": send_chat,
+    "chat_stream": send_chat_stream,
+    "quiz": send_quiz,
+    "image": send_image,
+    "resume": send_resume,
+}
+
+
+async def run_load(url, workload, mix, concurrency, duration, warmup):
+    """Closed loop: each virtual user sends its next request as soon as the last one finishes"""
+    kinds, weights = zip(*mix.items())
+    samples = {kind: [] for kind in kinds}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    started = time.monotonic()
+    record_from = started + warmup
+    deadline = record_from + duration
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120) as client:
+        async def user():
+            while time.monotonic() < deadline:
+                kind = workload.rng.choices(kinds, weights)[0]
+                sent = time.monotonic()
+                request_started = time.perf_counter()
+                try:
+                    status, first_delta = await SENDERS[kind](client, workload)
+                except httpx.HTTPError as e:
+                    status, first_delta = type(e).__name__, None
+                elapsed = time.perf_counter() - request_started
+                if sent >= record_from and time.monotonic() <= deadline:
+                    samples[kind].append((status, elapsed, first_delta))
+
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+    return samples
+
+
+# ----------------------------
+# Reporting
+# ----------------------------
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+
+def summarize(samples, duration):
+    def describe(entries):
+        ok = [elapsed for status, elapsed, _ in entries if isinstance(status, int) and status < 400]
+        first = [delta for status, _, delta in entries if delta is not None]
+        statuses = {}
+        for status, _, _ in entries:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        summary = {
+            "requests": len(entries),
+            "ok": len(ok),
+            "errors": len(entries) - len(ok),
+            "rps": round(len(entries) / duration, 2),
+            "statuses": statuses,
+            # Latency of successful requests, in milliseconds
+            **{f"p{q}_ms": round(percentile(ok, q) * 1000, 1) if ok else None for q in (50, 95, 99)},
+            "max_ms": round(max(ok) * 1000, 1) if ok else None
+        }
+        if first:
+            summary["first_delta_p50_ms"] = round(percentile(first, 50) * 1000, 1)
+            summary["first_delta_p95_ms"] = round(percentile(first, 95) * 1000, 1)
+        return summary
+
+    endpoints = {kind: describe(entries) for kind, entries in samples.items()}
+    overall = describe([entry for entries in samples.values() for entry in entries])
+    return overall, endpoints
+
+
+def rss_mb(pid, field):
+    """VmRSS (current) or VmHWM (peak) of a process, from /proc (Linux only)"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith(field + ":"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+    return None
+
+
+def git_revision():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+        dirty = bool(subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, text=True).strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def print_report(result, baseline=None):
+    print(f"{'endpoint':<12} {'req/s':>8} {'ok':>7} {'err':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    rows = list(result["endpoints"].items()) + [("overall", result["overall"])]
+    for name, stats in rows:
+        print(f"{name:<12} {stats['rps']:>8} {stats['ok']:>7} {stats['errors']:>5} "
+              f"{stats['p50_ms'] or '-':>8} {stats['p95_ms'] or '-':>8} {stats['p99_ms'] or '-':>8}")
+    print(f"App RSS: {result['rss_start_mb']} MB at start, {result['peak_rss_mb']} MB peak")
+
+    if baseline:
+        print(f"\nAgainst baseline {baseline.get('commit')} ({baseline.get('timestamp')}):")
+        for name, stats in rows:
+            before = baseline["overall"] if name == "overall" else baseline["endpoints"].get(name)
+            if not before or not before.get("rps") or not before.get("p95_ms") or not stats.get("p95_ms"):
+                continue
+            rps_change = (stats["rps"] / before["rps"] - 1) * 100
+            p95_change = (stats["p95_ms"] / before["p95_ms"] - 1) * 100
+            print(f"  {name:<12} req/s {rps_change:+6.1f}%   p95 {p95_change:+6.1f}%")
+
+
+# ----------------------------
+# Processes
+# ----------------------------
+def wait_ready(url, path, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode}")
+        try:
+            if httpx.get(url + path, timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready in {timeout}s")
+
+
+def start_processes(args):
+    fake_port, app_port = free_port(), free_port()
+    fake = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "benchmarks", "fake_openai.py"), "--port", str(fake_port),
+         *shlex.split(args.fake_args)],
+        cwd=ROOT
+    )
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "sk-fake-load-test",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{fake_port}/v1",
+        "LOG_LEVEL": "WARNING",
+    }
+    env.update(item.split("=", 1) for item in args.app_env)
+    app = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(app_port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=ROOT, env=env
+    )
+    processes = [app, fake]
+    try:
+        wait_ready(f"http://127.0.0.1:{fake_port}", "/stats", fake)
+        wait_ready(f"http://127.0.0.1:{app_port}", "/health", app)
+    except Exception:
+        stop_processes(processes)
+        raise
+    return f"http://127.0.0.1:{app_port}", app.pid, processes
+
+
+def stop_processes(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(","):
+        kind, _, weight = item.partition("=")
+        if kind not in SENDERS:
+            raise SystemExit(f"Unknown endpoint {kind!r} in --mix (choose from {', '.join(SENDERS)})")
+        if float(weight or 1) > 0:
+            mix[kind] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30, help="seconds measured, after the warmup")
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="endpoint weights, e.g. chat=1 for chat only")
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--repeat-ratio", type=float, default=0.2, help="share of requests that repeat a cacheable input")
+    parser.add_argument("--fake-args", default="", help="arguments for fake_openai.py, e.g. \"--median-ms 800 --error-rate 0.05\"")
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE", help="extra environment for the app")
+    parser.add_argument("--url", help="load an already running app instead of starting one")
+    parser.add_argument("--pid", type=int, help="app process to read the RSS of, with --url")
+    parser.add_argument("--output", help="result file (default benchmarks/results/load-<commit>-<time>.json)")
+    parser.add_argument("--baseline", help="earlier result file to compare with")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    workload = Workload(args.sessions, args.repeat_ratio, args.seed)
+    processes = []
+    url, pid = args.url, args.pid
+    if url is None:
+        url, pid, processes = start_processes(args)
+
+    try:
+        rss_start = rss_mb(pid, "VmRSS") if pid else None
+        samples = asyncio.run(run_load(url, workload, mix, args.concurrency, args.duration, args.warmup))
+        peak_rss = rss_mb(pid, "VmHWM") if pid else None
+    finally:
+        stop_processes(processes)
+
+    overall, endpoints = summarize(samples, args.duration)
+    commit, dirty = git_revision()
+    result = {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "mix": mix,
+            "sessions": args.sessions,
+            "repeat_ratio": args.repeat_ratio,
+            "fake_args": args.fake_args,
+            "app_env": args.app_env,
+            "cpus": os.cpu_count()
+        },
+        "overall": overall,
+        "endpoints": endpoints,
+        "rss_start_mb": rss_start,
+        "peak_rss_mb": peak_rss
+    }
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"load-{commit or 'unknown'}{'-dirty' if dirty else ''}-{stamp}.json")
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+    print(f"\nResults written to {os.path.relpath(output)}")
+
+
+if __name__ == "__main__":
+    main()
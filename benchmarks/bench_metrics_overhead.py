@@ -0,0 +1,77 @@
+"""Per-call overhead of the metrics instrumentation.
+
+Times the stage timer, a labelled histogram observation and a counter
+increment against an empty loop, and renders a populated registry.
+Run from the repository root:
+
+    python benchmarks/bench_metrics_overhead.py [--iterations 200000] [--max-us 3]
+
+Exits non-zero when a stage timing costs more than --max-us microseconds.
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import stage, STAGE_SECONDS, UPSTREAM_TOKENS, registry
+
+
+def per_call_us(fn, iterations):
+    started = time.perf_counter()
+    fn(iterations)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def empty(iterations):
+    for _ in range(iterations):
+        pass
+
+
+def stage_timer(iterations):
+    for _ in range(iterations):
+        with stage("bench"):
+            pass
+
+
+def observe(iterations):
+    labels = ("bench",)
+    for i in range(iterations):
+        STAGE_SECONDS.observe(i * 1e-7, labels)
+
+
+def count(iterations):
+    labels = ("bench", "prompt")
+    for _ in range(iterations):
+        UPSTREAM_TOKENS.inc(100, labels)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--max-us", type=float, default=3.0)
+    args = parser.parse_args()
+
+    baseline = min(per_call_us(empty, args.iterations) for _ in range(3))
+    results = {}
+    for name, fn in (("stage timer", stage_timer), ("histogram observe", observe), ("counter inc", count)):
+        results[name] = min(per_call_us(fn, args.iterations) for _ in range(3)) - baseline
+
+    started = time.perf_counter()
+    text = registry.render()
+    render_ms = (time.perf_counter() - started) * 1000
+
+    print(f"Per call over an empty loop ({args.iterations} iterations, best of 3):")
+    for name, us in results.items():
+        print(f"  {name:<18} {us:6.3f} us")
+    print(f"Rendering {text.count(chr(10))} lines: {render_ms:.2f} ms")
+
+    over = results["stage timer"] > args.max_us
+    if over:
+        print(f"Stage timer is over the {args.max_us} us budget")
+    sys.exit(1 if over else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Compare the substring topic-lock scan with the incremental TopicTracker.
+
+Run from the repository root:
+
+    python benchmarks/bench_topic_lock.py [--turns 20000] [--windows 6 24]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai_student_advisor import detect_topic_lock
+from topic_tracker import TopicTracker
+
+SHORT_MESSAGES = [
+    "Can you explain recursion?",
+    "I said I am certain about my major",
+    "What should I study for the exam?",
+    "Is AI better than data science for a career?",
+    "Help me plan my final year project",
+    "How do I stay motivated?",
+]
+
+# Messages that should not lock any topic, but contain "ai"/"study"/"project" as substrings
+FALSE_POSITIVE_WINDOWS = [
+    ["Can you explain this again?", "I said I was certain", "Explain the main idea"],
+    ["I am a student", "I am a student again", "Which students did well?"],
+    ["What do projectors do?", "Projectile motion projections"],
+    ["My career counselor", "careerist behaviour"],
+]
+
+
+def long_message(rng, words=400):
+    vocab = " ".join(SHORT_MESSAGES).split()
+    return " ".join(rng.choice(vocab) for _ in range(words))
+
+
+def run_legacy(messages, window_size):
+    window = deque(maxlen=window_size)
+    started = time.perf_counter()
+    for message in messages:
+        window.append(message)
+        detect_topic_lock(list(window))
+    return time.perf_counter() - started
+
+
+def run_tracker(messages, window_size):
+    tracker = TopicTracker(window_size=window_size)
+    started = time.perf_counter()
+    for message in messages:
+        tracker.observe("bench", message)
+    return time.perf_counter() - started
+
+
+def report(label, messages, window_size):
+    legacy = run_legacy(messages, window_size)
+    tracked = run_tracker(messages, window_size)
+    turns = len(messages)
+    print(f"{label:<16} legacy {legacy / turns * 1e6:8.2f} us/turn   "
+          f"tracker {tracked / turns * 1e6:8.2f} us/turn   speedup {legacy / tracked:5.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=20000)
+    parser.add_argument("--windows", type=int, nargs="+", default=[6, 24])
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    short = [rng.choice(SHORT_MESSAGES) for _ in range(args.turns)]
+    long = [long_message(rng) for _ in range(max(args.turns // 10, 1))]
+
+    # The legacy scan grows with the window, the tracker only with the new message
+    for window_size in args.windows:
+        print(f"Per-turn topic-lock cost (window={window_size})")
+        report("short messages", short, window_size)
+        report("long messages", long, window_size)
+
+    print("\nWindows that should not lock a topic")
+    tracker = TopicTracker()
+    for window in FALSE_POSITIVE_WINDOWS:
+        print(f"  legacy={str(detect_topic_lock(window)):<20} tracker={str(tracker.detect(window)):<8} {window}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Peak memory of handling one upload: whole-body reads vs spooled streaming.
+
+Each scenario runs in a fresh process and reports how far the peak RSS
+rose while handling a single upload that has already been spooled to a
+temp file (as Starlette's multipart parser does). Run from the repository
+root:
+
+    python benchmarks/bench_upload_memory.py [--image-mb 12] [--resume-mb 4] [--max-peak-mb 48]
+
+Exits non-zero when a streaming scenario peaks above --max-peak-mb.
+"""
+import os
+import sys
+import base64
+import argparse
+import resource
+import tempfile
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def make_image(path, target_mb):
+    """Noisy JPEG that compresses badly, like a phone photo of a whiteboard"""
+    import numpy as np
+    from PIL import Image
+    side = int((target_mb * 1024 * 1024 / 0.9) ** 0.5)
+    pixels = np.random.default_rng(0).integers(0, 256, (side * 3 // 4, side, 3), dtype=np.uint8)
+    Image.fromarray(pixels).save(path, "JPEG", quality=95)
+
+
+def make_resume(path, target_mb):
+    line = "Built data pipelines in Python and SQL; led a team of four students. \n"
+    with open(path, "w") as f:
+        f.write(line * (target_mb * 1024 * 1024 // len(line)))
+
+
+def spooled_copy(path):
+    from upload_limits import UPLOAD_SPOOL_MAX_BYTES
+    spooled = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_BYTES)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b""):
+            spooled.write(chunk)
+    spooled.seek(0)
+    return spooled
+
+
+# ----------------------------
+# Scenarios (run in a child process)
+# ----------------------------
+def image_whole_body(spooled):
+    # What /upload-image used to do: raw bytes + base64 copy + data URL string
+    contents = spooled.read()
+    base64_image = base64.b64encode(contents).decode("utf-8")
+    return len(f"data:image/jpeg;base64,{base64_image}")
+
+
+def image_streaming(spooled):
+    from image_preprocessor import file_hash, preprocess_image, data_url
+    file_hash(spooled)
+    return len(data_url(preprocess_image(spooled)))
+
+
+def resume_whole_body(spooled):
+    text_content = spooled.read().decode("utf-8", errors="ignore")
+    return len(text_content[:3000])
+
+
+def resume_streaming(spooled):
+    from content_cache import file_hash
+    from resume_parser import parse_resume
+    file_hash(spooled)
+    return len(parse_resume(spooled)["digest"])
+
+
+SCENARIOS = {
+    "image/whole-body": (image_whole_body, "image"),
+    "image/streaming": (image_streaming, "image"),
+    "resume/whole-body": (resume_whole_body, "resume"),
+    "resume/streaming": (resume_streaming, "resume"),
+}
+
+
+def _child(name, path, results):
+    scenario, _ = SCENARIOS[name]
+    # Import everything up front so only the handling itself is measured
+    import image_preprocessor, resume_parser, upload_limits  # noqa: F401
+    spooled = spooled_copy(path)
+    before = peak_rss_mb()
+    scenario(spooled)
+    results[name] = peak_rss_mb() - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--image-mb", type=int, default=12)
+    parser.add_argument("--resume-mb", type=int, default=4)
+    parser.add_argument("--max-peak-mb", type=float, default=48)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        files = {"image": os.path.join(workdir, "upload.jpg"), "resume": os.path.join(workdir, "resume.txt")}
+        make_image(files["image"], args.image_mb)
+        make_resume(files["resume"], args.resume_mb)
+
+        ctx = multiprocessing.get_context("spawn")
+        results = ctx.Manager().dict()
+        for name, (_, kind) in SCENARIOS.items():
+            child = ctx.Process(target=_child, args=(name, files[kind], results))
+            child.start()
+            child.join()
+
+        print(f"Upload sizes: image {os.path.getsize(files['image']) / 1e6:.1f} MB, "
+              f"resume {os.path.getsize(files['resume']) / 1e6:.1f} MB")
+        failed = False
+        for name in SCENARIOS:
+            peak = results.get(name)
+            over = name.endswith("streaming") and peak > args.max_peak_mb
+            failed = failed or over
+            print(f"  {name:<20} peak +{peak:7.1f} MB{'  OVER BUDGET' if over else ''}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
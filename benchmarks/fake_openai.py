@@ -0,0 +1,169 @@
+"""Local stand-in for the OpenAI chat-completions API, for load tests.
+
+Answers POST /v1/chat/completions with canned replies (quiz JSON when a
+response_format is requested), optionally streamed, after a latency drawn
+from a configurable distribution. Errors and hung requests can be
+injected at a given rate. Rate-limit headers are sent like the real API.
+
+    python benchmarks/fake_openai.py [--port 9100] [--latency lognormal] [--median-ms 400] [--error-rate 0.02]
+
+Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:9100/v1.
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+REPLY = (
+    "**Overview**: Here is a structured answer for your question.\n\n"
+    "**Key Points**:\n"
+    "• Start with the fundamentals and build up step by step\n"
+    "• Practice with small, concrete examples before moving on\n"
+    "• Review your mistakes, they show what to study next\n\n"
+    "**Next Steps**: Pick one topic and spend 30 focused minutes on it today."
+)
+
+QUIZ = {
+    "title": "Practice Quiz",
+    "questions": [
+        {
+            "question": f"Sample question {number}?",
+            "options": ["First option", "Second option", "Third option", "Fourth option"],
+            "answer": "ABCD"[number % 4],
+            "explanation": "This is why the answer is correct."
+        }
+        for number in range(1, 6)
+    ]
+}
+
+
+class FakeOpenAI:
+    """Latency, error and streaming behaviour of the fake upstream"""
+
+    def __init__(self, latency="lognormal", median_ms=400, sigma=0.5, error_rate=0.0,
+                 error_statuses=(500,), hang_rate=0.0, hang_seconds=120, stream_chunk_ms=15,
+                 rpm_limit=100000, tpm_limit=50000000, seed=None):
+        self.latency = latency
+        self.median = median_ms / 1000
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.stream_chunk = stream_chunk_ms / 1000
+        self.limits = {"requests": rpm_limit, "tokens": tpm_limit}
+        self.rng = random.Random(seed)
+        self.stats = {"requests": 0, "streams": 0, "errors": 0, "hangs": 0}
+
+    def delay(self):
+        if self.latency == "fixed":
+            return self.median
+        if self.latency == "uniform":
+            return self.rng.uniform(0, 2 * self.median)
+        # Long right tail, like real completion latencies
+        return self.rng.lognormvariate(0, self.sigma) * self.median
+
+    def headers(self):
+        return {
+            "x-ratelimit-limit-requests": str(self.limits["requests"]),
+            "x-ratelimit-limit-tokens": str(self.limits["tokens"]),
+            "x-ratelimit-remaining-requests": str(self.limits["requests"] - 1),
+            "x-ratelimit-remaining-tokens": str(self.limits["tokens"] - 1000),
+        }
+
+    def create_app(self):
+        app = FastAPI()
+
+        @app.post("/v1/chat/completions")
+        async def chat_completions(request: Request):
+            body = await request.json()
+            self.stats["requests"] += 1
+            roll = self.rng.random()
+            if roll < self.hang_rate:
+                self.stats["hangs"] += 1
+                await asyncio.sleep(self.hang_seconds)
+            elif roll < self.hang_rate + self.error_rate:
+                self.stats["errors"] += 1
+                await asyncio.sleep(self.delay() / 4)
+                status = self.rng.choice(self.error_statuses)
+                return JSONResponse(
+                    status_code=status,
+                    content={"error": {"message": f"Injected {status} error", "type": "server_error", "code": None}},
+                    headers={**self.headers(), "retry-after": "1"} if status == 429 else self.headers()
+                )
+
+            text = json.dumps(QUIZ) if body.get("response_format") else REPLY
+            usage = {"prompt_tokens": 300, "completion_tokens": len(text) // 4, "total_tokens": 300 + len(text) // 4}
+
+            if body.get("stream"):
+                self.stats["streams"] += 1
+                return StreamingResponse(self.stream(text), media_type="text/event-stream", headers=self.headers())
+
+            await asyncio.sleep(self.delay())
+            return JSONResponse(
+                {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "gpt-4o-mini"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                    "usage": usage
+                },
+                headers=self.headers()
+            )
+
+        @app.get("/stats")
+        async def stats():
+            return self.stats
+
+        return app
+
+    async def stream(self, text):
+        # Time to first token is the sampled latency; the rest arrives in word-sized chunks
+        await asyncio.sleep(self.delay())
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            delta = word if i == len(words) - 1 else word + " "
+            chunk = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": "gpt-4o-mini",
+                "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}]
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(self.stream_chunk)
+        yield "data: [DONE]\n\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--median-ms", type=float, default=400)
+    parser.add_argument("--sigma", type=float, default=0.5, help="lognormal shape (0.5 puts p99 at about 3.2x the median)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-statuses", default="500", help="comma-separated statuses to inject, e.g. 500,503,429")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="share of requests that never answer in time")
+    parser.add_argument("--hang-seconds", type=float, default=120)
+    parser.add_argument("--stream-chunk-ms", type=float, default=15)
+    parser.add_argument("--rpm-limit", type=int, default=100000)
+    parser.add_argument("--tpm-limit", type=int, default=50000000)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    import uvicorn
+    fake = FakeOpenAI(
+        latency=args.latency, median_ms=args.median_ms, sigma=args.sigma, error_rate=args.error_rate,
+        error_statuses=tuple(int(status) for status in args.error_statuses.split(",")),
+        hang_rate=args.hang_rate, hang_seconds=args.hang_seconds, stream_chunk_ms=args.stream_chunk_ms,
+        rpm_limit=args.rpm_limit, tpm_limit=args.tpm_limit, seed=args.seed
+    )
+    uvicorn.run(fake.create_app(), host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
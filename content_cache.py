@@ -0,0 +1,71 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from response_cache import normalize_question
+
+# ----------------------------
+# Cache Defaults
+# ----------------------------
+CONTENT_CACHE_MAX_ENTRIES = int(os.getenv("CONTENT_CACHE_MAX_ENTRIES", "256"))
+CONTENT_CACHE_TTL_SECONDS = float(os.getenv("CONTENT_CACHE_TTL_SECONDS", "21600"))
+
+
+def file_hash(fileobj, chunk_size=1024 * 1024):
+    """sha256 of a file object's content, read in chunks"""
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(chunk_size), b""):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+class ContentHashCache:
+    """LRU/TTL cache keyed by an upload's content hash and a text variant.
+
+    The variant (an analysis prompt, a target role) is normalized like a
+    question, so casing and punctuation differences still hit.
+    """
+
+    def __init__(self, max_entries=CONTENT_CACHE_MAX_ENTRIES, ttl_seconds=CONTENT_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # (digest, variant) -> (stored_at, value)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    @staticmethod
+    def _key(digest, variant):
+        return (digest, normalize_question(variant))
+
+    def lookup(self, digest, variant=""):
+        key = self._key(digest, variant)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self._stats["misses"] += 1
+            return None
+
+    def store(self, digest, variant, value):
+        key = self._key(digest, variant)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            self._stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            **self._stats
+        }
@@ -0,0 +1,202 @@
+import os
+import time
+import asyncio
+import logging
+import contextvars
+import llm_gateway
+from session_store import BoundedSessionStore
+from session_backend import SessionBusyError
+
+logger = logging.getLogger(__name__)
+
+# ----------------------------
+# Summary Settings
+# ----------------------------
+# Summarize once this many turns are pending (each turn is a question and its reply)
+SUMMARY_REFRESH_TURNS = int(os.getenv("SUMMARY_REFRESH_TURNS", "2"))
+# Unsummarized turns kept per session if refreshes keep failing
+SUMMARY_MAX_PENDING_TURNS = int(os.getenv("SUMMARY_MAX_PENDING_TURNS", "12"))
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "gpt-4o-mini")
+SUMMARY_MAX_WORDS = int(os.getenv("SUMMARY_MAX_WORDS", "120"))
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "220"))
+# Advisor replies are clipped to this many characters in prompt context lines
+SUMMARY_CONTEXT_REPLY_CHARS = int(os.getenv("SUMMARY_CONTEXT_REPLY_CHARS", "400"))
+
+SUMMARY_PROMPT = f"""You maintain a running summary of a conversation between a student and an AI student advisor.
+Merge the new turns into the existing summary. Keep the student's goals, background, constraints, decisions and open questions, and the key advice already given.
+Drop greetings and formatting. Write plain text, at most {SUMMARY_MAX_WORDS} words."""
+
+
+def _new_memory():
+    # created_at tells a session that was reset (and started again) from the original
+    return {"summary": "", "turns": [], "created_at": time.time()}
+
+
+def _clip(text, limit):
+    return text if len(text) <= limit else text[:limit].rstrip() + "…"
+
+
+class ConversationMemory:
+    """Rolling per-session summary plus the turns it does not cover yet.
+
+    Every completed turn is appended to the session's pending turns. Once
+    refresh_turns are pending, a background task folds them into the
+    summary with one cheap completion, so prompts carry a bounded summary
+    and the latest turns instead of a growing transcript. A failed refresh
+    keeps the turns pending and is retried after the next turn.
+    """
+
+    def __init__(self, backend=None, refresh_turns=SUMMARY_REFRESH_TURNS,
+                 max_pending_turns=SUMMARY_MAX_PENDING_TURNS):
+        self.refresh_turns = refresh_turns
+        self.store = BoundedSessionStore(
+            "session_summaries",
+            max_messages=max_pending_turns,
+            default_factory=_new_memory,
+            messages_key="turns",
+            backend=backend
+        )
+        self._refreshing = {}  # session_id -> in-flight refresh task
+        self._stats = {
+            "refreshes": 0,
+            "refresh_failures": 0,
+            "refreshes_discarded": 0,
+            "turns_summarized": 0,
+            "last_refresh_ms": 0.0
+        }
+
+    # ----------------------------
+    # Prompt Context
+    # ----------------------------
+    def context(self, session_id):
+        """(summary, context lines) for the next prompt of a session"""
+        memory = self.store.get(session_id)
+        if memory is None:
+            return "", []
+        lines = []
+        for turn in memory["turns"]:
+            lines.append(f"Student: {turn['user']}")
+            lines.append(f"Advisor: {_clip(turn['assistant'], SUMMARY_CONTEXT_REPLY_CHARS)}")
+        return memory["summary"], lines
+
+    # ----------------------------
+    # Recording and Refresh
+    # ----------------------------
+    def record_turn(self, session_id, question, reply):
+        """Remember a completed turn and start a summary refresh when one is due"""
+        if self.add_turn(session_id, question, reply):
+            self.schedule_refresh(session_id)
+
+    def add_turn(self, session_id, question, reply):
+        """Remember a completed turn; True when a summary refresh is due (safe off the event loop)"""
+        memory = self.store.update(
+            session_id,
+            lambda value: value["turns"].append({"user": question, "assistant": reply})
+        )
+        return len(memory["turns"]) >= self.refresh_turns
+
+    def schedule_refresh(self, session_id):
+        if session_id in self._refreshing:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Blocking callers have no loop; the next async turn refreshes instead
+            return
+        # Run outside the request's context: background upkeep is not charged
+        # to the session's rate limits, only to the global ones
+        task = loop.create_task(self._refresh(session_id), context=contextvars.Context())
+        self._refreshing[session_id] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(session_id, None))
+
+    async def _refresh(self, session_id):
+        memory = await self.store.offload(self.store.get, session_id)
+        if memory is None or not memory["turns"]:
+            return
+        turns = list(memory["turns"])
+        offset = memory.get("message_offset", 0)
+        created_at = memory.get("created_at")
+
+        started = time.perf_counter()
+        try:
+            response = await llm_gateway.chat_completion(
+                llm_gateway.SUMMARY,
+                model=SUMMARY_MODEL,
+                messages=summary_messages(memory["summary"], turns),
+                max_tokens=SUMMARY_MAX_TOKENS,
+                temperature=0.2
+            )
+            summary = response.choices[0].message.content.strip()
+        except Exception:
+            self._stats["refresh_failures"] += 1
+            logger.warning("Summary refresh for session %s failed", session_id, exc_info=True)
+            return
+
+        applied = []
+
+        def apply(value):
+            # Not an identity check: a shared store hands out a reloaded dict after other writes
+            if value.get("created_at") != created_at:
+                return
+            # Turns recorded while the call was in flight stay pending; turns
+            # trimmed in the meantime are already gone from the front
+            trimmed = value.get("message_offset", 0) - offset
+            del value["turns"][:max(len(turns) - trimmed, 0)]
+            value["summary"] = summary
+            applied.append(True)
+
+        def commit():
+            current = self.store.get(session_id)
+            if current is not None and current.get("created_at") == created_at:
+                self.store.update(session_id, apply)
+
+        try:
+            await self.store.offload(commit)
+        except SessionBusyError:
+            # The turns stay pending and are summarized on the next refresh
+            self._stats["refresh_failures"] += 1
+            logger.warning("Summary refresh for session %s skipped, session store busy", session_id)
+            return
+        if not applied:
+            self._stats["refreshes_discarded"] += 1
+            logger.info("Summary refresh for session %s discarded, the session was reset", session_id)
+            return
+        self._stats["refreshes"] += 1
+        self._stats["turns_summarized"] += len(turns)
+        self._stats["last_refresh_ms"] = round((time.perf_counter() - started) * 1000, 3)
+
+    def reset(self, session_id):
+        """Forget a session's summary and pending turns (safe off the event loop)"""
+        task = self._refreshing.pop(session_id, None)
+        if task is not None:
+            task.get_loop().call_soon_threadsafe(task.cancel)
+        try:
+            del self.store[session_id]
+        except KeyError:
+            pass
+
+    async def stop(self):
+        """Cancel in-flight refreshes (called on app shutdown)"""
+        tasks = list(self._refreshing.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self):
+        return {
+            "refresh_turns": self.refresh_turns,
+            "refreshing": len(self._refreshing),
+            **self._stats,
+            "store": self.store.stats()
+        }
+
+
+def summary_messages(previous, turns):
+    """Chat messages asking the model to fold turns into the previous summary"""
+    transcript = "\n".join(
+        f"Student: {turn['user']}\nAdvisor: {turn['assistant']}" for turn in turns
+    )
+    return [
+        {"role": "system", "content": SUMMARY_PROMPT},
+        {"role": "user", "content": f"Existing summary:\n{previous or 'None yet'}\n\nNew turns:\n{transcript}"}
+    ]
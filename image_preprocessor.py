@@ -0,0 +1,158 @@
+import io
+import os
+import math
+import time
+import base64
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps, UnidentifiedImageError
+from content_cache import ContentHashCache, file_hash
+
+# ----------------------------
+# Preprocessing Settings
+# ----------------------------
+# Longest side sent to the vision model; larger images are downscaled
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "1536"))
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "JPEG").upper()  # JPEG | WEBP | PNG
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "82"))
+IMAGE_PREPROCESS_WORKERS = int(os.getenv("IMAGE_PREPROCESS_WORKERS", "2"))
+# Decoded pixel buffers are bounded by this (checked from the header, before decoding)
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", "50000000"))
+
+# Cached analyses keyed by (image content hash, prompt)
+IMAGE_CACHE_MAX_ENTRIES = int(os.getenv("IMAGE_CACHE_MAX_ENTRIES", "256"))
+IMAGE_CACHE_TTL_SECONDS = float(os.getenv("IMAGE_CACHE_TTL_SECONDS", "21600"))
+
+MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+
+class ImageRejectedError(ValueError):
+    """Raised when an upload cannot be decoded as an image"""
+
+
+def _flatten_alpha(image):
+    # Transparent regions become white, like paper or a whiteboard
+    background = Image.new("RGB", image.size, (255, 255, 255))
+    background.paste(image, mask=image.convert("RGBA").getchannel("A"))
+    return background
+
+
+def preprocess_image(source, max_side=IMAGE_MAX_SIDE, image_format=IMAGE_FORMAT, quality=IMAGE_QUALITY):
+    """Downscale, strip metadata and re-encode an uploaded image (blocking).
+
+    source is the upload as bytes or a binary file object; file objects are
+    decoded straight from the (possibly disk-spooled) file without being
+    read into memory first. Returns the encoded bytes with their MIME type
+    and size details.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    source.seek(0, io.SEEK_END)
+    original_bytes = source.tell()
+    source.seek(0)
+
+    try:
+        image = Image.open(source)
+        # Let the JPEG decoder scale by 1/2..1/8 while decoding when the
+        # result still covers the target size
+        scale = max_side / max(image.size)
+        if scale < 1:
+            image.draft(None, (math.ceil(image.width * scale), math.ceil(image.height * scale)))
+        # Bound the decoded buffer before anything is decoded
+        if image.width * image.height > IMAGE_MAX_PIXELS:
+            raise ImageRejectedError(f"Image is larger than {IMAGE_MAX_PIXELS} pixels")
+        image = ImageOps.exif_transpose(image)
+    except Image.DecompressionBombError:
+        raise ImageRejectedError("Image has too many pixels to process")
+    except (UnidentifiedImageError, OSError):
+        raise ImageRejectedError("Unsupported or corrupt image file")
+
+    original_size = image.size
+    image.thumbnail((max_side, max_side), Image.LANCZOS, reducing_gap=3.0)
+
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = _flatten_alpha(image) if image_format == "JPEG" else image.convert("RGBA")
+    elif image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    # Saving without exif/icc arguments drops the original metadata
+    if image_format == "PNG":
+        save_params = {"optimize": True}
+    elif image_format == "WEBP":
+        save_params = {"quality": quality, "method": 4}
+    else:
+        save_params = {"quality": quality, "optimize": True}
+    output = io.BytesIO()
+    image.save(output, format=image_format, **save_params)
+
+    return {
+        "data": output.getvalue(),
+        "mime_type": MIME_TYPES[image_format],
+        "original_size": original_size,
+        "size": image.size,
+        "original_bytes": original_bytes,
+        "bytes": output.tell()
+    }
+
+
+def data_url(prepared):
+    encoded = base64.b64encode(prepared["data"]).decode("ascii")
+    return f"data:{prepared['mime_type']};base64,{encoded}"
+
+
+# ----------------------------
+# Thread Pool
+# ----------------------------
+# Decoding and resizing are CPU-bound (Pillow releases the GIL for most of it),
+# so they run in a small dedicated pool instead of on the event loop
+_executor = ThreadPoolExecutor(max_workers=IMAGE_PREPROCESS_WORKERS, thread_name_prefix="image-preprocess")
+
+_stats = {
+    "processed": 0,
+    "rejected": 0,
+    "bytes_in": 0,
+    "bytes_out": 0,
+    "processing_ms_total": 0.0
+}
+
+
+async def hash_image(fileobj):
+    """Content hash of an upload, computed in the image thread pool"""
+    return await asyncio.get_running_loop().run_in_executor(_executor, file_hash, fileobj)
+
+
+async def prepare_image(source):
+    """Preprocess an upload in the image thread pool"""
+    started = time.perf_counter()
+    try:
+        prepared = await asyncio.get_running_loop().run_in_executor(_executor, preprocess_image, source)
+    except ImageRejectedError:
+        _stats["rejected"] += 1
+        raise
+    _stats["processed"] += 1
+    _stats["bytes_in"] += prepared["original_bytes"]
+    _stats["bytes_out"] += prepared["bytes"]
+    _stats["processing_ms_total"] += (time.perf_counter() - started) * 1000
+    return prepared
+
+
+def shutdown():
+    _executor.shutdown(wait=False, cancel_futures=True)
+
+
+def image_stats():
+    processed = _stats["processed"]
+    return {
+        "max_side": IMAGE_MAX_SIDE,
+        "format": IMAGE_FORMAT,
+        "quality": IMAGE_QUALITY,
+        "workers": IMAGE_PREPROCESS_WORKERS,
+        **_stats,
+        "avg_processing_ms": round(_stats["processing_ms_total"] / processed, 3) if processed else 0.0,
+        "size_reduction": round(1 - _stats["bytes_out"] / _stats["bytes_in"], 4) if _stats["bytes_in"] else 0.0,
+        "analysis_cache": image_analysis_cache.stats()
+    }
+
+
+# Re-uploads of the same image with the same prompt reuse the analysis
+image_analysis_cache = ContentHashCache(IMAGE_CACHE_MAX_ENTRIES, IMAGE_CACHE_TTL_SECONDS)
@@ -0,0 +1,124 @@
+import os
+import time
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ----------------------------
+# Batching Settings
+# ----------------------------
+INTENT_BATCHING_ENABLED = os.getenv("INTENT_BATCHING", "0") == "1"
+INTENT_BATCH_MAX_SIZE = int(os.getenv("INTENT_BATCH_MAX_SIZE", "32"))
+INTENT_BATCH_MAX_WAIT_MS = float(os.getenv("INTENT_BATCH_MAX_WAIT_MS", "2"))
+
+# Upper bounds of the batch-size histogram buckets
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, float("inf"))
+
+
+class IntentBatcher:
+    """Collects messages from concurrent requests and classifies them in one call.
+
+    The first queued message opens a batch; the batch is flushed when it
+    reaches max_batch_size or max_wait_ms after that first message arrived.
+    classify_fn takes a list of messages and returns one result per message.
+    """
+
+    def __init__(self, classify_fn, max_batch_size=INTENT_BATCH_MAX_SIZE, max_wait_ms=INTENT_BATCH_MAX_WAIT_MS):
+        self.classify_fn = classify_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = None
+        self._worker = None
+        self._stats = {
+            "batches": 0,
+            "messages": 0,
+            "max_batch_size_seen": 0,
+            "queue_delay_total_ms": 0.0,
+            "queue_delay_max_ms": 0.0,
+            "errors": 0
+        }
+        self._size_histogram = {bound: 0 for bound in BATCH_SIZE_BUCKETS}
+
+    @property
+    def running(self):
+        return self._worker is not None and not self._worker.done()
+
+    def start(self):
+        """Start the batching worker on the running event loop"""
+        if not self.running:
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._worker = None
+
+    async def classify(self, message):
+        """Queue one message and wait for its batched result"""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((message, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            started = time.perf_counter()
+            try:
+                results = self.classify_fn([message for message, _, _ in batch])
+            except Exception as e:
+                logger.exception("Intent batch of %d failed", len(batch))
+                self._stats["errors"] += 1
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+            self._record(batch, started)
+
+    def _record(self, batch, started):
+        size = len(batch)
+        self._stats["batches"] += 1
+        self._stats["messages"] += size
+        self._stats["max_batch_size_seen"] = max(self._stats["max_batch_size_seen"], size)
+        for _, _, enqueued_at in batch:
+            delay_ms = (started - enqueued_at) * 1000
+            self._stats["queue_delay_total_ms"] += delay_ms
+            self._stats["queue_delay_max_ms"] = max(self._stats["queue_delay_max_ms"], delay_ms)
+        for bound in BATCH_SIZE_BUCKETS:
+            if size <= bound:
+                self._size_histogram[bound] += 1
+                break
+
+    def stats(self):
+        messages = self._stats["messages"]
+        return {
+            "enabled": self.running,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            **self._stats,
+            "avg_batch_size": round(messages / self._stats["batches"], 2) if self._stats["batches"] else 0.0,
+            "avg_queue_delay_ms": round(self._stats["queue_delay_total_ms"] / messages, 3) if messages else 0.0,
+            "batch_size_histogram": {f"le_{bound}": count for bound, count in self._size_histogram.items()}
+        }
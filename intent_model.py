@@ -0,0 +1,224 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import joblib
+import sklearn
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+
+logger = logging.getLogger(__name__)
+
+# ----------------------------
+# ENHANCED Intent Classification (60+ examples)
+# ----------------------------
+training_data = [
+    # Study Guidance (15 examples)
+    ("How can I prepare for exams?", "study_guidance"),
+    ("How do I study better?", "study_guidance"),
+    ("Best study techniques", "study_guidance"),
+    ("Time management for students", "study_guidance"),
+    ("How to focus while studying", "study_guidance"),
+    ("Study schedule tips", "study_guidance"),
+    ("Memory improvement techniques", "study_guidance"),
+    ("How to take better notes", "study_guidance"),
+    ("Effective study methods", "study_guidance"),
+    ("How to avoid procrastination", "study_guidance"),
+    ("I can't concentrate on studies", "study_guidance"),
+    ("How to prepare for competitive exams", "study_guidance"),
+    ("Best apps for studying", "study_guidance"),
+    ("How to revise effectively", "study_guidance"),
+    ("Tips for last minute exam prep", "study_guidance"),
+    
+    # Career Guidance (15 examples)
+    ("I am confused about my career", "career_guidance"),
+    ("AI or Data Science which is better", "career_guidance"),
+    ("Which career should I choose", "career_guidance"),
+    ("Career paths in technology", "career_guidance"),
+    ("Job opportunities in AI", "career_guidance"),
+    ("Should I pursue ML engineering", "career_guidance"),
+    ("Fresher job advice", "career_guidance"),
+    ("Career roadmap for developers", "career_guidance"),
+    ("Software engineer vs data scientist", "career_guidance"),
+    ("Best tech career for beginners", "career_guidance"),
+    ("How to switch to tech career", "career_guidance"),
+    ("Is cybersecurity a good career", "career_guidance"),
+    ("Career prospects in cloud computing", "career_guidance"),
+    ("Should I do MBA or MTech", "career_guidance"),
+    ("How to get into FAANG companies", "career_guidance"),
+    
+    # Concept Explanation (15 examples)
+    ("Explain machine learning", "concept_explanation"),
+    ("What is artificial intelligence", "concept_explanation"),
+    ("Difference between ML and DL", "concept_explanation"),
+    ("How does neural network work", "concept_explanation"),
+    ("What is deep learning", "concept_explanation"),
+    ("Explain supervised learning", "concept_explanation"),
+    ("What is NLP", "concept_explanation"),
+    ("Computer vision basics", "concept_explanation"),
+    ("What are transformers in AI", "concept_explanation"),
+    ("Explain reinforcement learning", "concept_explanation"),
+    ("What is LLM", "concept_explanation"),
+    ("Difference between AI and ML", "concept_explanation"),
+    ("How does ChatGPT work", "concept_explanation"),
+    ("What is prompt engineering", "concept_explanation"),
+    ("Explain cloud computing", "concept_explanation"),
+    
+    # Skill Recommendation (10 examples)
+    ("How to learn Python", "skill_recommendation"),
+    ("Skills needed for AI jobs", "skill_recommendation"),
+    ("Best programming language to learn", "skill_recommendation"),
+    ("Learning path for data science", "skill_recommendation"),
+    ("Should I learn React or Angular", "skill_recommendation"),
+    ("Essential skills for developers", "skill_recommendation"),
+    ("How to become an AI engineer", "skill_recommendation"),
+    ("Roadmap for machine learning", "skill_recommendation"),
+    ("What skills for data analyst", "skill_recommendation"),
+    ("Must learn tools for AI", "skill_recommendation"),
+    
+    # Project Guidance (10 examples)
+    ("Project ideas for resume", "project_guidance"),
+    ("How to build portfolio", "project_guidance"),
+    ("Beginner AI projects", "project_guidance"),
+    ("Good projects for students", "project_guidance"),
+    ("ML project for beginners", "project_guidance"),
+    ("Portfolio projects for data science", "project_guidance"),
+    ("Real world AI project ideas", "project_guidance"),
+    ("Projects to showcase skills", "project_guidance"),
+    ("Easy Python projects for beginners", "project_guidance"),
+    ("Web development project ideas", "project_guidance"),
+]
+
+X_train = [x[0] for x in training_data]
+y_train = [x[1] for x in training_data]
+
+# ----------------------------
+# Prebuilt Artifact
+# ----------------------------
+# `python intent_model.py` trains once and writes a versioned artifact plus a
+# manifest with its checksum; the app loads it at startup and only retrains
+# when the artifact is missing, stale or corrupt.
+MODEL_DIR = os.getenv("INTENT_MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models"))
+MODEL_PATH = os.path.join(MODEL_DIR, "intent_classifier.joblib")
+MANIFEST_PATH = os.path.join(MODEL_DIR, "intent_classifier.json")
+
+PIPELINE_PARAMS = {
+    "tfidf": {"ngram_range": (1, 2), "max_features": 600},
+    "classifier": {"max_iter": 1500, "C": 1.2}
+}
+
+# Filled in by load_intent_classifier() so the app can report how the model was obtained
+load_report = {}
+
+
+def build_pipeline():
+    return Pipeline([
+        ("tfidf", TfidfVectorizer(**PIPELINE_PARAMS["tfidf"])),
+        ("classifier", LogisticRegression(**PIPELINE_PARAMS["classifier"]))
+    ])
+
+
+def model_version():
+    """Fingerprint of everything that determines the fitted model"""
+    payload = json.dumps({
+        "training_data": training_data,
+        "params": PIPELINE_PARAMS,
+        "sklearn": sklearn.__version__
+    }, sort_keys=True, default=list)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def train_intent_classifier():
+    """Fit the pipeline on the bundled training data, returning (pipeline, seconds)"""
+    started = time.perf_counter()
+    pipeline = build_pipeline()
+    pipeline.fit(X_train, y_train)
+    return pipeline, time.perf_counter() - started
+
+
+def save_artifact(pipeline, train_seconds):
+    """Write the artifact and its manifest atomically"""
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    tmp_path = MODEL_PATH + ".tmp"
+    joblib.dump(pipeline, tmp_path)
+    os.replace(tmp_path, MODEL_PATH)
+
+    manifest = {
+        "version": model_version(),
+        "sha256": file_sha256(MODEL_PATH),
+        "sklearn_version": sklearn.__version__,
+        "train_seconds": round(train_seconds, 4),
+        "examples": len(training_data),
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    }
+    with open(MANIFEST_PATH + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(MANIFEST_PATH + ".tmp", MANIFEST_PATH)
+    return manifest
+
+
+def load_artifact():
+    """Load the prebuilt pipeline after checking its version and checksum.
+
+    Raises ValueError (or OSError) when the artifact cannot be trusted.
+    """
+    with open(MANIFEST_PATH) as f:
+        manifest = json.load(f)
+
+    if manifest.get("version") != model_version():
+        raise ValueError(f"artifact version {manifest.get('version')} does not match {model_version()}")
+    if file_sha256(MODEL_PATH) != manifest.get("sha256"):
+        raise ValueError("artifact checksum mismatch")
+
+    return joblib.load(MODEL_PATH), manifest
+
+
+def load_intent_classifier():
+    """Load the prebuilt classifier, retraining only as a fallback"""
+    started = time.perf_counter()
+    try:
+        pipeline, manifest = load_artifact()
+        load_seconds = time.perf_counter() - started
+        load_report.update({
+            "source": "artifact",
+            "version": manifest["version"],
+            "load_seconds": round(load_seconds, 4),
+            "saved_seconds": round(manifest["train_seconds"] - load_seconds, 4)
+        })
+        logger.info(
+            "Loaded intent classifier %s in %.1f ms (training took %.1f ms, saved %.1f ms)",
+            manifest["version"], load_seconds * 1000,
+            manifest["train_seconds"] * 1000, (manifest["train_seconds"] - load_seconds) * 1000
+        )
+        return pipeline
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning("Intent classifier artifact unusable (%s), retraining", e)
+
+    pipeline, train_seconds = train_intent_classifier()
+    load_report.update({
+        "source": "trained",
+        "version": model_version(),
+        "load_seconds": round(time.perf_counter() - started, 4),
+        "saved_seconds": 0.0
+    })
+    logger.info("Trained intent classifier %s in %.1f ms", model_version(), train_seconds * 1000)
+    return pipeline
+
+
+if __name__ == "__main__":
+    # Build step: python intent_model.py
+    pipeline, train_seconds = train_intent_classifier()
+    manifest = save_artifact(pipeline, train_seconds)
+    print(f"Saved intent classifier {manifest['version']} to {MODEL_PATH}")
+    print(f"  sha256: {manifest['sha256']}")
+    print(f"  trained on {manifest['examples']} examples in {train_seconds * 1000:.1f} ms")
@@ -0,0 +1,344 @@
+import os
+import time
+import asyncio
+import threading
+import httpx
+from contextlib import asynccontextmanager
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+from admission_control import admission_controller, estimate_request_tokens
+from prompt_builder import count_tokens
+from metrics import UPSTREAM_SECONDS, UPSTREAM_ERRORS, UPSTREAM_TOKENS
+from resilience import (
+    CircuitOpenError, CircuitBreaker, LatencyTracker, hedged, is_retryable, is_upstream_failure, backoff_delay,
+    LLM_MAX_RETRIES, LLM_RETRY_DEADLINE_SECONDS, LLM_HEDGE_CLASSES
+)
+
+# ----------------------------
+# Connection Pool Settings
+# ----------------------------
+MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "90"))
+CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))
+
+# ----------------------------
+# Bulkhead Settings (max in-flight upstream calls per endpoint class)
+# ----------------------------
+CHAT = "chat"
+VISION = "vision"
+RESUME = "resume"
+QUIZ = "quiz"
+SUMMARY = "summary"
+
+BULKHEAD_LIMITS = {
+    CHAT: int(os.getenv("LLM_MAX_INFLIGHT_CHAT", "64")),
+    VISION: int(os.getenv("LLM_MAX_INFLIGHT_VISION", "8")),
+    RESUME: int(os.getenv("LLM_MAX_INFLIGHT_RESUME", "8")),
+    QUIZ: int(os.getenv("LLM_MAX_INFLIGHT_QUIZ", "16")),
+    SUMMARY: int(os.getenv("LLM_MAX_INFLIGHT_SUMMARY", "8")),
+}
+
+# How long a call may wait for a free slot before it is rejected
+BULKHEAD_WAIT_TIMEOUT = float(os.getenv("LLM_BULKHEAD_WAIT_TIMEOUT", "10"))
+
+
+class BulkheadFullError(Exception):
+    """Raised when an endpoint class has no free upstream slot in time"""
+
+    def __init__(self, endpoint_class):
+        self.endpoint_class = endpoint_class
+        super().__init__(f"Too many in-flight {endpoint_class} requests, please retry shortly")
+
+
+class Bulkhead:
+    """Caps concurrent upstream calls for one endpoint class"""
+
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit
+        self.semaphore = asyncio.Semaphore(limit)
+        self.in_flight = 0
+        self.waiting = 0
+        self.completed = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), BULKHEAD_WAIT_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise BulkheadFullError(self.name)
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self.semaphore.release()
+
+    def stats(self):
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "rejected": self.rejected
+        }
+
+
+# ----------------------------
+# Process-wide Clients
+# ----------------------------
+_sync_client = None
+_sync_lock = threading.Lock()
+
+# The async client and bulkheads are bound to the event loop that created them
+_async_client = None
+_async_loop = None
+_bulkheads = {}
+
+# Upstream health per endpoint class (not tied to a loop)
+_breakers = {}
+_latencies = {}
+_retries = {}
+
+
+def _pool_limits():
+    return httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY
+    )
+
+
+def _timeout():
+    return httpx.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT)
+
+
+def _observe_response(response):
+    # Every upstream response carries the current rate limits
+    admission_controller.observe_headers(response.headers)
+
+
+async def _observe_response_async(response):
+    _observe_response(response)
+
+
+def get_client():
+    """Shared blocking client (for scripts and threads)"""
+    global _sync_client
+    if _sync_client is None:
+        with _sync_lock:
+            if _sync_client is None:
+                _sync_client = OpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    http_client=DefaultHttpxClient(
+                        limits=_pool_limits(),
+                        timeout=_timeout(),
+                        event_hooks={"response": [_observe_response]}
+                    )
+                )
+    return _sync_client
+
+
+def get_async_client():
+    """Shared async client for the running event loop"""
+    global _async_client, _async_loop, _bulkheads
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_loop is not loop:
+        _async_client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            # Retries are done by chat_completion, where the circuit breaker sees them
+            max_retries=0,
+            http_client=DefaultAsyncHttpxClient(
+                limits=_pool_limits(),
+                timeout=_timeout(),
+                event_hooks={"response": [_observe_response_async]}
+            )
+        )
+        _async_loop = loop
+        _bulkheads = {}
+    return _async_client
+
+
+def get_bulkhead(endpoint_class):
+    """Bulkhead for an endpoint class (created on first use)"""
+    get_async_client()
+    if endpoint_class not in _bulkheads:
+        limit = BULKHEAD_LIMITS.get(endpoint_class, BULKHEAD_LIMITS[CHAT])
+        _bulkheads[endpoint_class] = Bulkhead(endpoint_class, limit)
+    return _bulkheads[endpoint_class]
+
+
+def get_breaker(endpoint_class):
+    if endpoint_class not in _breakers:
+        _breakers[endpoint_class] = CircuitBreaker(endpoint_class)
+    return _breakers[endpoint_class]
+
+
+def get_latency(endpoint_class):
+    if endpoint_class not in _latencies:
+        _latencies[endpoint_class] = LatencyTracker(hedging=endpoint_class in LLM_HEDGE_CLASSES)
+    return _latencies[endpoint_class]
+
+
+def _record_failure(endpoint_class, error):
+    UPSTREAM_ERRORS.inc(labels=(endpoint_class, "true" if is_retryable(error) else "false"))
+
+
+def _outcome(error):
+    """Breaker verdict for an attempt that raised error"""
+    return False if is_upstream_failure(error) else None
+
+
+def _record_tokens(endpoint_class, prompt_tokens, completion_tokens):
+    UPSTREAM_TOKENS.inc(prompt_tokens, (endpoint_class, "prompt"))
+    UPSTREAM_TOKENS.inc(completion_tokens, (endpoint_class, "completion"))
+
+
+def _retry_delay(endpoint_class, error, attempt, started):
+    """Backoff before the next attempt, or None when the error should be raised"""
+    if attempt >= LLM_MAX_RETRIES or not is_retryable(error):
+        return None
+    delay = backoff_delay(attempt, error)
+    if time.monotonic() - started + delay > LLM_RETRY_DEADLINE_SECONDS:
+        return None
+    _retries[endpoint_class] = _retries.get(endpoint_class, 0) + 1
+    return delay
+
+
+# ----------------------------
+# Public Call API
+# ----------------------------
+async def _attempt(endpoint_class, params):
+    """One upstream call through admission control, the shared pool and the endpoint's bulkhead"""
+    client = get_async_client()
+    async with admission_controller.admit(estimate_request_tokens(params)) as admission:
+        async with get_bulkhead(endpoint_class).slot():
+            started = time.perf_counter()
+            try:
+                response = await client.chat.completions.create(**params)
+            except Exception as e:
+                _record_failure(endpoint_class, e)
+                raise
+            elapsed = time.perf_counter() - started
+            get_latency(endpoint_class).observe(elapsed)
+            UPSTREAM_SECONDS.observe(elapsed, (endpoint_class,))
+        if response.usage:
+            admission.settle(response.usage.total_tokens)
+            _record_tokens(endpoint_class, response.usage.prompt_tokens, response.usage.completion_tokens)
+        return response
+
+
+async def chat_completion(endpoint_class, **params):
+    """Run a chat completion with retries, circuit breaking and hedging of slow calls.
+
+    Transient errors are retried with jittered exponential backoff; while
+    the endpoint class's breaker is open, CircuitOpenError is raised at once.
+    """
+    started = time.monotonic()
+    breaker = get_breaker(endpoint_class)
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        probe = breaker.check()
+        # Recorded on every path (including cancellation), so a probe never stays taken
+        success = None
+        try:
+            response = await hedged(lambda: _attempt(endpoint_class, params), get_latency(endpoint_class))
+            success = True
+            return response
+        except Exception as e:
+            success = _outcome(e)
+            delay = _retry_delay(endpoint_class, e, attempt, started)
+            if delay is None:
+                raise
+        finally:
+            breaker.record(success, probe)
+        await asyncio.sleep(delay)
+
+
+async def _stream_attempt(endpoint_class, params):
+    client = get_async_client()
+    estimated = estimate_request_tokens(params)
+    async with admission_controller.admit(estimated) as admission:
+        async with get_bulkhead(endpoint_class).slot():
+            parts = []
+            started = time.perf_counter()
+            try:
+                stream = await client.chat.completions.create(stream=True, **params)
+                try:
+                    async for chunk in stream:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            parts.append(chunk.choices[0].delta.content)
+                            yield chunk.choices[0].delta.content
+                finally:
+                    await stream.close()
+            except Exception as e:
+                _record_failure(endpoint_class, e)
+                raise
+            UPSTREAM_SECONDS.observe(time.perf_counter() - started, (endpoint_class,))
+        # Streams report no usage: count the prompt as estimated plus the reply as received
+        prompt_tokens = estimated - (params.get("max_tokens") or 0)
+        completion_tokens = count_tokens("".join(parts))
+        admission.settle(prompt_tokens + completion_tokens)
+        _record_tokens(endpoint_class, prompt_tokens, completion_tokens)
+
+
+async def stream_chat_completion(endpoint_class, **params):
+    """Stream a chat completion, yielding text deltas; the bulkhead slot is held until the stream ends.
+
+    Failures before the first delta are retried like chat_completion; once
+    text has been sent, an error ends the stream. Streams are not hedged.
+    """
+    started = time.monotonic()
+    breaker = get_breaker(endpoint_class)
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        probe = breaker.check()
+        streamed = False
+        success = None
+        try:
+            async for delta in _stream_attempt(endpoint_class, params):
+                streamed = True
+                yield delta
+            success = True
+            return
+        except Exception as e:
+            success = _outcome(e)
+            delay = None if streamed else _retry_delay(endpoint_class, e, attempt, started)
+            if delay is None:
+                raise
+        finally:
+            breaker.record(success, probe)
+        await asyncio.sleep(delay)
+
+
+def chat_completion_sync(**params):
+    """Blocking chat completion on the shared pool (no bulkhead or admission control)"""
+    return get_client().chat.completions.create(**params)
+
+
+def gateway_stats():
+    """Snapshot of bulkhead usage, breaker state, retries and latency per endpoint class"""
+    return {
+        name: {
+            "bulkhead": _bulkheads[name].stats() if name in _bulkheads else None,
+            "breaker": breaker.stats(),
+            "retries": _retries.get(name, 0),
+            "latency": get_latency(name).stats()
+        }
+        for name, breaker in _breakers.items()
+    }
+
+
+async def aclose():
+    """Close pooled connections (called on app shutdown)"""
+    global _async_client, _async_loop
+    if _async_client is not None:
+        await _async_client.close()
+    _async_client = None
+    _async_loop = None
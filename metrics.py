@@ -0,0 +1,258 @@
+import math
+import time
+from bisect import bisect_left
+from starlette.routing import Match
+
+# ----------------------------
+# Metric Types
+# ----------------------------
+# Seconds; fine-grained at the low end for in-process stages, coarse for upstream calls
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labelnames, labels, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labels)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+
+    def samples(self):
+        """(suffix, labels, extra label, value) tuples to expose"""
+        return []
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, labels, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, labels=()):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        return [("", labels, "", value) for labels, value in list(self._values.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount=1, labels=()):
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def set(self, value, labels=()):
+        self._values[labels] = value
+
+
+class Histogram(Metric):
+    """Fixed-bucket histogram; observe() is a bisect and three additions"""
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [count per bucket..., count above the last bucket, sum]
+
+    def observe(self, value, labels=()):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def samples(self):
+        samples = []
+        for labels, series in list(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series):
+                cumulative += count
+                samples.append(("_bucket", labels, f'le="{_format_value(bound)}"', cumulative))
+            samples.append(("_sum", labels, "", series[-1]))
+            samples.append(("_count", labels, "", cumulative))
+        return samples
+
+
+class CallbackMetric(Metric):
+    """Counter or gauge read at scrape time from a function returning {labels: value}"""
+
+    def __init__(self, name, help_text, fn, labelnames=(), kind="gauge"):
+        super().__init__(name, help_text, labelnames)
+        self.fn = fn
+        self.kind = kind
+
+    def samples(self):
+        return [("", labels, "", value) for labels, value in self.fn().items() if value is not None]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+registry = Registry()
+
+
+def counter(name, help_text, labelnames=()):
+    return registry.register(Counter(name, help_text, labelnames))
+
+
+def gauge(name, help_text, labelnames=()):
+    return registry.register(Gauge(name, help_text, labelnames))
+
+
+def histogram(name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+    return registry.register(Histogram(name, help_text, labelnames, buckets))
+
+
+def callback(name, help_text, fn, labelnames=(), kind="gauge"):
+    return registry.register(CallbackMetric(name, help_text, fn, labelnames, kind))
+
+
+# ----------------------------
+# Shared Metrics
+# ----------------------------
+STAGE_SECONDS = histogram(
+    "advisor_stage_duration_seconds",
+    "Time spent in each stage of a chat turn",
+    ("stage",)
+)
+UPSTREAM_SECONDS = histogram(
+    "llm_upstream_duration_seconds",
+    "Latency of successful upstream LLM calls",
+    ("endpoint_class",)
+)
+UPSTREAM_ERRORS = counter(
+    "llm_upstream_errors_total",
+    "Failed upstream LLM call attempts",
+    ("endpoint_class", "retryable")
+)
+UPSTREAM_TOKENS = counter(
+    "llm_tokens_total",
+    "Tokens reported by the upstream (estimated for streamed completions)",
+    ("endpoint_class", "kind")
+)
+
+
+def observe_stage(name, seconds):
+    STAGE_SECONDS.observe(seconds, (name,))
+
+
+class stage:
+    """Times a block into advisor_stage_duration_seconds: `with stage("classify"): ...`"""
+    __slots__ = ("labels", "started")
+
+    def __init__(self, name):
+        self.labels = (name,)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        STAGE_SECONDS.observe(time.perf_counter() - self.started, self.labels)
+        return False
+
+
+# ----------------------------
+# HTTP Metrics
+# ----------------------------
+HTTP_REQUESTS = counter(
+    "http_requests_total",
+    "HTTP requests handled",
+    ("handler", "method", "status")
+)
+HTTP_SECONDS = histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to sending the last byte of its response",
+    ("handler", "method")
+)
+HTTP_IN_FLIGHT = gauge(
+    "http_requests_in_flight",
+    "Requests currently being handled",
+    ("handler",)
+)
+
+
+class MetricsMiddleware:
+    """Records count, duration and in-flight requests per route template.
+
+    Requests that match no route are grouped under "unmatched", so random
+    paths cannot blow up the label cardinality.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._static = {}  # request path -> route path, for routes without parameters
+
+    def _handler(self, scope):
+        path = scope["path"]
+        handler = self._static.get(path)
+        if handler is None:
+            handler = "unmatched"
+            for route in scope["app"].routes:
+                if route.matches(scope)[0] != Match.NONE:
+                    handler = route.path
+                    break
+            if handler == path:
+                self._static[path] = handler
+        return handler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        status = 500
+        handler = self._handler(scope)
+        HTTP_IN_FLIGHT.inc(labels=(handler,))
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec(labels=(handler,))
+            method = scope["method"]
+            HTTP_REQUESTS.inc(labels=(handler, method, str(status)))
+            HTTP_SECONDS.observe(time.perf_counter() - started, (handler, method))
@@ -0,0 +1,31 @@
+import os
+
+# ----------------------------
+# Process Stats
+# ----------------------------
+# Reported by /health for each worker; kept apart from serve.py so importing
+# the app does not pull in the pre-fork launcher
+SMAPS_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def memory_stats():
+    """This process's memory in kB, split into pages shared with other workers and private ones"""
+    stats = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in SMAPS_FIELDS:
+                    stats[name.lower() + "_kb"] = int(rest.split()[0])
+    except OSError:
+        pass
+    return stats
+
+
+def server_stats():
+    return {
+        "pid": os.getpid(),
+        "worker": os.getenv("SERVER_WORKER_ID"),
+        "workers": int(os.getenv("WEB_CONCURRENCY", "1")),
+        "memory": memory_stats()
+    }
@@ -0,0 +1,252 @@
+import os
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ----------------------------
+# Budget Settings
+# ----------------------------
+# Upper bound on input tokens sent per /chat call (prompt + summary + context + question)
+PROMPT_INPUT_TOKEN_BUDGET = int(os.getenv("PROMPT_INPUT_TOKEN_BUDGET", "1600"))
+
+# Context lines included before budgeting (one question and one reply per turn)
+PROMPT_CONTEXT_MESSAGES = int(os.getenv("PROMPT_CONTEXT_MESSAGES", "4"))
+
+# Chat-format overhead per message (role markers and separators)
+TOKENS_PER_MESSAGE = 4
+
+# ----------------------------
+# Local Token Counting
+# ----------------------------
+# tiktoken gives exact counts when installed and its encoding can be loaded;
+# otherwise fall back to a word/punctuation estimate that runs offline.
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _encoding = None
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text):
+    """Count (or closely estimate) the tokens in a string"""
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    # Long words split into several BPE pieces, roughly one per 4 characters
+    return sum(max(1, len(piece) // 4) for piece in _TOKEN_PATTERN.findall(text))
+
+
+def count_message_tokens(message):
+    return TOKENS_PER_MESSAGE + count_tokens(message["content"])
+
+
+# ----------------------------
+# Static Prompt Text
+# ----------------------------
+SYSTEM_PROMPT = """You are an expert AI Student Advisor with 10+ years of experience mentoring students in technology, AI, career development, and academic success.
+
+YOUR CORE RESPONSIBILITIES:
+- Provide honest career guidance for students (tech/AI/data science/software)
+- Explain complex technical concepts in simple, relatable terms with real examples
+- Give actionable study advice based on cognitive science and proven techniques
+- Recommend skills, learning paths, and resources with realistic timelines
+- Suggest practical projects that demonstrate real skills to employers
+- Be encouraging but realistic about challenges and time commitments
+- Help students make informed decisions, not just feel good
+
+CRITICAL FORMATTING RULES (MUST FOLLOW EVERY TIME):
+1. **Use bold (double asterisks) for ALL key points, headings, and important terms**
+2. Structure with SHORT paragraphs (2-3 lines maximum each)
+3. Use bullet points (single • character) for ALL lists, steps, and options
+4. Add blank lines between sections for breathing room
+5. Keep total response 200-280 words (concise but complete)
+6. Start with direct answer, then elaborate
+7. End with an encouraging but honest closing line
+
+TONE & PERSONALITY:
+- Friendly senior mentor, not a salesperson or motivational speaker
+- Honest about tradeoffs and realistic timelines
+- Use "you" to make it personal and engaging
+- Explain jargon when used, avoid unnecessary complexity
+- Use 1-2 emojis maximum (only if genuinely appropriate)
+- Balance optimism with pragmatism
+
+ANSWER STRUCTURE (FOLLOW THIS):
+**[Direct Answer]**: Clear 1-2 sentence response to their question.
+
+**[Key Section 1 Heading]**:
+Brief explanation (2-3 lines max) with **important terms** in bold.
+
+**[Key Section 2 Heading]**:
+• Bullet point with actionable detail
+• Another bullet point with specific info
+• Third bullet point if needed
+
+**[Optional Section 3]**:
+Additional context or recommendations.
+
+[Encouraging but realistic closing line.]
+
+EXAMPLE OF PERFECT FORMAT:
+**Career Choice**: Both AI and Data Science are excellent for 2026, and they overlap significantly!
+
+**Key Differences**:
+• **AI Engineering**: Build intelligent systems, work with LLMs, neural networks, and deployment at scale
+• **Data Science**: Extract insights from data, create predictive models, communicate findings to stakeholders
+
+**My Recommendation**:
+Start with **Python fundamentals** and **basic statistics** (2-3 months). Then try a small project in each field—you'll naturally gravitate toward one. Many professionals blend both skills anyway.
+
+**Reality Check**: Entry roles need 6-12 months of focused learning. Start building projects now, they matter more than certificates.
+
+You're asking the right questions—keep that curiosity! 🚀
+
+IMPORTANT NOTES:
+- Always format bullet points with single • character (not multiple characters)
+- Always use **double asterisks** for bold
+- Never skip the structure above
+- Be specific with numbers, timelines, and resources when relevant"""
+
+# Intent-specific guidance
+INTENT_GUIDANCE = {
+    "study_guidance": """Give evidence-based study techniques (spaced repetition, active recall, pomodoro).
+Be specific about implementation. Mention realistic time management. Avoid generic advice.""",
+    
+    "career_guidance": """Provide honest career advice with required skills AND realistic timelines.
+Mention current job market realities. Compare options fairly. Give actionable next steps.
+Mention salary ranges if relevant. Be encouraging but don't sugarcoat challenges.""",
+    
+    "concept_explanation": """Explain using simple analogies and real-world examples.
+Break complex ideas into digestible chunks. Bold all technical terms. Use 2-3 bullet points for key aspects.
+Relate to things students already understand.""",
+    
+    "skill_recommendation": """Give clear learning roadmap with time estimates.
+Prioritize essential skills first. Mention 2-3 specific free resources if helpful.
+Realistic time commitment (hours/weeks). Balance depth vs breadth.""",
+    
+    "project_guidance": """Suggest 2-3 specific, practical projects with difficulty levels.
+Explain what skills each teaches and how it looks on resume. Mention typical time to build.
+Focus on projects that demonstrate real competency, not just tutorials.""",
+    
+    "general_query": """Answer helpfully with clear structure. Use bold headings and bullets.
+Be specific rather than vague. Give actionable takeaways."""
+}
+# The request-specific part of the prompt; everything before it is static
+USER_PROMPT_TEMPLATE = """Conversation summary so far:
+{summary}
+
+Previous conversation context (last {context_count} messages):
+{context}
+
+Conversation topic focus: {topic_focus}
+
+User's current question:
+"{question}"
+
+CRITICAL REMINDERS:
+- Use **bold** (double asterisks) for all key points and headings
+- Use single • character for bullet points
+- Keep paragraphs SHORT (2-3 lines maximum)
+- Be specific with numbers, timelines, resources
+- Add encouraging but realistic tone
+- Follow the structure in your system prompt exactly"""
+
+
+# ----------------------------
+# Precompiled Templates (built once at import)
+# ----------------------------
+# Layout: [static system prompt] [per-intent guidance] [user turn]. The first
+# message is byte-identical for every request and the second for every
+# request of the same intent, so upstream prompt-prefix caching can reuse them.
+SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+SYSTEM_MESSAGE_TOKENS = count_message_tokens(SYSTEM_MESSAGE)
+
+INTENT_TEMPLATES = {}
+for _intent, _guidance in INTENT_GUIDANCE.items():
+    _message = {
+        "role": "system",
+        "content": f"Current question intent: {_intent}\n\nGuidance for this intent type:\n{_guidance}"
+    }
+    INTENT_TEMPLATES[_intent] = {
+        "prefix": (SYSTEM_MESSAGE, _message),
+        "prefix_tokens": SYSTEM_MESSAGE_TOKENS + count_message_tokens(_message)
+    }
+
+USER_TEMPLATE_TOKENS = TOKENS_PER_MESSAGE + count_tokens(
+    USER_PROMPT_TEMPLATE.format(summary="", context_count="", context="", topic_focus="", question="")
+)
+
+# Running totals across requests
+_stats = {
+    "requests": 0,
+    "input_tokens": 0,
+    # Only what the budget drops here; the rolling summary and reply clipping
+    # shrink prompts before they arrive and are not counted
+    "context_tokens_dropped": 0,
+    "trimmed_requests": 0
+}
+
+
+def _user_message(question, topic_lock, context, summary):
+    return {
+        "role": "user",
+        "content": USER_PROMPT_TEMPLATE.format(
+            summary=summary if summary else "None yet",
+            context_count=len(context),
+            context="\n".join(context),
+            topic_focus=topic_lock if topic_lock else "None - fresh topic",
+            question=question
+        )
+    }
+
+
+def build_prompt(question, intent, topic_lock, context, summary="", budget=PROMPT_INPUT_TOKEN_BUDGET):
+    """Assemble the chat messages for one turn within the input-token budget.
+
+    context is a list of recent lines, oldest first, and summary the rolling
+    summary of everything before them. Lines are dropped from the oldest end
+    until the prompt fits, and the tokens dropped are reported alongside
+    the messages.
+    """
+    template = INTENT_TEMPLATES.get(intent, INTENT_TEMPLATES["general_query"])
+    context = list(context[-PROMPT_CONTEXT_MESSAGES:])
+
+    fixed_tokens = template["prefix_tokens"] + USER_TEMPLATE_TOKENS + count_tokens(question) + count_tokens(summary)
+    line_tokens = [count_tokens(line) + 1 for line in context]
+    full_tokens = fixed_tokens + sum(line_tokens)
+
+    # Drop the oldest context lines until the prompt fits
+    dropped = 0
+    total = full_tokens
+    while total > budget and dropped < len(context):
+        total -= line_tokens[dropped]
+        dropped += 1
+
+    messages = [*template["prefix"], _user_message(question, topic_lock, context[dropped:], summary)]
+    dropped_tokens = full_tokens - total
+
+    _stats["requests"] += 1
+    _stats["input_tokens"] += total
+    _stats["context_tokens_dropped"] += dropped_tokens
+    if dropped:
+        _stats["trimmed_requests"] += 1
+        logger.debug("Prompt dropped %d context lines (%d tokens)", dropped, dropped_tokens)
+
+    return {
+        "messages": messages,
+        "input_tokens": total,
+        "context_tokens_dropped": dropped_tokens,
+        "context_lines_dropped": dropped,
+        "cacheable_prefix_tokens": template["prefix_tokens"]
+    }
+
+
+def prompt_stats():
+    return {
+        **_stats,
+        "budget": PROMPT_INPUT_TOKEN_BUDGET,
+        "token_counter": "tiktoken" if _encoding is not None else "estimate",
+        "static_prefix_tokens": SYSTEM_MESSAGE_TOKENS
+    }
@@ -0,0 +1,361 @@
+import os
+import json
+import math
+import time
+import asyncio
+import logging
+import itertools
+from collections import deque
+import llm_gateway
+from response_cache import normalize_question
+from single_flight import llm_single_flight
+
+logger = logging.getLogger(__name__)
+
+# ----------------------------
+# Pool Settings
+# ----------------------------
+QUIZ_POOL_ENABLED = os.getenv("QUIZ_POOL", "1") == "1"
+# Ready quizzes kept per topic, across all worker processes
+QUIZ_POOL_DEPTH = int(os.getenv("QUIZ_POOL_DEPTH", "2"))
+# Worker processes (set by serve.py); each keeps its own pools, so each holds an equal part of the depth
+QUIZ_POOL_PROCESSES = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+QUIZ_POOL_WORKER_DEPTH = max(1, math.ceil(QUIZ_POOL_DEPTH / QUIZ_POOL_PROCESSES))
+# Topics with a pool; the least popular pool is dropped beyond this
+QUIZ_POOL_MAX_TOPICS = int(os.getenv("QUIZ_POOL_MAX_TOPICS", "50"))
+# Requests for a topic before it gets a pool; one-off topics are only ever generated live
+QUIZ_POOL_MIN_REQUESTS = int(os.getenv("QUIZ_POOL_MIN_REQUESTS", "3"))
+QUIZ_POOL_REFILL_WORKERS = int(os.getenv("QUIZ_POOL_REFILL_WORKERS", "2"))
+# Popularity scores halve after this long without requests
+QUIZ_POPULARITY_HALF_LIFE_SECONDS = float(os.getenv("QUIZ_POPULARITY_HALF_LIFE_SECONDS", "3600"))
+# Comma-separated topics to fill at startup
+QUIZ_POOL_WARM_TOPICS = [t.strip() for t in os.getenv("QUIZ_POOL_WARM_TOPICS", "").split(",") if t.strip()]
+# Pause after a failed refill so an upstream outage is not hammered
+QUIZ_REFILL_RETRY_SECONDS = 30
+
+# ----------------------------
+# Quiz Format
+# ----------------------------
+QUIZ_QUESTIONS = 5
+ANSWER_LETTERS = ("A", "B", "C", "D")
+
+QUIZ_SYSTEM_PROMPT = f"""You are a quiz generator for students. Create engaging, educational quizzes.
+
+Return JSON with a short "title" and exactly {QUIZ_QUESTIONS} "questions". Each question has:
+- "question": the question text
+- "options": exactly 4 answer texts, without "A)" style prefixes
+- "answer": the letter of the correct option (A, B, C or D)
+- "explanation": one or two sentences on why it is correct
+
+Make questions:
+- Clear and unambiguous
+- Educational and relevant
+- Progressive difficulty
+- Vary the position of the correct answer"""
+
+QUIZ_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "quiz",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "title": {"type": "string"},
+                "questions": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "question": {"type": "string"},
+                            "options": {"type": "array", "items": {"type": "string"}},
+                            "answer": {"type": "string", "enum": list(ANSWER_LETTERS)},
+                            "explanation": {"type": "string"}
+                        },
+                        "required": ["question", "options", "answer", "explanation"],
+                        "additionalProperties": False
+                    }
+                }
+            },
+            "required": ["title", "questions"],
+            "additionalProperties": False
+        }
+    }
+}
+
+# Attempts per quiz when the model returns something that fails validation
+QUIZ_GENERATION_ATTEMPTS = 2
+
+
+class QuizValidationError(ValueError):
+    """Raised when a generated quiz does not match the expected structure"""
+
+
+def _strip_option_prefix(option):
+    option = option.strip()
+    if len(option) > 2 and option[0].upper() in ANSWER_LETTERS and option[1] in ").:":
+        return option[2:].strip()
+    return option
+
+
+def validate_quiz(data):
+    """Check and normalize a generated quiz, raising QuizValidationError"""
+    if not isinstance(data, dict) or not isinstance(data.get("questions"), list):
+        raise QuizValidationError("Quiz must be an object with a questions list")
+    questions = data["questions"]
+    if len(questions) != QUIZ_QUESTIONS:
+        raise QuizValidationError(f"Expected {QUIZ_QUESTIONS} questions, got {len(questions)}")
+
+    cleaned = []
+    for number, item in enumerate(questions, 1):
+        if not isinstance(item, dict):
+            raise QuizValidationError(f"Question {number} is not an object")
+        question = str(item.get("question", "")).strip()
+        options = [_strip_option_prefix(str(option)) for option in item.get("options") or []]
+        answer = str(item.get("answer", "")).strip().upper()[:1]
+        explanation = str(item.get("explanation", "")).strip()
+        if not question or not explanation:
+            raise QuizValidationError(f"Question {number} is missing text or explanation")
+        if len(options) != len(ANSWER_LETTERS) or not all(options) or len(set(options)) != len(options):
+            raise QuizValidationError(f"Question {number} needs 4 distinct options")
+        if answer not in ANSWER_LETTERS:
+            raise QuizValidationError(f"Question {number} has an invalid answer")
+        cleaned.append({"question": question, "options": options, "answer": answer, "explanation": explanation})
+
+    return {"title": str(data.get("title") or "").strip(), "questions": cleaned}
+
+
+def render_quiz(quiz, topic):
+    """Markdown rendering in the format the chat UI displays"""
+    title = quiz["title"] or topic
+    lines = [f"**Quiz: {title}** ({len(quiz['questions'])} questions)", ""]
+    for number, item in enumerate(quiz["questions"], 1):
+        lines.append(f"**Q{number}**: {item['question']}")
+        lines.extend(f"{letter}) {option}" for letter, option in zip(ANSWER_LETTERS, item["options"]))
+        lines.append(f"*Correct: {item['answer']}*")
+        lines.append(f"*Explanation*: {item['explanation']}")
+        lines.append("")
+    return "\n".join(lines).rstrip()
+
+
+async def generate_quiz(topic):
+    """One live quiz generation, validated (retried once on malformed output)"""
+    for attempt in range(1, QUIZ_GENERATION_ATTEMPTS + 1):
+        response = await llm_gateway.chat_completion(
+            llm_gateway.QUIZ,
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": QUIZ_SYSTEM_PROMPT},
+                {"role": "user", "content": f"Create a {QUIZ_QUESTIONS}-question quiz about: {topic}"}
+            ],
+            response_format=QUIZ_RESPONSE_FORMAT,
+            max_tokens=800,
+            temperature=0.8
+        )
+        try:
+            return validate_quiz(json.loads(response.choices[0].message.content or ""))
+        except (json.JSONDecodeError, QuizValidationError) as e:
+            if attempt == QUIZ_GENERATION_ATTEMPTS:
+                raise QuizValidationError(f"Generated quiz was invalid: {e}")
+            logger.warning("Discarding invalid quiz for %r: %s", topic, e)
+
+
+class QuizPool:
+    """Per-topic pools of ready quizzes, kept topped up in the background.
+
+    A request for a topic with a ready quiz is served from the pool
+    immediately, and a refill is queued. A cold topic is generated live
+    and seeds a pool once its popularity reaches min_requests. Topics are
+    tracked by a decaying popularity score (requests, halving every
+    half_life). A pool is kept at one quiz per point of popularity past
+    min_requests - 1, up to depth, so only topics that keep coming back pay
+    for a full pool and a topic that cools off stops being refilled. Warm
+    topics are filled to depth at once. Refills run the most popular topic
+    first, and once max_topics pools exist the least popular one is dropped.
+    """
+
+    def __init__(self, generate_fn=generate_quiz, depth=QUIZ_POOL_WORKER_DEPTH, max_topics=QUIZ_POOL_MAX_TOPICS,
+                 min_requests=QUIZ_POOL_MIN_REQUESTS, refill_workers=QUIZ_POOL_REFILL_WORKERS,
+                 half_life=QUIZ_POPULARITY_HALF_LIFE_SECONDS):
+        self.generate_fn = generate_fn
+        self.depth = depth
+        self.max_topics = max_topics
+        self.min_requests = min_requests
+        self.refill_workers = refill_workers
+        self.half_life = half_life
+
+        self._pools = {}       # topic key -> deque of quizzes
+        self._topics = {}      # topic key -> {"topic", "score", "updated", "requests"}
+        self._queue = None     # (-score, seq, topic key) refill requests
+        self._queued = set()
+        self._refilling = set()  # topic keys a worker is currently filling
+        self._warm = set()       # topic keys filled to depth regardless of requests
+        self._seq = itertools.count()
+        self._workers = []
+        self._stats = {
+            "pool_hits": 0,
+            "live_generations": 0,
+            "refills": 0,
+            "refill_failures": 0,
+            "pools_evicted": 0
+        }
+
+    @property
+    def running(self):
+        return any(not worker.done() for worker in self._workers)
+
+    def start(self, warm_topics=QUIZ_POOL_WARM_TOPICS):
+        """Start the refill workers on the running event loop"""
+        if self.running:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._queued.clear()
+        self._workers = [asyncio.create_task(self._run()) for _ in range(self.refill_workers)]
+        for topic in warm_topics:
+            key = normalize_question(topic)
+            self._track(key, topic)
+            self._warm.add(key)
+            self._seed(key)
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    # ----------------------------
+    # Popularity
+    # ----------------------------
+    def _decayed(self, entry, now):
+        return entry["score"] * 0.5 ** ((now - entry["updated"]) / self.half_life)
+
+    def _track(self, key, topic):
+        now = time.monotonic()
+        entry = self._topics.get(key)
+        if entry is None:
+            entry = self._topics[key] = {"topic": topic, "score": 0.0, "updated": now, "requests": 0}
+        entry["score"] = self._decayed(entry, now) + 1
+        entry["updated"] = now
+        entry["requests"] += 1
+        return entry
+
+    def _popularity(self, key):
+        return self._decayed(self._topics[key], time.monotonic())
+
+    def _forget_cold_topics(self):
+        # Topics without a pool are only kept while they are warming up
+        if len(self._topics) > self.max_topics * 20:
+            now = time.monotonic()
+            for key in sorted(set(self._topics) - set(self._pools),
+                              key=lambda k: self._decayed(self._topics[k], now))[:len(self._topics) // 2]:
+                del self._topics[key]
+
+    # ----------------------------
+    # Pools
+    # ----------------------------
+    def _target(self, key):
+        """Quizzes to keep ready for a topic"""
+        if key in self._warm:
+            return self.depth
+        return max(0, min(self.depth, round(self._popularity(key)) - self.min_requests + 1))
+
+    def _seed(self, key):
+        if key not in self._pools:
+            self._pools[key] = deque()
+            while len(self._pools) > self.max_topics:
+                coldest = min(self._pools, key=self._popularity)
+                del self._pools[coldest]
+                self._stats["pools_evicted"] += 1
+        self._request_refill(key)
+
+    def _request_refill(self, key):
+        # A worker already on this topic keeps going until the pool is full
+        if self._queue is None or not self.running or key in self._queued or key in self._refilling:
+            return
+        # The pool may have been evicted (and the topic forgotten) since the refill was due
+        if key not in self._pools or key not in self._topics:
+            return
+        if len(self._pools[key]) < self._target(key):
+            self._queued.add(key)
+            self._queue.put_nowait((-self._popularity(key), next(self._seq), key))
+
+    async def get(self, topic):
+        """(quiz, source) for a topic; source is "pool" or "live"."""
+        key = normalize_question(topic)
+        self._track(key, topic)
+
+        pool = self._pools.get(key)
+        if pool:
+            quiz = pool.popleft()
+            self._stats["pool_hits"] += 1
+            self._request_refill(key)
+            return quiz, "pool"
+
+        # Concurrent requests for the same cold topic share one generation
+        quiz = await llm_single_flight.do(("quiz", key), lambda: self.generate_fn(topic))
+        self._stats["live_generations"] += 1
+        if self._target(key) > 0:
+            self._seed(key)
+        self._forget_cold_topics()
+        return quiz, "live"
+
+    async def _run(self):
+        while True:
+            _, _, key = await self._queue.get()
+            self._queued.discard(key)
+            # One bad topic must not end the worker, or refills stop for every topic
+            try:
+                self._refilling.add(key)
+                try:
+                    failed = not await self._fill(key)
+                finally:
+                    self._refilling.discard(key)
+                if failed:
+                    await asyncio.sleep(QUIZ_REFILL_RETRY_SECONDS)
+                    self._request_refill(key)
+            except Exception:
+                self._stats["refill_failures"] += 1
+                logger.exception("Quiz refill worker failed on %r", key)
+
+    async def _fill(self, key):
+        """Generate quizzes until the topic's pool is full; False on failure"""
+        pool = self._pools.get(key)
+        while pool is not None and len(pool) < self._target(key):
+            try:
+                quiz = await self.generate_fn(self._topics[key]["topic"])
+            except Exception:
+                self._stats["refill_failures"] += 1
+                logger.warning("Quiz refill for %r failed", key, exc_info=True)
+                return False
+            # The pool may have been evicted while generating
+            pool = self._pools.get(key)
+            if pool is not None:
+                pool.append(quiz)
+                self._stats["refills"] += 1
+        return True
+
+    def stats(self):
+        now = time.monotonic()
+        popular = sorted(self._topics.items(), key=lambda item: self._decayed(item[1], now), reverse=True)[:10]
+        return {
+            "enabled": self.running,
+            "depth": self.depth,
+            "max_topics": self.max_topics,
+            "topics_pooled": len(self._pools),
+            "quizzes_ready": sum(len(pool) for pool in self._pools.values()),
+            "refills_queued": len(self._queued),
+            "refilling": len(self._refilling),
+            **self._stats,
+            "popular_topics": [
+                {
+                    "topic": entry["topic"],
+                    "score": round(self._decayed(entry, now), 3),
+                    "requests": entry["requests"],
+                    "ready": len(self._pools.get(key, ()))
+                }
+                for key, entry in popular
+            ]
+        }
+
+
+quiz_pool = QuizPool()
@@ -0,0 +1,238 @@
+import os
+import time
+import random
+import asyncio
+from collections import deque
+import openai
+
+# ----------------------------
+# Retry Settings
+# ----------------------------
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+# No new attempt is started once a call has been running this long
+LLM_RETRY_DEADLINE_SECONDS = float(os.getenv("LLM_RETRY_DEADLINE_SECONDS", "30"))
+
+# ----------------------------
+# Circuit Breaker Settings
+# ----------------------------
+# Recent attempts per endpoint class the failure rate is computed over
+LLM_BREAKER_WINDOW = int(os.getenv("LLM_BREAKER_WINDOW", "20"))
+LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "10"))
+LLM_BREAKER_FAILURE_RATE = float(os.getenv("LLM_BREAKER_FAILURE_RATE", "0.5"))
+# How long an open breaker fails fast before letting a probe call through
+LLM_BREAKER_OPEN_SECONDS = float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "15"))
+
+# ----------------------------
+# Hedging Settings
+# ----------------------------
+# Endpoint classes whose slow calls get a second, racing request (off unless listed,
+# since every hedge is a full extra completion)
+LLM_HEDGE_CLASSES = {name.strip() for name in os.getenv("LLM_HEDGE_CLASSES", "").split(",") if name.strip()}
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1"))
+# Latency samples kept per class, and how many are needed before hedging starts
+LLM_LATENCY_SAMPLES = 200
+LLM_HEDGE_MIN_SAMPLES = 20
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the upstream while an endpoint class's breaker is open"""
+
+    def __init__(self, endpoint_class, retry_after):
+        self.endpoint_class = endpoint_class
+        self.retry_after = retry_after
+        super().__init__(f"The AI service is failing for {endpoint_class} requests, please retry in {max(1, round(retry_after))}s")
+
+
+def is_retryable(error):
+    """Transient upstream failures: timeouts, connection errors, 429s and 5xx"""
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    if isinstance(error, openai.RateLimitError):
+        # An exhausted quota does not recover by retrying
+        return error.code != "insufficient_quota"
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code >= 500 or error.status_code in (408, 409)
+    return False
+
+
+def is_upstream_failure(error):
+    """Errors the circuit breaker counts: retryable ones, except 429 throttling.
+
+    A 429 means the upstream is healthy but busy; it is handled by retrying
+    with backoff, and opening the breaker on it would add a full outage window.
+    """
+    return is_retryable(error) and not isinstance(error, openai.RateLimitError)
+
+
+def backoff_delay(attempt, error=None):
+    """Full-jitter exponential backoff, stretched to the upstream's Retry-After when it sends one"""
+    delay = random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * 2 ** attempt))
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            delay = max(delay, float(response.headers.get("retry-after", 0)))
+        except ValueError:
+            pass
+    return min(delay, LLM_RETRY_MAX_DELAY)
+
+
+# ----------------------------
+# Circuit Breaker
+# ----------------------------
+class CircuitBreaker:
+    """Fails fast for an endpoint class while the upstream is failing.
+
+    Closed: calls go through and their outcomes are recorded. When the
+    failure rate over the last window attempts reaches failure_rate, it
+    opens and rejects calls for open_seconds. Then a single probe call is
+    let through (half-open): success closes it, failure opens it again.
+    Only upstream failures count (see is_upstream_failure); a bad request,
+    a 429 or a call that admission control turned away says nothing about
+    the upstream's health.
+    """
+
+    def __init__(self, name, window=LLM_BREAKER_WINDOW, min_calls=LLM_BREAKER_MIN_CALLS,
+                 failure_rate=LLM_BREAKER_FAILURE_RATE, open_seconds=LLM_BREAKER_OPEN_SECONDS):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self.state = "closed"
+        self.outcomes = deque(maxlen=window)  # True for success
+        self.opened_at = 0.0
+        self.probe_started = None
+        self.times_opened = 0
+        self.rejected = 0
+
+    def check(self):
+        """Raise CircuitOpenError unless a call may go to the upstream now.
+
+        Returns True when the call is the half-open probe; its outcome must be
+        passed back to record() however the call ends.
+        """
+        if self.state == "closed":
+            return False
+        now = time.monotonic()
+        if self.state == "open":
+            remaining = self.opened_at + self.open_seconds - now
+            if remaining > 0:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, remaining)
+            self.state = "half_open"
+            self.probe_started = None
+        # Half-open: one probe at a time (a probe that never reports back expires)
+        if self.probe_started is not None and now - self.probe_started < self.open_seconds:
+            self.rejected += 1
+            raise CircuitOpenError(self.name, self.probe_started + self.open_seconds - now)
+        self.probe_started = now
+        return True
+
+    def _open(self):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.times_opened += 1
+
+    def record(self, success, probe=False):
+        """Record a call's outcome: True, False, or None when it says nothing about the upstream"""
+        if self.state == "half_open":
+            if not probe:
+                # Late results of calls started before it opened
+                return
+            if success is None:
+                # No verdict: free the slot so the next call probes
+                self.probe_started = None
+            elif success:
+                self.state = "closed"
+                self.outcomes.clear()
+            else:
+                self._open()
+            return
+        if self.state == "open":
+            # Late results of calls started before it opened
+            return
+        if success is None:
+            return
+        self.outcomes.append(success)
+        failures = self.outcomes.count(False)
+        if len(self.outcomes) >= self.min_calls and failures / len(self.outcomes) >= self.failure_rate:
+            self._open()
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "recent_failures": self.outcomes.count(False),
+            "recent_calls": len(self.outcomes),
+            "times_opened": self.times_opened,
+            "rejected": self.rejected
+        }
+
+
+# ----------------------------
+# Hedging
+# ----------------------------
+class LatencyTracker:
+    """Recent upstream latencies of an endpoint class, and the hedging delay derived from them"""
+
+    def __init__(self, hedging=False, samples=LLM_LATENCY_SAMPLES):
+        self.hedging = hedging
+        self.latencies = deque(maxlen=samples)
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def observe(self, seconds):
+        self.latencies.append(seconds)
+
+    def percentile(self, percentile):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))]
+
+    def hedge_delay(self):
+        """Seconds after which a second request is sent, or None to never hedge"""
+        if not self.hedging or len(self.latencies) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return max(LLM_HEDGE_MIN_DELAY, self.percentile(LLM_HEDGE_PERCENTILE))
+
+    def stats(self):
+        p50, p95 = self.percentile(50), self.percentile(95)
+        return {
+            "samples": len(self.latencies),
+            "p50_ms": round(p50 * 1000) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000) if p95 is not None else None,
+            "hedge_after_ms": round(self.hedge_delay() * 1000) if self.hedge_delay() else None,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins
+        }
+
+
+async def hedged(call, tracker):
+    """Run call(); if it is slower than the tracker's hedge delay, race a second call against it"""
+    delay = tracker.hedge_delay()
+    if delay is None:
+        return await call()
+
+    first = asyncio.ensure_future(call())
+    tasks = {first}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            tracker.hedges += 1
+            tasks.add(asyncio.ensure_future(call()))
+        error = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not first:
+                        tracker.hedge_wins += 1
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        # The slower request is abandoned (its connection is closed)
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,155 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from scipy.sparse import vstack
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+# ----------------------------
+# Cache Settings
+# ----------------------------
+CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2000"))
+CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "21600"))
+CACHE_SIMILARITY_THRESHOLD = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.75"))
+
+
+def normalize_question(text):
+    """Lowercase, drop punctuation and collapse whitespace"""
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+
+class SemanticResponseCache:
+    """LRU/TTL cache of LLM replies that also matches near-duplicate questions.
+
+    Questions are compared by cosine similarity in the TF-IDF space of the
+    intent classifier, and only against entries with the same intent and
+    topic lock. Because that vocabulary is small, a candidate must also have
+    the same out-of-vocabulary content words, otherwise "explain deep
+    learning" would look identical to "explain machine learning".
+    """
+
+    def __init__(self, vectorizer, max_entries=CACHE_MAX_ENTRIES,
+                 ttl_seconds=CACHE_TTL_SECONDS, threshold=CACHE_SIMILARITY_THRESHOLD):
+        self.vectorizer = vectorizer
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+
+        self._entries = OrderedDict()  # (intent, topic_lock, normalized) -> entry, in LRU order
+        self._buckets = {}             # (intent, topic_lock) -> {"keys": [...], "matrix": sparse or None}
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expirations": 0
+        }
+
+    def _out_of_vocabulary(self, normalized):
+        vocabulary = self.vectorizer.vocabulary_
+        return frozenset(
+            word for word in normalized.split()
+            if word not in vocabulary and word not in ENGLISH_STOP_WORDS
+        )
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        bucket = self._buckets.get(key[:2])
+        if bucket is not None:
+            bucket["keys"].remove(key)
+            bucket["matrix"] = None
+            if not bucket["keys"]:
+                del self._buckets[key[:2]]
+
+    def _is_expired(self, key, now):
+        if now - self._entries[key]["stored_at"] <= self.ttl_seconds:
+            return False
+        self._remove(key)
+        self._stats["expirations"] += 1
+        return True
+
+    def purge_expired(self):
+        """Drop every expired entry (lookups only check the entries they touch)"""
+        now = time.time()
+        with self._lock:
+            for key in list(self._entries):
+                self._is_expired(key, now)
+
+    def _hit(self, key, kind):
+        self._entries.move_to_end(key)
+        self._stats["hits"] += 1
+        self._stats[kind] += 1
+        return self._entries[key]["response"]
+
+    def lookup(self, question, intent, topic_lock):
+        """Return a cached reply for this question, or None"""
+        normalized = normalize_question(question)
+        exact_key = (intent, topic_lock, normalized)
+
+        with self._lock:
+            now = time.time()
+            if exact_key in self._entries and not self._is_expired(exact_key, now):
+                return self._hit(exact_key, "exact_hits")
+
+            bucket = self._buckets.get((intent, topic_lock))
+            vector = self.vectorizer.transform([normalized])
+            if bucket is None or vector.nnz == 0:
+                self._stats["misses"] += 1
+                return None
+
+            if bucket["matrix"] is None:
+                bucket["matrix"] = vstack([self._entries[key]["vector"] for key in bucket["keys"]]).tocsr()
+
+            # TF-IDF rows are L2-normalized, so the dot product is the cosine similarity
+            similarities = (bucket["matrix"] @ vector.T).toarray().ravel()
+            oov = self._out_of_vocabulary(normalized)
+            candidates = [bucket["keys"][i] for i in similarities.argsort()[::-1] if similarities[i] >= self.threshold]
+            for key in candidates:
+                if self._entries[key]["oov"] == oov and not self._is_expired(key, now):
+                    return self._hit(key, "semantic_hits")
+
+            self._stats["misses"] += 1
+            return None
+
+    def store(self, question, intent, topic_lock, response):
+        """Cache a reply for this question"""
+        normalized = normalize_question(question)
+        key = (intent, topic_lock, normalized)
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = {
+                "response": response,
+                "vector": self.vectorizer.transform([normalized]),
+                "oov": self._out_of_vocabulary(normalized),
+                "stored_at": time.time()
+            }
+            bucket = self._buckets.setdefault(key[:2], {"keys": [], "matrix": None})
+            bucket["keys"].append(key)
+            bucket["matrix"] = None
+            self._stats["stores"] += 1
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0
+            }
@@ -0,0 +1,282 @@
+import os
+import re
+import codecs
+import zipfile
+from xml.etree import ElementTree
+from content_cache import ContentHashCache
+from prompt_builder import count_tokens
+
+# PDF extraction is optional: without pypdf, PDF uploads are rejected with a clear error
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+# ----------------------------
+# Parsing Settings
+# ----------------------------
+# Input tokens spent on the resume in the review prompt
+RESUME_DIGEST_TOKEN_BUDGET = int(os.getenv("RESUME_DIGEST_TOKEN_BUDGET", "900"))
+RESUME_MAX_PAGES = int(os.getenv("RESUME_MAX_PAGES", "10"))
+# Extracted text beyond this is ignored (a resume is a few thousand characters)
+RESUME_MAX_TEXT_CHARS = int(os.getenv("RESUME_MAX_TEXT_CHARS", "100000"))
+
+RESUME_CACHE_MAX_ENTRIES = int(os.getenv("RESUME_CACHE_MAX_ENTRIES", "256"))
+RESUME_CACHE_TTL_SECONDS = float(os.getenv("RESUME_CACHE_TTL_SECONDS", "21600"))
+
+# Uncompressed size allowed for the DOCX body part (guards against zip bombs)
+DOCX_MAX_XML_BYTES = 20 * 1024 * 1024
+
+# Canonical section -> heading variants (compared after normalize_heading)
+SECTION_HEADINGS = {
+    "summary": ["summary", "professional summary", "profile", "objective", "career objective", "about me"],
+    "experience": ["experience", "work experience", "professional experience", "employment",
+                   "employment history", "work history", "internships", "internship experience"],
+    "skills": ["skills", "technical skills", "core skills", "key skills", "core competencies",
+               "technologies", "tools and technologies", "tech stack"],
+    "projects": ["projects", "personal projects", "academic projects", "selected projects", "key projects"],
+    "education": ["education", "academic background", "academic qualifications", "qualifications"],
+    "certifications": ["certifications", "certificates", "licenses and certifications", "courses"],
+    "achievements": ["achievements", "awards", "honors", "honours", "awards and achievements"],
+}
+
+# Sections the reviewer always wants to hear about, even when missing
+CORE_SECTIONS = ("experience", "skills", "projects", "education")
+
+# Digest order; budget shortfalls are absorbed by the largest sections first
+DIGEST_ORDER = ("summary", "experience", "projects", "skills", "education",
+                "certifications", "achievements", "other")
+
+_HEADING_LOOKUP = {variant: section for section, variants in SECTION_HEADINGS.items() for variant in variants}
+_BULLET_PATTERN = re.compile(r"^\s*(?:[•●▪◦‣∙·*\-–—]|\d+[.)])\s+")
+_WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+class ResumeParseError(ValueError):
+    """Raised when an upload is not a readable PDF, DOCX or text resume"""
+
+
+# ----------------------------
+# Text Extraction
+# ----------------------------
+def detect_format(fileobj):
+    fileobj.seek(0)
+    head = fileobj.read(8)
+    fileobj.seek(0)
+    if head.startswith(b"%PDF"):
+        return "pdf"
+    if head.startswith(b"PK\x03\x04"):
+        return "docx"
+    if head.startswith(b"\xd0\xcf\x11\xe0"):
+        raise ResumeParseError("Legacy .doc files are not supported, please upload a PDF or DOCX")
+    return "text"
+
+
+def _pdf_text(fileobj):
+    if PdfReader is None:
+        raise ResumeParseError("PDF resumes need the pypdf package on the server")
+    try:
+        reader = PdfReader(fileobj)
+        if reader.is_encrypted:
+            raise ResumeParseError("Password-protected PDFs cannot be analyzed")
+        pages = []
+        for page in reader.pages[:RESUME_MAX_PAGES]:
+            pages.append(page.extract_text() or "")
+        return "\n".join(pages)
+    except ResumeParseError:
+        raise
+    except Exception as e:
+        raise ResumeParseError(f"Could not read the PDF: {type(e).__name__}")
+
+
+def _docx_text(fileobj):
+    try:
+        with zipfile.ZipFile(fileobj) as archive:
+            info = archive.getinfo("word/document.xml")
+            if info.file_size > DOCX_MAX_XML_BYTES:
+                raise ResumeParseError("DOCX document is too large")
+            with archive.open(info) as document:
+                paragraphs, runs = [], []
+                # Stream the XML; a paragraph's text is emitted when it closes
+                for _, element in ElementTree.iterparse(document):
+                    tag = element.tag
+                    if tag == f"{_WORD_NAMESPACE}t":
+                        runs.append(element.text or "")
+                    elif tag == f"{_WORD_NAMESPACE}tab":
+                        runs.append("\t")
+                    elif tag in (f"{_WORD_NAMESPACE}br", f"{_WORD_NAMESPACE}cr"):
+                        runs.append("\n")
+                    elif tag == f"{_WORD_NAMESPACE}p":
+                        paragraphs.append("".join(runs))
+                        runs = []
+                        element.clear()
+                return "\n".join(paragraphs)
+    except ResumeParseError:
+        raise
+    except (KeyError, zipfile.BadZipFile, ElementTree.ParseError):
+        raise ResumeParseError("Could not read the DOCX file")
+
+
+def _plain_text(fileobj):
+    # Four bytes per character at most, so this always covers the text limit
+    data = fileobj.read(RESUME_MAX_TEXT_CHARS * 4)
+    if b"\x00" in data[:4096]:
+        raise ResumeParseError("Unsupported file type, please upload a PDF, DOCX or text resume")
+    try:
+        # Not final, so a multi-byte character cut at the read limit is dropped instead of failing
+        return codecs.getincrementaldecoder("utf-8")().decode(data, final=False)
+    except UnicodeDecodeError:
+        return data.decode("cp1252", errors="replace")
+
+
+def extract_text(fileobj):
+    """(format, text) of an uploaded resume (blocking)"""
+    resume_format = detect_format(fileobj)
+    if resume_format == "pdf":
+        text = _pdf_text(fileobj)
+    elif resume_format == "docx":
+        text = _docx_text(fileobj)
+    else:
+        text = _plain_text(fileobj)
+    return resume_format, text[:RESUME_MAX_TEXT_CHARS]
+
+
+# ----------------------------
+# Sections
+# ----------------------------
+def normalize_heading(line):
+    line = re.sub(r"[^a-z& ]", " ", line.lower()).replace("&", " and ")
+    return " ".join(line.split())
+
+
+def _clean_line(line):
+    line = " ".join(line.split())
+    return _BULLET_PATTERN.sub("• ", line) if _BULLET_PATTERN.match(line) else line
+
+
+def split_sections(text):
+    """Map canonical section names to their lines; text before any heading is "other"."""
+    sections = {}
+    current = "other"
+    for raw in text.splitlines():
+        line = _clean_line(raw)
+        if not line:
+            continue
+        # Headings are short lines, optionally with content after a colon ("Skills: Python, SQL")
+        head, _, rest = line.partition(":")
+        section = _HEADING_LOOKUP.get(normalize_heading(head)) if len(head) <= 40 else None
+        if section is not None:
+            current = section
+            sections.setdefault(current, [])
+            line = rest.strip()
+            if not line:
+                continue
+        lines = sections.setdefault(current, [])
+        # PDF extraction often repeats headers/footers on every page
+        if not lines or lines[-1] != line:
+            lines.append(line)
+    return sections
+
+
+# ----------------------------
+# Digest
+# ----------------------------
+def _truncate_lines(lines, budget):
+    """Leading lines that fit in budget tokens (the last one cut at a word)"""
+    kept, used = [], 0
+    for line in lines:
+        tokens = count_tokens(line) + 1
+        if used + tokens <= budget:
+            kept.append(line)
+            used += tokens
+            continue
+        # Cut the first line that does not fit at a word boundary
+        words = []
+        for word in line.split():
+            used += count_tokens(word)
+            if used + 2 > budget:
+                break
+            words.append(word)
+        if words:
+            kept.append(" ".join(words) + " …")
+        break
+    return kept
+
+
+def allocate_budget(sizes, budget):
+    """Split budget across sections: small ones get everything, large ones share the rest"""
+    allocation = {}
+    remaining = dict(sizes)
+    while remaining:
+        share = budget // len(remaining)
+        fitting = {name: size for name, size in remaining.items() if size <= share}
+        if not fitting:
+            allocation.update({name: share for name in remaining})
+            break
+        for name, size in fitting.items():
+            allocation[name] = size
+            budget -= size
+            del remaining[name]
+    return allocation
+
+
+def build_digest(sections, budget=RESUME_DIGEST_TOKEN_BUDGET):
+    """Compact, token-budgeted text of the resume sections for the review prompt"""
+    present = [name for name in DIGEST_ORDER if sections.get(name)]
+    missing = [name for name in CORE_SECTIONS if not sections.get(name)]
+
+    headings = {name: f"## {name.title() if name != 'other' else 'Header and other details'}" for name in present}
+    note = f"Sections not found: {', '.join(missing)}" if missing else ""
+    overhead = sum(count_tokens(headings[name]) + 2 for name in present) + count_tokens(note)
+
+    sizes = {name: sum(count_tokens(line) + 1 for line in sections[name]) for name in present}
+    allocation = allocate_budget(sizes, max(budget - overhead, 0))
+
+    blocks, truncated = [], False
+    for name in present:
+        lines = sections[name]
+        if allocation[name] < sizes[name]:
+            lines = _truncate_lines(lines, allocation[name])
+            truncated = True
+        if lines:
+            blocks.append(headings[name] + "\n" + "\n".join(lines))
+    if note:
+        blocks.append(note)
+
+    digest = "\n\n".join(blocks)
+    return {
+        "digest": digest,
+        "digest_tokens": count_tokens(digest),
+        "truncated": truncated,
+        "sections_found": [name for name in present if name != "other"],
+        "sections_missing": missing
+    }
+
+
+def parse_resume(fileobj, budget=RESUME_DIGEST_TOKEN_BUDGET):
+    """Extract, sectionize and digest an uploaded resume (blocking)"""
+    resume_format, text = extract_text(fileobj)
+    if not text.strip():
+        raise ResumeParseError("No text could be extracted from the resume (scanned PDFs are not supported)")
+    parsed = build_digest(split_sections(text), budget)
+    parsed["format"] = resume_format
+    parsed["text_chars"] = len(text)
+    return parsed
+
+
+# ----------------------------
+# Caches
+# ----------------------------
+# Parsed digests by content hash (shared across target roles) and
+# feedback by content hash + target role
+resume_parse_cache = ContentHashCache(RESUME_CACHE_MAX_ENTRIES, RESUME_CACHE_TTL_SECONDS)
+resume_feedback_cache = ContentHashCache(RESUME_CACHE_MAX_ENTRIES, RESUME_CACHE_TTL_SECONDS)
+
+
+def resume_stats():
+    return {
+        "digest_token_budget": RESUME_DIGEST_TOKEN_BUDGET,
+        "pdf_support": PdfReader is not None,
+        "parse_cache": resume_parse_cache.stats(),
+        "feedback_cache": resume_feedback_cache.stats()
+    }
@@ -0,0 +1,241 @@
+import os
+import gc
+import sys
+import math
+import time
+import signal
+import socket
+import logging
+import argparse
+import threading
+
+logger = logging.getLogger("serve")
+
+# ----------------------------
+# Server Settings
+# ----------------------------
+# `python serve.py` imports the app once in a master process (intent
+# classifier, prompt templates, tokenizer, training data), then forks the
+# workers. They share those pages copy-on-write instead of each loading
+# and fitting its own copy, and accept connections from one listening socket.
+SERVER_HOST = os.getenv("HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("PORT", "8000"))
+# Worker count, or "auto" for one per usable CPU
+SERVER_WORKERS = os.getenv("WEB_CONCURRENCY", "auto")
+SERVER_BACKLOG = int(os.getenv("SERVER_BACKLOG", "2048"))
+# When set, worker i also listens on this port + i, so each worker can be
+# scraped for metrics or pinned to sessions by a proxy in front
+SERVER_WORKER_BASE_PORT = int(os.getenv("SERVER_WORKER_BASE_PORT", "0"))
+# Time workers get to finish in-flight requests on shutdown before they are killed
+SERVER_GRACEFUL_TIMEOUT = float(os.getenv("SERVER_GRACEFUL_TIMEOUT", "30"))
+# A worker that exits sooner than this after starting is a startup failure, not a crash
+SERVER_MIN_WORKER_UPTIME = float(os.getenv("SERVER_MIN_WORKER_UPTIME", "5"))
+
+# Exit code of a worker whose app failed to start (as with plain uvicorn)
+STARTUP_FAILURE = 3
+
+
+def _cgroup_cpu_limit():
+    """CPU quota of the container in CPUs, or None when unlimited"""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:  # cgroup v2
+            quota, period = f.read().split()
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:  # cgroup v1
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        return None if quota <= 0 else quota / period
+    except (OSError, ValueError):
+        return None
+
+
+def available_cpus():
+    """CPUs this process may use, honouring affinity masks and container quotas"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    limit = _cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, math.ceil(limit))
+    return max(1, cpus)
+
+
+def worker_count(setting=SERVER_WORKERS):
+    # Workers are single event loops that mostly wait on the upstream, so one
+    # per core keeps every core busy without time-slicing CPU-bound turns
+    if setting == "auto":
+        return available_cpus()
+    return max(1, int(setting))
+
+
+def prepare_environment(workers):
+    """Settings every worker must agree on, fixed before the app is imported"""
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    if workers == 1:
+        return
+    # In-memory sessions would be private to each worker; share them through SQLite
+    backend = os.environ.setdefault("SESSION_BACKEND", "sqlite")
+    if backend != "sqlite":
+        raise SystemExit(
+            f"SESSION_BACKEND={backend} keeps sessions inside one process; "
+            "use SESSION_BACKEND=sqlite or WEB_CONCURRENCY=1"
+        )
+    os.environ["SESSION_SHARED"] = "1"
+
+
+def preload():
+    """Import the app in the master and freeze what it loaded; returns the ASGI app"""
+    started = time.perf_counter()
+    from app import app
+    # The collector writes to every object it scans, which would copy the
+    # shared pages into each worker. Frozen objects are never scanned.
+    gc.collect()
+    gc.freeze()
+    logger.info("Preloaded the app in %.0f ms (%d objects frozen)",
+                (time.perf_counter() - started) * 1000, gc.get_freeze_count())
+    return app
+
+
+def bind_socket(host=SERVER_HOST, port=SERVER_PORT, backlog=SERVER_BACKLOG):
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
+
+
+def run_worker(app, sockets, worker_id):
+    """Serve app on the inherited sockets until told to stop; returns the exit code"""
+    import uvicorn
+
+    os.environ["SERVER_WORKER_ID"] = str(worker_id)
+    config = uvicorn.Config(
+        app,
+        lifespan="on",
+        log_level=os.getenv("LOG_LEVEL", "INFO").lower(),
+        timeout_graceful_shutdown=SERVER_GRACEFUL_TIMEOUT
+    )
+    server = uvicorn.Server(config)
+    server.run(sockets=sockets)
+    return 0 if server.started else STARTUP_FAILURE
+
+
+# ----------------------------
+# Pre-fork Master
+# ----------------------------
+class PreforkServer:
+    """Forks the workers, restarts crashed ones and stops them all on SIGTERM/SIGINT.
+
+    A worker dying during startup stops the pool instead of being restarted,
+    so a broken deploy fails fast rather than fork-looping.
+    """
+
+    def __init__(self, app, sock, workers, worker_sockets=None, graceful_timeout=SERVER_GRACEFUL_TIMEOUT,
+                 min_uptime=SERVER_MIN_WORKER_UPTIME):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.worker_sockets = worker_sockets or {}  # worker id -> its own listening socket
+        self.graceful_timeout = graceful_timeout
+        self.min_uptime = min_uptime
+        self.stopping = False
+        self.failed = False
+        self._children = {}  # pid -> (worker id, monotonic start time)
+
+    def spawn(self, worker_id):
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGALRM):
+                    signal.signal(signum, signal.SIG_DFL)
+                own = self.worker_sockets.get(worker_id)
+                code = run_worker(self.app, [self.sock] + ([own] if own else []), worker_id)
+            except BaseException:
+                logger.exception("Worker %d failed", worker_id)
+            finally:
+                os._exit(code)
+        self._children[pid] = (worker_id, time.monotonic())
+        logger.info("Started worker %d (pid %d)", worker_id, pid)
+
+    def stop(self, signum=None, frame=None):
+        if not self.stopping:
+            self.stopping = True
+            logger.info("Stopping %d workers", len(self._children))
+            # Workers still running after the grace period are killed
+            signal.alarm(max(1, math.ceil(self.graceful_timeout)) + 1)
+        self._signal_children(signal.SIGTERM)
+
+    def _kill(self, signum=None, frame=None):
+        logger.warning("Killing %d workers that did not stop in time", len(self._children))
+        self._signal_children(signal.SIGKILL)
+
+    def _signal_children(self, signum):
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        """Supervise the workers until they have all exited; returns the exit code"""
+        if threading.active_count() > 1:
+            logger.warning("%d threads are running before fork; workers will not have them",
+                           threading.active_count() - 1)
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGALRM, self._kill)
+        for worker_id in range(self.workers):
+            self.spawn(worker_id)
+
+        while self._children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            worker_id, started = self._children.pop(pid, (None, 0))
+            if worker_id is None or self.stopping:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            if time.monotonic() - started < self.min_uptime:
+                logger.error("Worker %d (pid %d) exited with %d during startup, shutting down",
+                             worker_id, pid, code)
+                self.failed = True
+                self.stop()
+                continue
+            logger.warning("Worker %d (pid %d) exited with %d, restarting", worker_id, pid, code)
+            self.spawn(worker_id)
+
+        signal.alarm(0)
+        return 1 if self.failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the app from pre-forked workers that share the loaded model")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", default=SERVER_WORKERS, help='worker processes, or "auto" for one per CPU')
+    parser.add_argument("--worker-base-port", type=int, default=SERVER_WORKER_BASE_PORT,
+                        help="also serve worker i on this port + i (0 to disable)")
+    args = parser.parse_args()
+
+    workers = worker_count(args.workers)
+    prepare_environment(workers)
+    app = preload()
+    sock = bind_socket(args.host, args.port)
+    worker_sockets = {}
+    if args.worker_base_port:
+        worker_sockets = {i: bind_socket(args.host, args.worker_base_port + i) for i in range(workers)}
+    logger.info("Serving on http://%s:%d with %d workers (%d CPUs available)",
+                args.host, args.port, workers, available_cpus())
+    sys.exit(PreforkServer(app, sock, workers, worker_sockets).run())
+
+
+if __name__ == "__main__":
+    main()
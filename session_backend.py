@@ -0,0 +1,440 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger(__name__)
+
+# ----------------------------
+# Backend Settings
+# ----------------------------
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")  # memory | sqlite
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.db")
+SESSION_FLUSH_INTERVAL_MS = float(os.getenv("SESSION_FLUSH_INTERVAL_MS", "200"))
+SESSION_FLUSH_MAX_BATCH = int(os.getenv("SESSION_FLUSH_MAX_BATCH", "500"))
+
+# Set when several processes serve the same sessions (serve.py does this for
+# multiple workers): writes go straight to the database and cached sessions
+# are checked against it before use
+SESSION_SHARED = os.getenv("SESSION_SHARED", "0") == "1"
+# How long the change log is kept for other processes to catch up from
+SESSION_CHANGE_RETENTION_SECONDS = float(os.getenv("SESSION_CHANGE_RETENTION_SECONDS", "3600"))
+# Shared-mode writes run on the request path, so waiting for another
+# process's write lock is capped; past this the request fails with
+# SessionBusyError instead of stalling the worker's event loop
+SESSION_SHARED_BUSY_TIMEOUT_MS = int(os.getenv("SESSION_SHARED_BUSY_TIMEOUT_MS", "100"))
+
+
+class SessionBusyError(Exception):
+    """Raised when a shared-mode write cannot get the database lock in time (retryable)"""
+
+    retry_after = 1
+
+    def __init__(self, path):
+        super().__init__(f"Session store {path} is busy, please retry")
+
+
+class SessionBackend:
+    """Persistence hook for BoundedSessionStore (the default keeps nothing)"""
+
+    # Whether sessions outlive eviction from the in-process cache
+    persistent = False
+    # Whether other processes write the same sessions
+    shared = False
+
+    def load(self, namespace, session_id):
+        """Return the stored value or None"""
+        return None
+
+    def load_versioned(self, namespace, session_id):
+        """(value, version); the version changes on every write (None unless shared)"""
+        return self.load(namespace, session_id), None
+
+    def version(self, namespace, session_id):
+        """Current version of a stored session, None when it is missing or not shared"""
+        return None
+
+    def scan(self, namespace):
+        """Yield (session_id, value) for every stored session"""
+        return iter(())
+
+    def save(self, namespace, session_id, value, lock=None):
+        """Schedule value to be persisted (lock guards the value while it is serialized).
+
+        Returns the new version when shared, else None.
+        """
+
+    def delete(self, namespace, session_id):
+        """Schedule the session to be removed"""
+
+    def transaction(self):
+        """Context making a read-modify-write atomic across processes (when shared)"""
+        return nullcontext()
+
+    def latest_change(self):
+        """Number of the last write seen by the change log (0 unless shared)"""
+        return 0
+
+    def changes(self, namespace, since):
+        """(latest change, ids of sessions written after since).
+
+        The ids are None when the log no longer reaches back to since.
+        """
+        return since, []
+
+    def flush(self):
+        """Persist everything scheduled so far"""
+
+    def maintain(self):
+        """Periodic upkeep, run by the session sweeper"""
+
+    def close(self):
+        self.flush()
+
+    def stats(self):
+        return {"backend": "memory"}
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """SQLite (WAL) session backend with batched write-behind.
+
+    save() and delete() only record the latest state per session; a
+    background thread flushes the pending set in one transaction every
+    flush interval (or sooner once max_batch sessions are pending), so
+    repeated writes to a hot session coalesce and the request path never
+    waits on disk.
+
+    Shared mode is for several processes on one database. Writes are then
+    committed at once, each numbered by a row in a change log that also
+    versions the session. Readers compare versions to spot sessions that
+    another process changed, and follow the log to keep listings current.
+    """
+
+    persistent = True
+
+    def __init__(self, path=SESSION_DB_PATH, flush_interval_ms=SESSION_FLUSH_INTERVAL_MS,
+                 max_batch=SESSION_FLUSH_MAX_BATCH, shared=SESSION_SHARED,
+                 change_retention=SESSION_CHANGE_RETENTION_SECONDS, busy_timeout_ms=SESSION_SHARED_BUSY_TIMEOUT_MS):
+        self.path = path
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch = max_batch
+        self.shared = shared
+        self.change_retention = change_retention
+        self.busy_timeout_ms = busy_timeout_ms
+
+        self._pending = {}   # (namespace, session_id) -> (value, lock) or None for deletes
+        self._pending_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._local = threading.local()
+        self._writer = None
+        self._writer_pid = None
+        self._closed = False
+        self._stats = {
+            "flushes": 0,
+            "rows_written": 0,
+            "rows_deleted": 0,
+            "writes_coalesced": 0,
+            "reads": 0,
+            "version_checks": 0,
+            "changes_pruned": 0,
+            "busy_rejections": 0,
+            "last_flush_ms": 0.0
+        }
+
+    # ----------------------------
+    # Connections (per thread, opened lazily so they never cross a fork)
+    # ----------------------------
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " namespace TEXT NOT NULL,"
+                " session_id TEXT NOT NULL,"
+                " data TEXT NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " version INTEGER NOT NULL DEFAULT 0,"
+                " PRIMARY KEY (namespace, session_id))"
+            )
+            if self.shared:
+                self._prepare_shared(conn)
+                # Set up with the patient timeout above (workers start together), then fail fast
+                conn.execute(f"PRAGMA busy_timeout = {self.busy_timeout_ms:d}")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            self._local.depth = 0
+        return conn
+
+    def _prepare_shared(self, conn):
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_changes ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " namespace TEXT NOT NULL,"
+            " session_id TEXT NOT NULL,"
+            " changed_at REAL NOT NULL)"
+        )
+        # Databases written before shared mode existed have no version column
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(sessions)")}
+        if "version" not in columns:
+            try:
+                conn.execute("ALTER TABLE sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            except sqlite3.OperationalError:
+                pass  # another process added it first
+
+    def _ensure_writer(self):
+        if self._writer is None or self._writer_pid != os.getpid() or not self._writer.is_alive():
+            self._writer = threading.Thread(target=self._run_writer, name="session-writer", daemon=True)
+            self._writer_pid = os.getpid()
+            self._writer.start()
+
+    # ----------------------------
+    # Backend API
+    # ----------------------------
+    def load(self, namespace, session_id):
+        key = (namespace, session_id)
+        with self._pending_lock:
+            if key in self._pending:
+                # Not flushed yet, the pending state is the newest one
+                pending = self._pending[key]
+                return None if pending is None else pending[0]
+
+        self._stats["reads"] += 1
+        row = self._connect().execute(
+            "SELECT data FROM sessions WHERE namespace = ? AND session_id = ?", key
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def load_versioned(self, namespace, session_id):
+        if not self.shared:
+            return self.load(namespace, session_id), None
+        self._stats["reads"] += 1
+        row = self._connect().execute(
+            "SELECT data, version FROM sessions WHERE namespace = ? AND session_id = ?", (namespace, session_id)
+        ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else (None, None)
+
+    def version(self, namespace, session_id):
+        if not self.shared:
+            return None
+        self._stats["version_checks"] += 1
+        row = self._connect().execute(
+            "SELECT version FROM sessions WHERE namespace = ? AND session_id = ?", (namespace, session_id)
+        ).fetchone()
+        return row[0] if row else None
+
+    def scan(self, namespace):
+        self.flush()
+        rows = self._connect().execute(
+            "SELECT session_id, data FROM sessions WHERE namespace = ?", (namespace,)
+        )
+        for session_id, data in rows:
+            yield session_id, json.loads(data)
+
+    def _schedule(self, key, entry):
+        with self._pending_lock:
+            if key in self._pending:
+                self._stats["writes_coalesced"] += 1
+            self._pending[key] = entry
+            backlog = len(self._pending)
+        self._ensure_writer()
+        if backlog >= self.max_batch:
+            self._wakeup.set()
+
+    def save(self, namespace, session_id, value, lock=None):
+        if self.shared:
+            if lock is not None:
+                with lock:
+                    data = json.dumps(value)
+            else:
+                data = json.dumps(value)
+            return self._write_now(namespace, session_id, data)
+        self._schedule((namespace, session_id), (value, lock))
+
+    def delete(self, namespace, session_id):
+        if self.shared:
+            self._write_now(namespace, session_id, None)
+            return
+        self._schedule((namespace, session_id), None)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._pending_lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return
+
+            started = time.perf_counter()
+            upserts, deletes = [], []
+            now = time.time()
+            for (namespace, session_id), entry in batch.items():
+                if entry is None:
+                    deletes.append((namespace, session_id))
+                    continue
+                value, lock = entry
+                if lock is not None:
+                    with lock:
+                        data = json.dumps(value)
+                else:
+                    data = json.dumps(value)
+                upserts.append((namespace, session_id, data, now))
+
+            conn = self._connect()
+            conn.execute("BEGIN")
+            try:
+                if upserts:
+                    conn.executemany(
+                        "INSERT INTO sessions (namespace, session_id, data, updated_at) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT (namespace, session_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                        upserts
+                    )
+                if deletes:
+                    conn.executemany("DELETE FROM sessions WHERE namespace = ? AND session_id = ?", deletes)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                # Put the batch back unless newer state arrived in the meantime
+                with self._pending_lock:
+                    for key, entry in batch.items():
+                        self._pending.setdefault(key, entry)
+                raise
+
+            self._stats["flushes"] += 1
+            self._stats["rows_written"] += len(upserts)
+            self._stats["rows_deleted"] += len(deletes)
+            self._stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 3)
+
+    def _run_writer(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Session flush to %s failed, will retry", self.path)
+
+    def close(self):
+        self._closed = True
+        self._wakeup.set()
+        self.flush()
+
+    def stats(self):
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "shared": self.shared,
+            "pending": len(self._pending),
+            **self._stats
+        }
+
+    # ----------------------------
+    # Shared Mode (write-through with a change log)
+    # ----------------------------
+    def transaction(self):
+        return self._shared_transaction() if self.shared else nullcontext()
+
+    @contextmanager
+    def _shared_transaction(self):
+        conn = self._connect()
+        depth = self._local.depth
+        if depth == 0:
+            # Takes the write lock up front, so the read that follows is current
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) and "busy" not in str(e):
+                    raise
+                self._stats["busy_rejections"] += 1
+                raise SessionBusyError(self.path) from e
+        self._local.depth = depth + 1
+        try:
+            yield
+        except BaseException:
+            self._local.depth = depth
+            if depth == 0 and conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        self._local.depth = depth
+        if depth == 0:
+            conn.execute("COMMIT")
+
+    def _write_now(self, namespace, session_id, data):
+        """Upsert (or delete, for data None) one session and log the change; returns its version"""
+        now = time.time()
+        with self.transaction():
+            conn = self._connect()
+            version = conn.execute(
+                "INSERT INTO session_changes (namespace, session_id, changed_at) VALUES (?, ?, ?)",
+                (namespace, session_id, now)
+            ).lastrowid
+            if data is None:
+                conn.execute("DELETE FROM sessions WHERE namespace = ? AND session_id = ?", (namespace, session_id))
+            else:
+                conn.execute(
+                    "INSERT INTO sessions (namespace, session_id, data, updated_at, version) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (namespace, session_id) DO UPDATE SET data = excluded.data, "
+                    "updated_at = excluded.updated_at, version = excluded.version",
+                    (namespace, session_id, data, now, version)
+                )
+        self._stats["rows_deleted" if data is None else "rows_written"] += 1
+        return version
+
+    def latest_change(self):
+        if not self.shared:
+            return 0
+        row = self._connect().execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'session_changes'"
+        ).fetchone()
+        return row[0] if row else 0
+
+    def changes(self, namespace, since):
+        if not self.shared:
+            return since, []
+        latest = self.latest_change()
+        if latest == since:
+            return latest, []
+        conn = self._connect()
+        # Change numbers have no gaps, so a log starting after since+1 has been pruned
+        oldest = conn.execute("SELECT MIN(seq) FROM session_changes").fetchone()[0]
+        if oldest is None or oldest > since + 1:
+            return latest, None
+        rows = conn.execute(
+            "SELECT DISTINCT session_id FROM session_changes WHERE namespace = ? AND seq > ? AND seq <= ?",
+            (namespace, since, latest)
+        )
+        return latest, [session_id for session_id, in rows]
+
+    def maintain(self):
+        if not self.shared:
+            return
+        cutoff = time.time() - self.change_retention
+        # Prune a prefix by number: clocks differ between processes, so pruning
+        # by time could punch a hole in the log that changes() would not notice
+        pruned = self._connect().execute(
+            "DELETE FROM session_changes WHERE seq <= "
+            "(SELECT MAX(seq) FROM session_changes WHERE changed_at < ?)",
+            (cutoff,)
+        ).rowcount
+        self._stats["changes_pruned"] += pruned
+
+
+_backend = None
+
+
+def get_session_backend():
+    """Process-wide backend selected by SESSION_BACKEND"""
+    global _backend
+    if _backend is None:
+        if SESSION_BACKEND == "sqlite":
+            _backend = SQLiteSessionBackend()
+        elif SESSION_BACKEND == "memory":
+            _backend = SessionBackend()
+        else:
+            raise ValueError(f"Unknown SESSION_BACKEND: {SESSION_BACKEND}")
+    return _backend
@@ -0,0 +1,106 @@
+import base64
+import bisect
+import threading
+from datetime import datetime
+
+
+def session_owner(session_id):
+    """Owner key of a session id (the part before the first underscore)"""
+    return session_id.split("_")[0]
+
+
+def encode_cursor(sort_key):
+    neg_activity, session_id = sort_key
+    raw = f"{-neg_activity!r}|{session_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError for malformed cursors"""
+    try:
+        activity, session_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|", 1)
+        return (-float(activity), session_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def _timestamp(value):
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def summarize_transcript(session):
+    """Listing metadata for a stored transcript"""
+    messages = session.get("messages", [])
+    last_activity = messages[-1]["timestamp"] if messages else session.get("created_at")
+    return {
+        "title": session.get("title"),
+        "created_at": session.get("created_at"),
+        "message_count": len(messages),
+        "last_activity": last_activity
+    }
+
+
+class SessionIndex:
+    """Owner -> sessions index ordered by most recent activity.
+
+    Each owner keeps a sorted list of (-last_activity, session_id) keys, so a
+    page is a bisect plus a slice: O(log n + page size) per listing instead
+    of a scan over every stored session.
+    """
+
+    def __init__(self, summarize=summarize_transcript):
+        self.summarize = summarize
+        self._owners = {}    # owner -> {"order": [sort keys], "entries": {session_id: summary}}
+        self._sort_keys = {}  # session_id -> current sort key
+        self._lock = threading.Lock()
+
+    def update(self, session_id, value):
+        """Insert or refresh a session after it was created or changed"""
+        summary = self.summarize(value)
+        sort_key = (-_timestamp(summary["last_activity"]), session_id)
+        with self._lock:
+            owner = self._owners.setdefault(session_owner(session_id), {"order": [], "entries": {}})
+            previous = self._sort_keys.get(session_id)
+            if previous != sort_key:
+                if previous is not None:
+                    del owner["order"][bisect.bisect_left(owner["order"], previous)]
+                bisect.insort(owner["order"], sort_key)
+                self._sort_keys[session_id] = sort_key
+            owner["entries"][session_id] = summary
+
+    def remove(self, session_id):
+        with self._lock:
+            sort_key = self._sort_keys.pop(session_id, None)
+            if sort_key is None:
+                return
+            owner_key = session_owner(session_id)
+            owner = self._owners[owner_key]
+            del owner["order"][bisect.bisect_left(owner["order"], sort_key)]
+            del owner["entries"][session_id]
+            if not owner["entries"]:
+                del self._owners[owner_key]
+
+    def clear(self):
+        with self._lock:
+            self._owners.clear()
+            self._sort_keys.clear()
+
+    def page(self, owner_key, cursor=None, limit=50):
+        """Return (sessions, next_cursor) for one owner, most recent first"""
+        with self._lock:
+            owner = self._owners.get(owner_key)
+            if owner is None:
+                return [], None
+
+            order = owner["order"]
+            start = bisect.bisect_right(order, decode_cursor(cursor)) if cursor else 0
+            keys = order[start:start + limit]
+            sessions = [(session_id, dict(owner["entries"][session_id])) for _, session_id in keys]
+            next_cursor = encode_cursor(keys[-1]) if keys and start + limit < len(order) else None
+            return sessions, next_cursor
+
+    def __len__(self):
+        return len(self._sort_keys)
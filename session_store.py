@@ -0,0 +1,343 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from session_backend import SessionBackend
+
+logger = logging.getLogger(__name__)
+
+# ----------------------------
+# Session Limits
+# ----------------------------
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "10000"))
+SESSION_IDLE_TTL_SECONDS = float(os.getenv("SESSION_IDLE_TTL_SECONDS", "86400"))
+SESSION_MAX_MESSAGES = int(os.getenv("SESSION_MAX_MESSAGES", "200"))
+SESSION_SWEEP_INTERVAL_SECONDS = float(os.getenv("SESSION_SWEEP_INTERVAL_SECONDS", "60"))
+
+
+class BoundedSessionStore:
+    """Dict-like session store with LRU capacity, idle TTL and a per-session message cap.
+
+    Values are either message lists (messages_key=None) or dicts holding
+    the message list under messages_key. With a default_factory, reading a
+    missing session creates it, like defaultdict.
+
+    With a persistent backend the store acts as a read-through cache: misses
+    are loaded from the backend, writes are handed to it (write-behind), and
+    LRU/idle eviction only frees memory without deleting anything.
+
+    An optional SessionIndex is kept in sync on every write and delete so
+    sessions can be listed per owner without scanning the store.
+
+    With a shared backend (several processes on one database) a cached
+    session is checked against the stored version before use and reloaded
+    if another process changed it; on_reload(session_id) is then called so
+    state derived from the session can be rebuilt. Mutations run in a
+    backend transaction, and listings first replay the backend's change log
+    into the index.
+    """
+
+    def __init__(self, name, max_sessions=SESSION_MAX_COUNT, idle_ttl=SESSION_IDLE_TTL_SECONDS,
+                 max_messages=SESSION_MAX_MESSAGES, default_factory=None, messages_key=None,
+                 backend=None, index=None, on_reload=None):
+        self.name = name
+        self.backend = backend or SessionBackend()
+        self.index = index
+        self.on_reload = on_reload
+        # Version checks and transactions are only needed across processes
+        self._shared = self.backend.shared
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_messages = max_messages
+        self.default_factory = default_factory
+        self.messages_key = messages_key
+
+        self._data = OrderedDict()   # session_id -> value, least recently used first
+        self._last_access = {}       # session_id -> monotonic time of last access
+        self._versions = {}          # session_id -> backend version of the cached value (shared backends)
+        self._index_synced = 0       # last backend change applied to the index (shared backends)
+        self._lock = threading.RLock()
+        self._stats = {
+            "evicted_lru": 0,
+            "expired_idle": 0,
+            "trimmed_messages": 0,
+            "reloaded": 0
+        }
+
+    # ----------------------------
+    # Internal helpers
+    # ----------------------------
+    def _messages(self, value):
+        return value if self.messages_key is None else value[self.messages_key]
+
+    def _discard_oldest(self, value, count):
+        del self._messages(value)[:count]
+        # Dict sessions remember how many messages were dropped so that
+        # message indexes handed to clients stay stable
+        if self.messages_key is not None:
+            value["message_offset"] = value.get("message_offset", 0) + count
+
+    def _trim(self, value):
+        overflow = len(self._messages(value)) - self.max_messages
+        if overflow > 0:
+            self._discard_oldest(value, overflow)
+            self._stats["trimmed_messages"] += overflow
+
+    def _touch(self, session_id):
+        self._data.move_to_end(session_id)
+        self._last_access[session_id] = time.monotonic()
+
+    def _drop(self, session_id):
+        self._data.pop(session_id, None)
+        self._last_access.pop(session_id, None)
+        self._versions.pop(session_id, None)
+
+    def _evict(self, session_id):
+        self._drop(session_id)
+        # Without persistence an evicted session is gone for good
+        if self.index is not None and not self.backend.persistent:
+            self.index.remove(session_id)
+
+    def _is_expired(self, session_id, now):
+        return now - self._last_access[session_id] > self.idle_ttl
+
+    def _enforce_capacity(self):
+        while len(self._data) > self.max_sessions:
+            self._evict(next(iter(self._data)))
+            self._stats["evicted_lru"] += 1
+
+    # ----------------------------
+    # Mapping API
+    # ----------------------------
+    def _changed_elsewhere(self, session_id):
+        """Whether another process wrote or deleted a cached session since it was cached"""
+        if self.backend.version(self.name, session_id) == self._versions.get(session_id):
+            return False
+        self._stats["reloaded"] += 1
+        if self.on_reload is not None:
+            self.on_reload(session_id)
+        return True
+
+    def _cached(self, session_id):
+        """Cached value (loading it from the backend on a miss), or None"""
+        if session_id in self._data:
+            if self._is_expired(session_id, time.monotonic()):
+                self._evict(session_id)
+            elif self._shared and self._changed_elsewhere(session_id):
+                self._drop(session_id)
+            else:
+                self._touch(session_id)
+                return self._data[session_id]
+
+        if not self._shared:
+            value = self.backend.load(self.name, session_id)
+            if value is not None:
+                self._set(session_id, value)
+            return value
+
+        value, version = self.backend.load_versioned(self.name, session_id)
+        if value is not None:
+            self._set(session_id, value)
+            self._versions[session_id] = version
+        return value
+
+    @contextmanager
+    def _shared_write(self):
+        with self._lock, self.backend.transaction():
+            yield
+
+    def _writing(self):
+        """Guard for a read-modify-write: the store lock, plus a backend transaction when shared"""
+        return self._shared_write() if self._shared else self._lock
+
+    def __getitem__(self, session_id):
+        with self._lock:
+            value = self._cached(session_id)
+            if value is None:
+                value = self._create(session_id, self.default_factory)
+                self._save(session_id, value)
+            return value
+
+    def _create(self, session_id, factory):
+        """Cache a new value for a missing session; the caller saves it"""
+        if factory is None:
+            raise KeyError(session_id)
+        value = factory()
+        self._set(session_id, value)
+        return value
+
+    def _set(self, session_id, value):
+        self._data[session_id] = value
+        self._touch(session_id)
+        self._trim(value)
+        self._enforce_capacity()
+
+    def _save(self, session_id, value):
+        version = self.backend.save(self.name, session_id, value, self._lock)
+        if self._shared:
+            self._versions[session_id] = version
+        if self.index is not None:
+            self.index.update(session_id, value)
+
+    def __setitem__(self, session_id, value):
+        with self._lock:
+            self._set(session_id, value)
+            self._save(session_id, value)
+
+    def __delitem__(self, session_id):
+        with self._writing():
+            if self._cached(session_id) is None:
+                raise KeyError(session_id)
+            self._drop(session_id)
+            self.backend.delete(self.name, session_id)
+            if self.index is not None:
+                self.index.remove(session_id)
+
+    def __contains__(self, session_id):
+        with self._lock:
+            return self._cached(session_id) is not None
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, session_id, default=None):
+        with self._lock:
+            value = self._cached(session_id)
+            return default if value is None else value
+
+    def items(self):
+        """Snapshot of (session_id, value) pairs"""
+        with self._lock:
+            return list(self._data.items())
+
+    def append_messages(self, session_id, *messages, create=None):
+        """Append messages to a session, enforcing the per-session cap.
+
+        create() makes the session if it does not exist yet, in the same
+        transaction, so two processes starting one session cannot both create it.
+        """
+        with self._writing():
+            value = self._cached(session_id)
+            if value is None:
+                value = self._create(session_id, create or self.default_factory)
+            self._messages(value).extend(messages)
+            self._trim(value)
+            self._save(session_id, value)
+            return value
+
+    def update(self, session_id, fn):
+        """Apply fn to a session value in place under the store lock and persist it"""
+        with self._writing():
+            value = self[session_id]
+            fn(value)
+            self._trim(value)
+            self._save(session_id, value)
+            return value
+
+    def clear_messages(self, session_id):
+        """Empty a session's messages, keeping the session itself"""
+        with self._writing():
+            value = self._cached(session_id)
+            if value is not None:
+                self._discard_oldest(value, len(self._messages(value)))
+                self._save(session_id, value)
+
+    # ----------------------------
+    # Listing
+    # ----------------------------
+    def list_page(self, owner, cursor=None, limit=50):
+        """(sessions, next_cursor) for one owner, most recent activity first"""
+        if self.backend.shared:
+            self._sync_index()
+        return self.index.page(owner, cursor, limit)
+
+    def _sync_index(self):
+        """Apply the sessions other processes wrote or deleted since the last sync"""
+        with self._lock:
+            latest, changed = self.backend.changes(self.name, self._index_synced)
+            if changed is None:
+                # The change log was pruned past our last sync
+                self.index.clear()
+                self.rebuild_index()
+                return
+            for session_id in changed:
+                value = self.backend.load(self.name, session_id)
+                if value is None:
+                    self.index.remove(session_id)
+                else:
+                    self.index.update(session_id, value)
+            self._index_synced = latest
+
+    def rebuild_index(self):
+        """Index every session the backend already holds (run once at startup)"""
+        if self.index is None:
+            return 0
+        # Changes logged from here on are replayed by the next sync
+        self._index_synced = self.backend.latest_change()
+        count = 0
+        for session_id, value in self.backend.scan(self.name):
+            self.index.update(session_id, value)
+            count += 1
+        return count
+
+    # ----------------------------
+    # Eviction
+    # ----------------------------
+    def sweep(self):
+        """Drop sessions idle for longer than the TTL; returns how many were removed"""
+        now = time.monotonic()
+        removed = 0
+        with self._lock:
+            # Least recently used first, so stop at the first live session
+            while self._data:
+                session_id = next(iter(self._data))
+                if not self._is_expired(session_id, now):
+                    break
+                self._evict(session_id)
+                removed += 1
+            self._stats["expired_idle"] += removed
+        return removed
+
+    async def offload(self, fn, *args):
+        """Await fn(*args), in a worker thread when the backend is shared.
+
+        Shared-mode reads check versions and writes commit through SQLite,
+        and either may wait for another worker's lock, so they are kept off
+        the event loop. Process-local stores only touch memory and run inline.
+        """
+        if self._shared:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    def stats(self):
+        return {
+            "sessions": len(self._data),
+            "max_sessions": self.max_sessions,
+            "idle_ttl_seconds": self.idle_ttl,
+            "max_messages": self.max_messages,
+            **self._stats,
+            "indexed": len(self.index) if self.index is not None else None,
+            "backend": self.backend.stats()
+        }
+
+
+async def sweep_periodically(stores, interval=SESSION_SWEEP_INTERVAL_SECONDS):
+    """Background task that expires idle sessions in every store"""
+    while True:
+        await asyncio.sleep(interval)
+        for store in stores:
+            try:
+                removed = await store.offload(store.sweep)
+                if removed:
+                    logger.info("Expired %d idle sessions from %s", removed, store.name)
+            except Exception:
+                logger.exception("Session sweep failed for %s", store.name)
+        for backend in {id(store.backend): store.backend for store in stores}.values():
+            try:
+                # May write to the database, so keep it off the event loop
+                await asyncio.to_thread(backend.maintain)
+            except Exception:
+                logger.exception("Session backend upkeep failed")
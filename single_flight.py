@@ -0,0 +1,51 @@
+import asyncio
+
+
+class SingleFlight:
+    """Coalesces concurrent identical async calls into one.
+
+    The first caller for a key starts the call as its own task; callers
+    arriving while it is in flight wait on that task and all get its result
+    (or its exception). The task is shielded, so a caller that disconnects
+    does not cancel the call for the others. Keys are tuples whose first
+    element names the call kind, which is used to break down the stats.
+    """
+
+    def __init__(self):
+        self._in_flight = {}  # key -> task
+        self._stats = {}      # kind -> {"calls": n, "coalesced": n}
+
+    def _count(self, key, field):
+        kind = key[0] if isinstance(key, tuple) else str(key)
+        counts = self._stats.setdefault(kind, {"calls": 0, "coalesced": 0})
+        counts[field] += 1
+
+    def _release(self, key, task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+
+    async def do(self, key, call):
+        """Run call() once per key at a time and return its result"""
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(call())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._release(key, done))
+            # Keep an exception nobody awaits (all callers gone) from being logged as lost
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._count(key, "calls")
+        else:
+            self._count(key, "coalesced")
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {
+            "in_flight": len(self._in_flight),
+            "upstream_calls": sum(counts["calls"] for counts in self._stats.values()),
+            "calls_avoided": sum(counts["coalesced"] for counts in self._stats.values()),
+            "by_kind": {kind: dict(counts) for kind, counts in self._stats.items()}
+        }
+
+
+# Shared by every LLM-calling path
+llm_single_flight = SingleFlight()
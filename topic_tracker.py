@@ -0,0 +1,125 @@
+import os
+import re
+import json
+import threading
+from collections import OrderedDict, deque
+
+# ----------------------------
+# Topic Lock Rules
+# ----------------------------
+# Rules are checked in order; the first whose terms appear at least
+# min_count times (as whole words) in the window wins. Override them with a
+# JSON file of the same shape via TOPIC_LOCK_RULES_PATH.
+DEFAULT_TOPIC_LOCK_RULES = [
+    {"name": "ai_vs_data_science", "terms": ["ai", "data science"], "min_count": 3},
+    {"name": "career_focus", "terms": ["career", "careers"], "min_count": 2},
+    {"name": "study_focus", "terms": ["study", "studies", "studying", "exam", "exams"], "min_count": 2},
+    {"name": "project_focus", "terms": ["project", "projects"], "min_count": 2},
+]
+
+TOPIC_WINDOW_MESSAGES = int(os.getenv("TOPIC_WINDOW_MESSAGES", "6"))
+TOPIC_TRACKER_MAX_SESSIONS = int(os.getenv("SESSION_MAX_COUNT", "10000"))
+
+def load_topic_lock_rules():
+    path = os.getenv("TOPIC_LOCK_RULES_PATH")
+    if not path:
+        return DEFAULT_TOPIC_LOCK_RULES
+    with open(path) as f:
+        return json.load(f)
+
+
+class TopicTracker:
+    """Per-session topic-lock detection with incremental whole-word counters.
+
+    Each session keeps the term counts of its last window_size messages.
+    A new message adds its counts and the message leaving the window
+    subtracts its own, so an update costs O(len(new message)) instead of
+    re-scanning the whole window.
+    """
+
+    def __init__(self, rules=None, window_size=TOPIC_WINDOW_MESSAGES, max_sessions=TOPIC_TRACKER_MAX_SESSIONS):
+        self.rules = rules if rules is not None else load_topic_lock_rules()
+        self.window_size = window_size
+        self.max_sessions = max_sessions
+
+        # (rule index, term, pattern) per term. Patterns start with the literal
+        # so the regex engine can jump straight to candidates; the lookarounds
+        # reject matches inside longer words ("ai" in "explain")
+        self._term_matchers = [
+            (i, term.lower(), re.compile(self._term_regex(term)).findall)
+            for i, rule in enumerate(self.rules)
+            for term in rule["terms"]
+        ]
+
+        self._sessions = OrderedDict()  # session_id -> {"window": deque of per-rule counts, "totals": list}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _term_regex(term):
+        literal = re.escape(term.lower())
+        return f"{literal}(?<![a-z0-9]{literal})(?![a-z0-9])"
+
+    def rule_counts(self, message):
+        """Whole-word term counts of one message, summed per rule"""
+        text = message.lower()
+        counts = [0] * len(self.rules)
+        for i, term, findall in self._term_matchers:
+            # Plain substring check first; most messages contain few terms
+            if term in text:
+                counts[i] += len(findall(text))
+        return counts
+
+    def _new_state(self):
+        return {"window": deque(), "totals": [0] * len(self.rules)}
+
+    def _push(self, state, message):
+        counts = self.rule_counts(message)
+        totals = state["totals"]
+        for i, count in enumerate(counts):
+            totals[i] += count
+        state["window"].append(counts)
+        if len(state["window"]) > self.window_size:
+            for i, count in enumerate(state["window"].popleft()):
+                totals[i] -= count
+
+    def _match(self, totals):
+        for rule, total in zip(self.rules, totals):
+            if total >= rule["min_count"]:
+                return rule["name"]
+        return None
+
+    def observe(self, session_id, message, window=None):
+        """Add a message to the session's window and return the topic lock (or None).
+
+        window is the session's current message list (ending with message);
+        it is only read to rebuild state for a session the tracker has not
+        seen yet (e.g. after a restart or eviction) or one that started over.
+        """
+        with self._lock:
+            state = self._sessions.get(session_id)
+            # A one-message window means the session started over
+            if state is None or (window is not None and len(window) == 1):
+                state = self._new_state()
+                for earlier in (window or [message])[-self.window_size:]:
+                    self._push(state, earlier)
+                self._sessions[session_id] = state
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            else:
+                self._sessions.move_to_end(session_id)
+                self._push(state, message)
+            return self._match(state["totals"])
+
+    def reset(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def detect(self, messages):
+        """Stateless check of a message window (for tools and benchmarks)"""
+        state = self._new_state()
+        for message in messages[-self.window_size:]:
+            self._push(state, message)
+        return self._match(state["totals"])
+
+    def __len__(self):
+        return len(self._sessions)
@@ -0,0 +1,80 @@
+import os
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.formparsers import MultiPartParser
+
+# ----------------------------
+# Upload Limits
+# ----------------------------
+UPLOAD_MAX_IMAGE_BYTES = int(os.getenv("UPLOAD_MAX_IMAGE_BYTES", str(15 * 1024 * 1024)))
+UPLOAD_MAX_RESUME_BYTES = int(os.getenv("UPLOAD_MAX_RESUME_BYTES", str(5 * 1024 * 1024)))
+
+# Allowance for the multipart framing and form fields around the file
+UPLOAD_FORM_OVERHEAD_BYTES = 64 * 1024
+
+# File parts larger than this are spilled from memory to a temp file while
+# parsing. Read from Starlette, not set: it is a class attribute shared by
+# every multipart parser in the process.
+UPLOAD_SPOOL_MAX_BYTES = MultiPartParser.max_file_size
+
+# Request body limits per upload endpoint
+UPLOAD_LIMITS = {
+    "/upload-image": UPLOAD_MAX_IMAGE_BYTES,
+    "/analyze-resume": UPLOAD_MAX_RESUME_BYTES,
+}
+
+
+class UploadTooLargeError(HTTPException):
+    """Raised while reading a request body that exceeds its endpoint's limit"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        super().__init__(status_code=413, detail=f"Upload exceeds the {limit // (1024 * 1024)} MB limit")
+
+
+def upload_too_large_response(error):
+    return JSONResponse(status_code=413, content={"error": error.detail})
+
+
+class UploadLimitMiddleware:
+    """Enforces per-endpoint body limits while the upload is received.
+
+    A declared Content-Length over the limit is rejected before any of the
+    body is read. Otherwise bytes are counted as they arrive and parsing is
+    aborted as soon as the limit is crossed, so an oversized (or chunked)
+    upload never gets fully buffered or spooled.
+    """
+
+    def __init__(self, app, limits=UPLOAD_LIMITS):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        max_body = limit + UPLOAD_FORM_OVERHEAD_BYTES
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit() and int(value) > max_body:
+                response = upload_too_large_response(UploadTooLargeError(limit))
+                return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_body:
+                    raise UploadTooLargeError(limit)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def check_upload_size(file, limit):
+    """Reject a parsed upload whose file part alone is over the limit"""
+    if file.size is not None and file.size > limit:
+        raise UploadTooLargeError(limit)